@@ -0,0 +1,310 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+"""In-process stand-ins for pyrogram's Client and Message.
+
+Only the surface the bot actually uses is implemented. Every call costs a
+round-trip of ``latency`` seconds, transfers additionally take
+``size / bandwidth`` seconds, and ``get_messages`` raises FloodWait at the
+configured rate, so the bot's own scheduling, pacing and caching code runs
+unchanged against a predictable network.
+"""
+
+import os
+import random
+import asyncio
+from itertools import count
+from types import SimpleNamespace
+
+from pyrogram import raw
+from pyrogram.errors import FloodWait, PeerIdInvalid
+
+MEDIA_TYPES = ("photo", "video", "audio", "document")
+_ids = count(1)
+
+
+class Network:
+    """Latency, bandwidth and FloodWait model shared by the fake clients."""
+
+    def __init__(self, latency_ms=50, download_mbps=200, upload_mbps=100,
+                 flood_wait_rate=0.0, flood_wait_seconds=1, seed=1, shared_bandwidth=False):
+        self.latency = latency_ms / 1000
+        self.download_bps = download_mbps * 1_000_000 / 8
+        self.upload_bps = upload_mbps * 1_000_000 / 8
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.random = random.Random(seed)
+        self.calls = {}
+        self.flood_waits = 0
+        self.bytes_down = 0
+        self.bytes_up = 0
+        # When set, concurrent transfers in one direction split the bandwidth
+        # instead of each getting all of it
+        self.shared_bandwidth = shared_bandwidth
+        self._links = {"down": asyncio.Lock(), "up": asyncio.Lock()}
+
+    async def rpc(self, name, flood=False):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        await asyncio.sleep(self.latency)
+        if flood and self.flood_wait_rate and self.random.random() < self.flood_wait_rate:
+            self.flood_waits += 1
+            raise FloodWait(value=self.flood_wait_seconds)
+
+    async def transfer(self, size, direction, progress=None, progress_args=(), steps=4):
+        """Sleep for the transfer time, reporting progress ``steps`` times."""
+        bps = self.download_bps if direction == "down" else self.upload_bps
+        for step in range(1, steps + 1):
+            if self.shared_bandwidth:
+                async with self._links[direction]:
+                    await asyncio.sleep(size / bps / steps)
+            else:
+                await asyncio.sleep(size / bps / steps)
+            if progress is not None:
+                result = progress(size * step // steps, size, *progress_args)
+                if asyncio.iscoroutine(result):
+                    await result
+
+
+def make_media(media_type, size, unique_id, duration=60):
+    """A media object with the attributes the bot reads."""
+    file_id = f"fake-{media_type}-{unique_id}"
+    media = SimpleNamespace(
+        file_id=file_id,
+        file_unique_id=unique_id,
+        file_size=size,
+        file_name=None if media_type == "photo" else f"{unique_id}.{'mp4' if media_type == 'video' else 'bin'}",
+        mime_type=None,
+        thumbs=[],
+    )
+    if media_type in ("video", "audio"):
+        media.duration = duration
+    if media_type == "video":
+        media.width, media.height = 1280, 720
+    if media_type == "audio":
+        media.performer, media.title = "Benchmark", unique_id
+    return media
+
+
+class FakeMessage:
+    """A pyrogram-like Message; replies are recorded on the owning client."""
+
+    def __init__(self, client, chat_id, msg_id, media_type=None, size=0, unique_id=None,
+                 text=None, caption=None, media_group_id=None, empty=False, from_user_id=None):
+        self._client = client
+        self.id = msg_id
+        self.chat = SimpleNamespace(id=chat_id, type="private", username=None, has_protected_content=False)
+        self.from_user = SimpleNamespace(id=from_user_id) if from_user_id is not None else None
+        self.empty = empty
+        self.text = text
+        self.entities = None
+        self.caption = caption
+        self.caption_entities = None
+        self.media_group_id = media_group_id
+        self.has_protected_content = False
+        self.service = None
+        for attr in ("photo", "video", "audio", "document", "voice", "video_note", "animation", "sticker"):
+            setattr(self, attr, None)
+        self.media = None
+        if media_type:
+            setattr(self, media_type, make_media(media_type, size, unique_id or f"u{chat_id}_{msg_id}"))
+            self.media = media_type
+
+    # Source-side calls (user client)
+
+    async def download(self, file_name="", in_memory=False, block=True, progress=None, progress_args=()):
+        net = self._client.network
+        await net.rpc("download")
+        media = next(getattr(self, t) for t in MEDIA_TYPES if getattr(self, t))
+        await net.transfer(media.file_size, "down", progress, progress_args)
+        net.bytes_down += media.file_size
+        path = os.path.abspath(file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.truncate(media.file_size)  # sparse: no real disk traffic
+        return path
+
+    async def get_media_group(self):
+        return await self._client.get_media_group(self.chat.id, self.id)
+
+    # Reply-side calls (bot client)
+
+    async def reply(self, text="", **kwargs):
+        return await self._client.send_message(self.chat.id, text)
+
+    reply_text = reply
+
+    async def edit_text(self, text, **kwargs):
+        await self._client.network.rpc("edit_message_text")
+        return self
+
+    async def delete(self, *args, **kwargs):
+        await self._client.network.rpc("delete_messages")
+        return True
+
+    async def _reply_media(self, media_type, media, progress=None, progress_args=(), **kwargs):
+        return await self._client.send_media(self.chat.id, media_type, media, progress, progress_args)
+
+    async def reply_photo(self, photo, **kwargs):
+        return await self._reply_media("photo", photo, **kwargs)
+
+    async def reply_video(self, video, **kwargs):
+        return await self._reply_media("video", video, **kwargs)
+
+    async def reply_audio(self, audio, **kwargs):
+        return await self._reply_media("audio", audio, **kwargs)
+
+    async def reply_document(self, document, **kwargs):
+        return await self._reply_media("document", document, **kwargs)
+
+
+class RelayChat:
+    """The chat helper bots upload into; shared by every fake bot."""
+
+    def __init__(self, chat_id: int = -1002000000001):
+        self.chat_id = chat_id
+        self.messages = {}  # msg_id -> FakeMessage
+        self.sizes = {}     # file_id -> size, so deliveries by file_id count their bytes
+
+
+class FakeClient:
+    """Serves one source chat (user side) and records deliveries (bot side)."""
+
+    def __init__(self, network: Network, chat_id: int = -1001000000001, name: str = "fake", relay: RelayChat = None):
+        self.network = network
+        self.name = name
+        self.relay = relay
+        self.chat_id = chat_id
+        self.posts = {}   # msg_id -> FakeMessage
+        self.groups = {}  # media_group_id -> [msg_id]
+        self.delivered_posts = 0
+        self.delivered_bytes = 0
+        self.errors = []  # "❌ ..." replies sent to users
+        self.rejected = 0  # "bot is busy" replies (scheduler queue full)
+        self.me = SimpleNamespace(id=chat_id, is_premium=True)
+
+    # Source chat content
+
+    def add_post(self, msg_id, media_type=None, size=0, text=None, media_group_id=None):
+        message = FakeMessage(
+            self, self.chat_id, msg_id, media_type, size,
+            text=text, caption=f"post {msg_id}" if media_type else None, media_group_id=media_group_id,
+        )
+        self.posts[msg_id] = message
+        if media_group_id:
+            self.groups.setdefault(media_group_id, []).append(msg_id)
+        return message
+
+    def _lookup(self, chat_id, msg_id):
+        if self.relay is not None and chat_id == self.relay.chat_id:
+            return self.relay.messages.get(msg_id) or FakeMessage(self, chat_id, msg_id, empty=True)
+        if chat_id != self.chat_id:
+            raise PeerIdInvalid()
+        return self.posts.get(msg_id) or FakeMessage(self, self.chat_id, msg_id, empty=True)
+
+    async def get_messages(self, chat_id=None, message_ids=None, **kwargs):
+        await self.network.rpc("get_messages", flood=True)
+        if isinstance(message_ids, (list, tuple, range)):
+            return [self._lookup(chat_id, msg_id) for msg_id in message_ids]
+        return self._lookup(chat_id, message_ids)
+
+    async def get_media_group(self, chat_id, msg_id):
+        await self.network.rpc("get_media_group", flood=True)
+        group = self._lookup(chat_id, msg_id).media_group_id
+        return [self.posts[i] for i in sorted(self.groups.get(group, []))]
+
+    async def get_chat(self, chat_id):
+        await self.network.rpc("get_chat")
+        return SimpleNamespace(id=chat_id)
+
+    async def resolve_peer(self, peer_id):
+        if peer_id != self.chat_id:
+            raise PeerIdInvalid()
+        return raw.types.InputPeerChannel(channel_id=int(str(self.chat_id)[4:]), access_hash=1)
+
+    # Bot side
+
+    def _size_of(self, media):
+        if isinstance(media, str) and os.path.exists(media):
+            return os.path.getsize(media)
+        return 0  # file_id: no upload needed
+
+    async def send_message(self, chat_id, text="", **kwargs):
+        await self.network.rpc("send_message")
+        if text.lstrip("*").startswith("❌"):
+            self.errors.append(text)
+        elif "bot is busy" in text:
+            self.rejected += 1
+        return FakeMessage(self, chat_id, next(_ids), text=text)
+
+    async def send_media(self, chat_id, media_type, media, progress=None, progress_args=()):
+        await self.network.rpc(f"send_{media_type}")
+        size = self._size_of(media)
+        if size:
+            await self.network.transfer(size, "up", progress, progress_args)
+            self.network.bytes_up += size
+        if self.relay is not None and chat_id == self.relay.chat_id:
+            size = size or self.relay.sizes.get(media, 0)
+            message = FakeMessage(self, chat_id, next(_ids), media_type, size, unique_id=f"relay{next(_ids)}")
+            self.relay.messages[message.id] = message
+            self.relay.sizes[getattr(message, media_type).file_id] = size
+            return message
+        self.delivered_posts += 1
+        self.delivered_bytes += size or (self.relay.sizes.get(media, 0) if self.relay is not None else 0)
+        return FakeMessage(self, chat_id, next(_ids), media_type, size, unique_id=f"sent{next(_ids)}")
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self.send_media(chat_id, "photo", photo)
+
+    async def send_video(self, chat_id, video, **kwargs):
+        return await self.send_media(chat_id, "video", video)
+
+    async def send_audio(self, chat_id, audio, **kwargs):
+        return await self.send_media(chat_id, "audio", audio)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self.send_media(chat_id, "document", document)
+
+    async def send_cached_media(self, chat_id, file_id, caption="", **kwargs):
+        await self.network.rpc("send_cached_media")
+        self.delivered_posts += 1
+        return FakeMessage(self, chat_id, next(_ids), text=caption)
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        await self.network.rpc("send_media_group")
+        sent = []
+        for item in media:
+            media_type = type(item).__name__.replace("InputMedia", "").lower()
+            size = self._size_of(item.media)
+            if size:
+                await self.network.transfer(size, "up", steps=1)
+                self.network.bytes_up += size
+            elif self.relay is not None:
+                size = self.relay.sizes.get(item.media, 0)
+            self.delivered_posts += 1
+            self.delivered_bytes += size
+            sent.append(FakeMessage(self, chat_id, next(_ids), media_type, size, unique_id=f"sent{next(_ids)}"))
+        return sent
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        await self.network.rpc("delete_messages")
+        if self.relay is not None and chat_id == self.relay.chat_id:
+            for msg_id in message_ids if isinstance(message_ids, (list, tuple)) else [message_ids]:
+                self.relay.messages.pop(msg_id, None)
+        return True
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self.network.rpc("copy_message")
+        self.delivered_posts += 1
+        source = self.posts.get(message_id)
+        if source is None or not source.media:
+            return FakeMessage(self, chat_id, next(_ids))
+        # A copy keeps the file, so it keeps the file_unique_id
+        media = getattr(source, source.media)
+        return FakeMessage(self, chat_id, next(_ids), source.media, media.file_size, unique_id=media.file_unique_id)
+
+    async def copy_media_group(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self.network.rpc("copy_media_group")
+        group = self.posts[message_id].media_group_id
+        self.delivered_posts += len(self.groups.get(group, []))
+        return [FakeMessage(self, chat_id, next(_ids)) for _ in self.groups.get(group, [])]
+
@@ -0,0 +1,284 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+"""Offline throughput benchmark.
+
+Usage (from the repository root):
+
+    python -m benchmarks.run                        # every scenario
+    python -m benchmarks.run benchmarks/scenarios/album_10.json
+    python -m benchmarks.run --save before.json     # keep results
+    python -m benchmarks.run --compare before.json  # show change vs. a saved run
+
+Each scenario runs in a fresh subprocess with its own temporary working
+directory, so caches, dedup state and peak RSS never leak between
+scenarios. The bot's real handlers run against ``fake_client``; only the
+raw MTProto transfer paths (parallel download/upload and streaming) are
+turned off because they talk to Telegram sessions directly.
+"""
+
+import os
+import sys
+import json
+import glob
+import math
+import random
+import shutil
+import asyncio
+import base64
+import argparse
+import resource
+import tempfile
+import subprocess
+from time import monotonic
+from collections import Counter
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIO_DIR = os.path.join(REPO, "benchmarks", "scenarios")
+
+# Applied before main is imported; scenarios may override any of these
+BENCH_ENV = {
+    "API_ID": "1",
+    "API_HASH": "0" * 32,
+    "BOT_TOKEN": "1:benchmark",
+    "STREAM_TRANSFER": "0",
+    "PARALLEL_DOWNLOAD": "0",
+    "PARALLEL_UPLOAD": "0",
+    "COPY_FAST_PATH": "0",
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def build_source(user, scenario):
+    """Fill the fake source chat from ``posts`` and/or ``generate``."""
+    for post in scenario.get("posts", []):
+        user.add_post(post["id"], post.get("type"), post.get("size", 0), post.get("text"), post.get("group"))
+
+    spec = scenario.get("generate")
+    if not spec:
+        return
+    rng = random.Random(spec.get("seed", 1))
+    types = spec.get("types", ["document"])
+    album_size = spec.get("album_size", 0)
+    msg_id = spec["first"]
+    while msg_id <= spec["last"]:
+        if rng.random() >= spec.get("density", 1.0):
+            msg_id += 1
+            continue
+        size = rng.randint(spec.get("size_min", 1 << 20), spec.get("size_max", 1 << 20))
+        if album_size and rng.random() < spec.get("album_rate", 0):
+            group = f"g{msg_id}"
+            for member in range(msg_id, min(msg_id + album_size, spec["last"] + 1)):
+                user.add_post(member, rng.choice(types), size, media_group_id=group)
+            msg_id += album_size
+            continue
+        user.add_post(msg_id, rng.choice(types), size)
+        msg_id += 1
+
+
+def post_link(user, msg_id):
+    return f"https://t.me/c/{str(user.chat_id)[4:]}/{msg_id}"
+
+
+async def drive(main, scenario, sources, bot):
+    from benchmarks.fake_client import FakeMessage
+
+    user = sources[0]
+
+    workload = scenario["workload"]
+    latencies = []
+    statuses = {}
+    users = workload.get("users", 1)
+    started = monotonic()
+
+    if workload["kind"] == "dl":
+        # One request per album, the rest per single post
+        targets, seen_groups = [], set()
+        for msg_id, post in sorted(user.posts.items()):
+            if post.media_group_id:
+                if post.media_group_id in seen_groups:
+                    continue
+                seen_groups.add(post.media_group_id)
+            targets.append(msg_id)
+        targets = workload.get("post_ids") or targets
+        per_user = workload.get("requests_per_user", 1)
+
+        async def _request(user_id, msg_id):
+            message = FakeMessage(bot, user_id, msg_id, text=post_link(user, msg_id), from_user_id=user_id)
+            begin = monotonic()
+            await main._queued_download(bot, message, message.text)
+            latencies.append(monotonic() - begin)
+
+        requests = [
+            (1000 + u, targets[(u * per_user + i) % len(targets)])
+            for u in range(users) for i in range(per_user)
+        ]
+        await asyncio.gather(*(_request(user_id, msg_id) for user_id, msg_id in requests))
+        posts = bot.delivered_posts
+
+    elif workload["kind"] == "bdl":
+        handle = main.handle_download_status
+
+        async def _timed(*args, **kwargs):
+            begin = monotonic()
+            status = await handle(*args, **kwargs)
+            latencies.append(monotonic() - begin)
+            statuses[status] = statuses.get(status, 0) + 1
+            return status
+
+        main.handle_download_status = _timed
+
+        async def _batch(user_id):
+            message = FakeMessage(bot, user_id, 1, text="/bdl", from_user_id=user_id)
+            job = main.BatchJob(
+                name=f"bench_{user_id}",
+                start_id=workload["first"],
+                end_id=workload["last"],
+                prefix=post_link(user, 0).rsplit("/", 1)[0],
+                candidates=[int(str(user.chat_id)[4:]), user.chat_id],
+                chat_id=user_id,
+                start_url=post_link(user, workload["first"]),
+                end_url=post_link(user, workload["last"]),
+                initiator_id=user_id,
+            )
+            loading = await message.reply("📥 benchmark batch")
+            main.ACTIVE_BATCH_JOBS.append(job)
+            await main._run_batch(job, message, loading)
+
+        await asyncio.gather(*(_batch(1000 + u) for u in range(users)))
+        posts = bot.delivered_posts
+    else:
+        raise ValueError(f"Unknown workload kind: {workload['kind']}")
+
+    wall = monotonic() - started
+    return {
+        "scenario": scenario["name"],
+        "posts": posts,
+        "wall_s": round(wall, 3),
+        "posts_per_s": round(posts / wall, 3) if wall else 0.0,
+        "bytes": bot.delivered_bytes,
+        "mb_per_s": round(bot.delivered_bytes / wall / 1_000_000, 3) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "flood_waits": sum(source.network.flood_waits for source in sources),
+        "errors": len(bot.errors),
+        "rejected": bot.rejected,
+        "statuses": statuses,
+        "rpc": dict(sorted(sum((Counter(source.network.calls) for source in sources), Counter()).items())),
+    }
+
+
+def run_child(path):
+    with open(path) as f:
+        scenario = json.load(f)
+    workdir = tempfile.mkdtemp(prefix="tgsave-bench-")
+    os.chdir(workdir)
+    os.environ.update(BENCH_ENV)
+    # Never connected, only needs to pass main's session string checks
+    os.environ["SESSION_STRING"] = base64.urlsafe_b64encode(os.urandom(271)).decode().rstrip("=")
+    os.environ.update({k: str(v) for k, v in scenario.get("env", {}).items()})
+    sys.path.insert(0, REPO)
+    try:
+        import logging
+        import main
+        from benchmarks.fake_client import FakeClient, Network, RelayChat
+
+        logging.getLogger().setLevel(logging.WARNING)
+        # One fake account per user session, each with its own network model
+        # and FloodWaits; every account sees the same source chat
+        sources = []
+        for index in range(max(1, scenario.get("sessions", 1))):
+            network = Network(**{"seed": index + 1, **scenario.get("network", {})})
+            source = FakeClient(network, name=f"user_session_{index}" if index else "user_session")
+            build_source(source, scenario)
+            sources.append(source)
+        # Helper bots upload over their own network into a shared relay chat
+        relay = RelayChat()
+        bot = FakeClient(sources[0].network, name="media_bot", relay=relay)
+        helpers = [
+            FakeClient(Network(**{"seed": 100 + index, **scenario.get("network", {})}), name=f"helper_bot_{index}", relay=relay)
+            for index in range(1, scenario.get("helper_bots", 0) + 1)
+        ]
+        main.user = sources[0]
+        main.bot = bot
+        main.SESSIONS.clear()
+        for source in sources:
+            main.SESSIONS.add(source)
+        main.UPLOADERS.clear()
+        main.UPLOADERS.relay_chat_id = relay.chat_id
+        for uploader in [bot] + helpers:
+            main.UPLOADERS.add(uploader)
+        result = asyncio.run(drive(main, scenario, sources, bot))
+        result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    finally:
+        os.chdir(REPO)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def run_scenario(path):
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--child", path],
+        cwd=REPO, capture_output=True, text=True,
+    )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"Scenario {path} failed (exit {proc.returncode})")
+    return json.loads(lines[-1])
+
+
+COLUMNS = ("posts", "wall_s", "posts_per_s", "mb_per_s", "p50_ms", "p99_ms", "peak_rss_mb", "flood_waits", "errors", "rejected")
+
+
+def report(results, baseline=None):
+    baseline = {r["scenario"]: r for r in baseline or []}
+    print(f"{'scenario':<24}" + "".join(f"{c:>13}" for c in COLUMNS))
+    for result in results:
+        print(f"{result['scenario']:<24}" + "".join(f"{result[c]:>13}" for c in COLUMNS))
+        before = baseline.get(result["scenario"])
+        if before:
+            deltas = []
+            for column in COLUMNS:
+                if before.get(column):
+                    deltas.append(f"{(result[column] - before[column]) / before[column] * 100:>+12.1f}%")
+                else:
+                    deltas.append(f"{'-':>13}")
+            print(f"{'  vs baseline':<24}" + "".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark with a fake Telegram client")
+    parser.add_argument("scenarios", nargs="*", help="scenario JSON files (default: all)")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare with results saved by --save")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child)
+
+    paths = args.scenarios or sorted(glob.glob(os.path.join(SCENARIO_DIR, "*.json")))
+    results = []
+    for path in paths:
+        print(f"Running {os.path.basename(path)}...", file=sys.stderr)
+        results.append(run_scenario(os.path.abspath(path)))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,5 +27,13 @@ class PyroConf(object):
     API_ID = int(getenv("API_ID", "6"))
     API_HASH = getenv("API_HASH", "eb06d4abfb49dc3eeb1aeb98ae0f581e")
     BOT_TOKEN = getenv("BOT_TOKEN")
+    # Helper bots that share upload work with BOT_TOKEN (comma or space separated, needs RELAY_CHAT_ID)
+    HELPER_BOT_TOKENS = getenv("HELPER_BOT_TOKENS", "").replace(",", " ").split()
     SESSION_STRING = getenv("SESSION_STRING")
+    # Extra user sessions SESSION_STRING_1, SESSION_STRING_2, ... (read until the first gap)
+    EXTRA_SESSION_STRINGS = []
+    while getenv(f"SESSION_STRING_{len(EXTRA_SESSION_STRINGS) + 1}"):
+        EXTRA_SESSION_STRINGS.append(getenv(f"SESSION_STRING_{len(EXTRA_SESSION_STRINGS) + 1}"))
+    # Telegram user IDs allowed to run admin commands such as /profile (comma or space separated)
+    ADMIN_IDS = [int(i) for i in getenv("ADMIN_IDS", "").replace(",", " ").split()]
     BOT_START_TIME = time()
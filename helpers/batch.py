@@ -0,0 +1,201 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from typing import Awaitable, Callable
+
+from logger import LOGGER
+from helpers.metrics import METRICS
+from helpers.peers import PEER_CACHE, PEER_ERRORS
+
+
+class OrderedGate:
+    """Lets concurrent batch items deliver strictly in message-ID order.
+
+    Workers call ``wait_turn(msg_id)`` right before they send anything to the
+    user and ``finish(msg_id, status)`` once the item is done. ``next_id`` only
+    moves over a contiguous run of finished IDs, so everything below it is
+    fully delivered and it can be stored as the job's resume point.
+    """
+
+    def __init__(self, first_id: int):
+        self.next_id = first_id
+        self._finished = {}
+        self._cond = asyncio.Condition()
+
+    async def wait_turn(self, msg_id: int):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.next_id >= msg_id)
+
+    def is_turn(self, msg_id: int) -> bool:
+        return self.next_id >= msg_id
+
+    async def finish(self, msg_id: int, status: str):
+        committed = []
+        async with self._cond:
+            self._finished[msg_id] = status
+            while self.next_id in self._finished:
+                committed.append((self.next_id, self._finished.pop(self.next_id)))
+                self.next_id += 1
+            self._cond.notify_all()
+        return committed
+
+
+class _Turn:
+    """``wait_turn`` handed to batch items: await it, or poll ``ready()``."""
+
+    __slots__ = ("gate", "msg_id")
+
+    def __init__(self, gate: OrderedGate, msg_id: int):
+        self.gate = gate
+        self.msg_id = msg_id
+
+    def __call__(self):
+        return self.gate.wait_turn(self.msg_id)
+
+    def ready(self) -> bool:
+        return self.gate.is_turn(self.msg_id)
+
+
+async def run_batch_pool(
+    first_id: int,
+    last_id: int,
+    process: Callable[[int, Callable[[], Awaitable[None]]], Awaitable[str]],
+    on_commit: Callable[[int, str], None],
+    should_stop: Callable[[], bool],
+    workers: int = 4,
+):
+    """Process ``first_id..last_id`` with a pool of concurrent workers.
+
+    ``process(msg_id, wait_turn)`` must await ``wait_turn()`` before replying
+    to the user and return 'downloaded', 'skipped' or 'failed'.
+    ``wait_turn.ready()`` tells, without waiting, whether it is already the
+    item's turn. ``on_commit``
+    is called in ascending ID order as results become contiguous, which keeps
+    job counters consistent with the resume point. Once ``should_stop()`` is
+    true no new IDs are dispatched, but in-flight items are allowed to finish.
+    """
+    gate = OrderedGate(first_id)
+    pending = iter(range(first_id, last_id + 1))
+
+    async def _worker():
+        while not should_stop():
+            msg_id = next(pending, None)
+            if msg_id is None:
+                return
+            try:
+                status = await process(msg_id, _Turn(gate, msg_id))
+            except Exception as e:
+                LOGGER(__name__).error(f"Unhandled error at message {msg_id}: {e}")
+                status = "failed"
+            for committed_id, committed_status in await gate.finish(msg_id, status):
+                on_commit(committed_id, committed_status)
+
+    tasks = [asyncio.create_task(_worker()) for _ in range(max(1, workers))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return gate.next_id
+
+
+class MessagePrefetcher:
+    """Fetches batch messages in chunks ahead of the workers.
+
+    A single ``get_messages`` call returns up to ``chunk`` messages, so a long
+    range costs one metadata round-trip per chunk instead of one (or more) per
+    ID. At most ``window`` messages are held in memory; chunks are dropped as
+    soon as every ID in them has been handed out. Requests go through
+    ``pacer`` (see helpers.pacer) when one is given. With a ``sessions``
+    pool (see helpers.sessions) each chunk is fetched through the sessions
+    in the order the pool ranks them at that moment, instead of ``client``;
+    candidates a session cannot read are recorded in its peer cache scope.
+    """
+
+    def __init__(self, client, candidates, first_id: int, last_id: int, chunk: int = 200, window: int = 400, pacer=None, sessions=None):
+        self.client = client
+        self.pacer = pacer
+        self.sessions = sessions
+        self.candidates = list(candidates)
+        self.chat_id = None
+        self.first_id = first_id
+        self.last_id = last_id
+        self.chunk = max(1, chunk)
+        self.ahead = max(1, window // self.chunk)
+        self._chunks = {}    # chunk index -> asyncio.Task resolving to {msg_id: Message}
+        self._remaining = {}  # chunk index -> IDs not yet handed out
+
+    def _chunk_range(self, index: int):
+        start = self.first_id + index * self.chunk
+        return range(start, min(start + self.chunk, self.last_id + 1))
+
+    @METRICS.timed("prefetch")
+    async def _fetch(self, index: int):
+        ids = list(self._chunk_range(index))
+        candidates = [self.chat_id] if self.chat_id is not None else self.candidates
+        if self.sessions is not None:
+            # Fall through to the next session when one cannot read the chat
+            sessions = [(s.client, s.pacer, s.scope) for s in self.sessions.rank(candidates)]
+        else:
+            sessions = [(self.client, self.pacer, None)]
+        last_error = None
+        for client, pacer, scope in sessions:
+            track = scope is not None and PEER_CACHE is not None
+            for candidate in PEER_CACHE.order(candidates, scope) if track else candidates:
+                try:
+                    if pacer is not None:
+                        messages = await pacer.call(client.get_messages, chat_id=candidate, message_ids=ids)
+                    else:
+                        messages = await client.get_messages(chat_id=candidate, message_ids=ids)
+                except PEER_ERRORS as e:
+                    last_error = e
+                    if track:
+                        PEER_CACHE.mark(candidate, False, scope)
+                    continue
+                except Exception as e:
+                    last_error = e
+                    continue
+                if track:
+                    PEER_CACHE.mark(candidate, True, scope)
+                self.chat_id = candidate
+                if not isinstance(messages, list):
+                    messages = [messages]
+                return {msg.id: msg for msg in messages if msg is not None}
+        LOGGER(__name__).info(f"Prefetch failed for IDs {ids[0]}-{ids[-1]}: {last_error}")
+        return {}
+
+    def _schedule(self, index: int):
+        if index in self._chunks or index in self._remaining:
+            return
+        ids = self._chunk_range(index)
+        if not len(ids):
+            return
+        self._remaining[index] = len(ids)
+        self._chunks[index] = asyncio.create_task(self._fetch(index))
+
+    async def get(self, msg_id: int):
+        """Return ``(chat_id, Message)`` for ``msg_id`` or ``(None, None)``."""
+        if not self.first_id <= msg_id <= self.last_id:
+            return None, None
+        index = (msg_id - self.first_id) // self.chunk
+        for ahead in range(self.ahead):
+            self._schedule(index + ahead)
+        task = self._chunks.get(index)
+        if task is None:
+            return None, None
+        messages = await task
+        self._remaining[index] -= 1
+        if self._remaining[index] <= 0:
+            self._chunks.pop(index, None)
+        message = messages.pop(msg_id, None)
+        if message is None:
+            return None, None
+        return self.chat_id, message
+
+    def close(self):
+        for task in self._chunks.values():
+            if not task.done():
+                task.cancel()
+        self._chunks.clear()
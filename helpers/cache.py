@@ -0,0 +1,235 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import sqlite3
+from time import time
+from collections import OrderedDict
+from typing import Optional
+
+from logger import LOGGER
+from helpers.files import get_data_path
+
+FILE_CACHE_TTL = int(os.getenv("FILE_CACHE_TTL", str(30 * 86400)))  # seconds (default 30 days)
+FILE_CACHE_MAX_ENTRIES = int(os.getenv("FILE_CACHE_MAX_ENTRIES", "50000"))
+RECENT_TTL = int(os.getenv("DOWNLOAD_DEDUP_TTL", "900"))  # seconds (default 15 min)
+RECENT_MAX_ENTRIES = int(os.getenv("DOWNLOAD_DEDUP_MAX_ENTRIES", "10000"))
+RECENT_PERSIST = os.getenv("DOWNLOAD_DEDUP_PERSIST", "0") == "1"
+
+
+class FileIdCache:
+    """Maps a source ``file_unique_id`` to the bot-side ``file_id`` of our upload.
+
+    ``file_unique_id`` is the same for a file wherever it is posted, so a hit
+    lets the bot re-send the file instantly for any user instead of
+    downloading and uploading it again. Entries expire after ``ttl`` seconds
+    and the least recently used ones are evicted above ``max_entries``.
+    Hits only touch ``last_used`` in memory; the times are written in
+    batches of ``touch_batch`` and before every eviction, so a lookup costs
+    no commit. Worker processes share the file, so a lookup that hits a
+    locked database counts as a miss instead of failing the download.
+    """
+
+    def __init__(self, path: str, ttl: int = FILE_CACHE_TTL, max_entries: int = FILE_CACHE_MAX_ENTRIES, touch_batch: int = 100):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_batch = max(1, touch_batch)
+        self._touched = {}  # unique_id -> last_used not yet written
+        self.hits = 0
+        self.misses = 0
+        # A short busy timeout: a miss is cheaper than a lookup stuck behind another process
+        self._db = sqlite3.connect(path, timeout=2, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            " unique_id TEXT PRIMARY KEY,"
+            " file_id TEXT NOT NULL,"
+            " media_type TEXT NOT NULL,"
+            " file_size INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS file_ids_last_used ON file_ids (last_used)")
+        self._db.commit()
+        self._size = 0
+        self.purge()
+
+    def get(self, unique_id: Optional[str]):
+        """Return ``(file_id, media_type)`` or ``None``."""
+        if not unique_id:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT file_id, media_type, created_at FROM file_ids WHERE unique_id = ?",
+                (unique_id,),
+            ).fetchone()
+            if row is None or time() - row[2] > self.ttl:
+                if row is not None:
+                    self.delete(unique_id)
+                self.misses += 1
+                return None
+            self._touched[unique_id] = time()
+            if len(self._touched) >= self.touch_batch:
+                self._flush_touched()
+        except sqlite3.Error as e:
+            LOGGER(__name__).error(f"File ID cache lookup failed, treating as a miss: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], row[1]
+
+    def put(self, unique_id: Optional[str], file_id: Optional[str], media_type: str, file_size: int = 0):
+        if not unique_id or not file_id:
+            return
+        now = time()
+        replaced = self._db.execute(
+            "UPDATE file_ids SET file_id = ?, media_type = ?, file_size = ?, created_at = ?, last_used = ?"
+            " WHERE unique_id = ?",
+            (file_id, media_type, file_size or 0, now, now, unique_id),
+        ).rowcount
+        if not replaced:
+            self._db.execute(
+                "INSERT INTO file_ids VALUES (?, ?, ?, ?, ?, ?)",
+                (unique_id, file_id, media_type, file_size or 0, now, now),
+            )
+        self._db.commit()
+        # Only new rows count towards the cap
+        self._size += 0 if replaced else 1
+        if self._size > self.max_entries:
+            self.purge()
+
+    def _flush_touched(self):
+        if not self._touched:
+            return
+        self._db.executemany(
+            "UPDATE file_ids SET last_used = ? WHERE unique_id = ?",
+            [(last_used, unique_id) for unique_id, last_used in self._touched.items()],
+        )
+        self._db.commit()
+        self._touched.clear()
+
+    def delete(self, unique_id: str):
+        self._touched.pop(unique_id, None)
+        try:
+            self._db.execute("DELETE FROM file_ids WHERE unique_id = ?", (unique_id,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            LOGGER(__name__).error(f"File ID cache delete failed: {e}")
+
+    def purge(self):
+        """Drop expired entries and evict least recently used ones above the cap."""
+        self._flush_touched()
+        self._db.execute("DELETE FROM file_ids WHERE created_at < ?", (time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM file_ids WHERE unique_id IN ("
+            " SELECT unique_id FROM file_ids ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+        self._size = len(self)
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0]
+
+
+class RecentIndex:
+    """TTL set of recently delivered posts, used to skip duplicate requests.
+
+    Entries live in an insertion-ordered dict; re-marking a key moves it to
+    the end, so the oldest entry is always first. Expiry pops from the front
+    until it reaches a live entry and the cap evicts from the front as well,
+    which keeps every operation amortized O(1) with bounded memory. When
+    ``path`` is given, marks are also written to SQLite and live entries are
+    reloaded on start, so duplicates are still caught after a restart. The
+    table is pruned to live entries and ``max_entries`` on start and then
+    once every ``prune_every`` marks, not on each mark.
+    """
+
+    def __init__(self, ttl: int = RECENT_TTL, max_entries: int = RECENT_MAX_ENTRIES, path: Optional[str] = None, prune_every: int = 500):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.prune_every = max(1, prune_every)
+        self._entries = OrderedDict()  # (chat_id, message_id) -> marked_at
+        self._marks = 0  # marks written since the table was last pruned
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS recent ("
+                    " chat_id INTEGER NOT NULL,"
+                    " message_id INTEGER NOT NULL,"
+                    " marked_at REAL NOT NULL,"
+                    " PRIMARY KEY (chat_id, message_id))"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS recent_marked_at ON recent (marked_at)")
+                self._prune(time())
+                rows = self._db.execute(
+                    "SELECT chat_id, message_id, marked_at FROM recent ORDER BY marked_at DESC LIMIT ?",
+                    (self.max_entries,),
+                ).fetchall()
+                for chat_id, message_id, marked_at in reversed(rows):
+                    self._entries[(chat_id, message_id)] = marked_at
+            except sqlite3.Error as e:
+                LOGGER(__name__).error(f"Dedup index persistence disabled: {e}")
+                self._db = None
+
+    def _prune(self, now: float):
+        """Drop expired rows and the oldest ones above ``max_entries`` from the table."""
+        self._db.execute("DELETE FROM recent WHERE marked_at < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM recent WHERE rowid IN ("
+            " SELECT rowid FROM recent ORDER BY marked_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+        self._marks = 0
+
+    def _expire(self, now: float):
+        cutoff = now - self.ttl
+        while self._entries:
+            marked_at = next(iter(self._entries.values()))
+            if marked_at >= cutoff:
+                break
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        marked_at = self._entries.get(key)
+        if marked_at is None:
+            return False
+        if time() - marked_at > self.ttl:
+            self._entries.pop(key, None)
+            return False
+        return True
+
+    def mark(self, key):
+        now = time()
+        self._entries[key] = now
+        self._entries.move_to_end(key)
+        self._expire(now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._db is not None:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO recent VALUES (?, ?, ?)", (*key, now))
+                self._db.commit()
+                self._marks += 1
+                if self._marks >= self.prune_every:
+                    self._prune(now)
+            except sqlite3.Error as e:
+                LOGGER(__name__).error(f"Dedup index write failed: {e}")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+RECENT_DOWNLOADS = RecentIndex(path=get_data_path("recent.db") if RECENT_PERSIST else None)
+
+try:
+    FILE_CACHE = FileIdCache(get_data_path("file_ids.db"))
+except sqlite3.Error as e:
+    LOGGER(__name__).error(f"File ID cache disabled: {e}")
+    FILE_CACHE = None
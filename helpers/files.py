@@ -5,8 +5,16 @@ import os
 from typing import Optional
 
 from logger import LOGGER
+from helpers.storage import STORAGE
 
 SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
+THUMB_SUFFIX = ".thumb.jpg"  # per-download video thumbnail, removed with the download
+DATA_DIR = os.getenv("DATA_DIR", "data")  # persistent caches/state (keep on a volume to survive restarts)
+
+def get_data_path(filename: str) -> str:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
+
 
 def get_download_path(folder_id: int, filename: str, root_dir: str = "downloads") -> str:
     folder = os.path.join(root_dir, str(folder_id))
@@ -15,13 +23,16 @@ def get_download_path(folder_id: int, filename: str, root_dir: str = "downloads"
 
 
 def cleanup_download(path: str) -> None:
+    STORAGE.release(path)
     try:
         LOGGER(__name__).info(f"Cleaning Download: {path}")
-        
+
         if os.path.exists(path):
             os.remove(path)
         if os.path.exists(path + ".temp"):
             os.remove(path + ".temp")
+        if os.path.exists(path + THUMB_SUFFIX):
+            os.remove(path + THUMB_SUFFIX)
 
         folder = os.path.dirname(path)
         if os.path.isdir(folder) and not os.listdir(folder):
@@ -0,0 +1,126 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import json
+import sqlite3
+import threading
+
+from logger import LOGGER
+from helpers.files import get_data_path
+
+# Columns persisted per job; ``candidates`` is stored as JSON
+JOB_FIELDS = (
+    "name", "state", "start_id", "end_id", "next_id", "prefix", "candidates",
+    "chat_id", "origin_msg_id", "initiator_id", "start_url", "end_url",
+    "downloaded", "skipped", "failed", "created_at", "updated_at",
+)
+
+
+class BatchJobStore:
+    """Durable storage for /bdl jobs so they survive restarts and crashes.
+
+    Jobs are checkpointed after every committed message ID. The database
+    runs in WAL mode with ``synchronous=NORMAL``, which keeps a checkpoint
+    to a single cheap append while still surviving a process crash. A job
+    row stays until the job finishes or is cancelled; its ``state`` is
+    'active' or 'paused'.
+
+    Callers on the event loop run these methods with ``asyncio.to_thread``,
+    since the file may be shared with other processes; one connection
+    serves every thread, one statement at a time.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS batch_jobs ("
+            " job_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " name TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " start_id INTEGER NOT NULL,"
+            " end_id INTEGER NOT NULL,"
+            " next_id INTEGER NOT NULL,"
+            " prefix TEXT NOT NULL,"
+            " candidates TEXT NOT NULL,"
+            " chat_id INTEGER NOT NULL,"
+            " origin_msg_id INTEGER NOT NULL DEFAULT 0,"
+            " initiator_id INTEGER NOT NULL DEFAULT 0,"
+            " start_url TEXT,"
+            " end_url TEXT,"
+            " downloaded INTEGER NOT NULL DEFAULT 0,"
+            " skipped INTEGER NOT NULL DEFAULT 0,"
+            " failed INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _record(row):
+        record = dict(zip(("job_id",) + JOB_FIELDS, row))
+        record["candidates"] = json.loads(record["candidates"])
+        return record
+
+    @staticmethod
+    def _values(record: dict):
+        values = dict(record)
+        values["candidates"] = json.dumps(values["candidates"])
+        return [values[field] for field in JOB_FIELDS]
+
+    def add(self, record: dict) -> int:
+        """Insert a new job and return its ``job_id``."""
+        with self._lock:
+            cursor = self._db.execute(
+                f"INSERT INTO batch_jobs ({', '.join(JOB_FIELDS)})"
+                f" VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+                self._values(record),
+            )
+            self._db.commit()
+        return cursor.lastrowid
+
+    def save(self, job_id: int, record: dict):
+        """Checkpoint a job. Errors are logged, never raised into the batch."""
+        try:
+            with self._lock:
+                self._db.execute(
+                    f"UPDATE batch_jobs SET {', '.join(f'{field} = ?' for field in JOB_FIELDS)}"
+                    " WHERE job_id = ?",
+                    self._values(record) + [job_id],
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            LOGGER(__name__).error(f"Checkpoint failed for job {job_id}: {e}")
+
+    def delete(self, job_id: int):
+        try:
+            with self._lock:
+                self._db.execute("DELETE FROM batch_jobs WHERE job_id = ?", (job_id,))
+                self._db.commit()
+        except sqlite3.Error as e:
+            LOGGER(__name__).error(f"Could not remove job {job_id}: {e}")
+
+    def get(self, job_id: int):
+        """Return one stored job as a dict, or ``None`` once it is gone."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT job_id, {', '.join(JOB_FIELDS)} FROM batch_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._record(row) if row is not None else None
+
+    def load(self):
+        """Return every stored job as a dict, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT job_id, {', '.join(JOB_FIELDS)} FROM batch_jobs ORDER BY job_id"
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+
+try:
+    JOB_STORE = BatchJobStore(get_data_path("batch_jobs.db"))
+except sqlite3.Error as e:
+    LOGGER(__name__).error(f"Batch job store disabled, jobs will not survive restarts: {e}")
+    JOB_STORE = None
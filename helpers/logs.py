@@ -0,0 +1,100 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import gzip
+import json
+import shutil
+import logging
+from collections import deque
+
+from logger import LOG_BACKUPS, LOG_FILE
+
+LOG_TAIL_DEFAULT = 200
+LOG_TAIL_MAX = 20000
+
+
+def log_files():
+    """Existing log files, oldest rotation first."""
+    names = [f"{LOG_FILE}.{i}" for i in range(LOG_BACKUPS, 0, -1)] + [LOG_FILE]
+    return [name for name in names if os.path.exists(name)]
+
+
+def parse_log_query(args):
+    """Parse ``/logs`` options: ``tail N``, ``level L``, ``job NAME``, ``msg ID``, ``grep TEXT``.
+
+    Returns a dict of the given options; raises ``ValueError`` on bad input.
+    """
+    query = {}
+    tokens = list(args)
+    while tokens:
+        key = tokens.pop(0).lower()
+        if key not in ("tail", "level", "job", "msg", "grep"):
+            raise ValueError(f"unknown option `{key}`")
+        if key == "tail" and (not tokens or not tokens[0].isdigit()):
+            query["tail"] = LOG_TAIL_DEFAULT
+            continue
+        if not tokens:
+            raise ValueError(f"`{key}` needs a value")
+        value = tokens.pop(0)
+        if key == "tail":
+            query["tail"] = min(max(1, int(value)), LOG_TAIL_MAX)
+        elif key == "level":
+            level = logging.getLevelName(value.upper())
+            if not isinstance(level, int):
+                raise ValueError(f"unknown level `{value}`")
+            query["level"] = level
+        elif key == "grep":
+            # The rest of the command is the search text
+            query["grep"] = " ".join([value] + tokens).lower()
+            tokens = []
+        else:
+            query[key] = value
+    return query
+
+
+def _matches(line: str, query) -> bool:
+    if "grep" in query and query["grep"] not in line.lower():
+        return False
+    if not ({"level", "job", "msg"} & query.keys()):
+        return True
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return False
+    if "level" in query and logging.getLevelName(entry.get("level", "")) < query["level"]:
+        return False
+    if "job" in query and str(entry.get("job")) != query["job"]:
+        return False
+    if "msg" in query and str(entry.get("msg_id")) != query["msg"]:
+        return False
+    return True
+
+
+def read_logs(query):
+    """Matching lines across the rotated set, oldest first; the last ``tail`` when given."""
+    lines = deque(maxlen=query.get("tail", LOG_TAIL_MAX))
+    for name in log_files():
+        with open(name, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if _matches(line, query):
+                    lines.append(line)
+    return list(lines)
+
+
+def write_logs(query, dest: str) -> int:
+    """Write the lines ``read_logs`` matches to ``dest`` and return how many; nothing is written for none."""
+    lines = read_logs(query)
+    if lines:
+        with open(dest, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+    return len(lines)
+
+
+def gzip_logs(dest: str) -> str:
+    """Write every rotated log file, oldest first, into one gzip stream at ``dest``."""
+    with gzip.open(dest, "wb") as out:
+        for name in log_files():
+            with open(name, "rb") as f:
+                shutil.copyfileobj(f, out)
+    return dest
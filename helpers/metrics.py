@@ -0,0 +1,212 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import asyncio
+from time import monotonic
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager
+
+from logger import LOGGER
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # local HTTP port for Prometheus scraping, 0 = off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PREFIX = "tgsave"
+
+# Seconds; covers a metadata round-trip up to a multi-GB transfer
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower  # open-ended +Inf bucket
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """In-process counters for the download pipeline.
+
+    ``timer(stage)`` records how long a stage took (fetch, download, ffprobe,
+    thumbnail, upload, floodwait, ...) into a per-stage histogram, and
+    counts the exception type when the stage fails. Queue depths are gauges
+    read from callbacks at scrape time, so they cost nothing in between.
+    """
+
+    def __init__(self):
+        self.started = monotonic()
+        self.stages = {}   # stage -> Histogram
+        self.bytes = {}    # direction -> bytes
+        self.errors = {}   # (stage, exception type) -> count
+        self.results = {}  # (kind, outcome) -> count
+        self.gauges = {}   # name -> (help, callable)
+        self.refreshers = []  # coroutine functions awaited before each scrape
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, e)
+            raise
+        finally:
+            self.observe(stage, monotonic() - started)
+
+    def timed(self, stage: str):
+        """Decorator form of ``timer`` for coroutine functions."""
+        def decorator(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_bytes(self, direction: str, size: int):
+        self.bytes[direction] = self.bytes.get(direction, 0) + (size or 0)
+
+    def error(self, stage: str, error):
+        key = (stage, error if isinstance(error, str) else type(error).__name__)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def result(self, kind: str, outcome: str):
+        key = (kind, outcome)
+        self.results[key] = self.results.get(key, 0) + 1
+
+    def gauge(self, name: str, help_text: str, func):
+        self.gauges[name] = (help_text, func)
+
+    def refresh(self, func):
+        """Await ``func`` before each scrape, for gauges whose value is too slow to read in ``render``."""
+        self.refreshers.append(func)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        p = METRICS_PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds Time spent per pipeline stage.",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines += [f"# HELP {p}_bytes_total Bytes transferred.", f"# TYPE {p}_bytes_total counter"]
+        for direction, size in sorted(self.bytes.items()):
+            lines.append(f'{p}_bytes_total{{direction="{direction}"}} {size}')
+
+        lines += [f"# HELP {p}_errors_total Failed stages by exception type.", f"# TYPE {p}_errors_total counter"]
+        for (stage, error_type), value in sorted(self.errors.items()):
+            lines.append(f'{p}_errors_total{{stage="{stage}",type="{error_type}"}} {value}')
+
+        lines += [f"# HELP {p}_results_total Finished requests by outcome.", f"# TYPE {p}_results_total counter"]
+        for (kind, outcome), value in sorted(self.results.items()):
+            lines.append(f'{p}_results_total{{kind="{kind}",outcome="{outcome}"}} {value}')
+
+        for name, (help_text, func) in sorted(self.gauges.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} gauge", f"{p}_{name} {value}"]
+
+        lines += [f"# TYPE {p}_uptime_seconds gauge", f"{p}_uptime_seconds {monotonic() - self.started:.0f}"]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        uptime = max(monotonic() - self.started, 1e-9)
+        return {
+            "uptime": uptime,
+            "stages": {
+                stage: {
+                    "count": h.count,
+                    "avg": h.sum / h.count if h.count else 0.0,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "total": h.sum,
+                }
+                for stage, h in self.stages.items()
+            },
+            "bytes": dict(self.bytes),
+            "rates": {direction: size / uptime for direction, size in self.bytes.items()},
+            "errors": sorted(self.errors.items(), key=lambda item: -item[1]),
+            "results": dict(self.results),
+        }
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain headers; nothing in them matters here
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+                for refresh in self.refreshers:
+                    try:
+                        await refresh()
+                    except Exception as e:
+                        LOGGER(__name__).error(f"Metrics refresh failed: {e}")
+                status, body = "200 OK", self.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        """Start the scrape endpoint; returns the server, or ``None`` when disabled."""
+        if not port:
+            return None
+        try:
+            server = await asyncio.start_server(self._handle, host, port)
+        except OSError as e:
+            LOGGER(__name__).error(f"Metrics endpoint disabled: {e}")
+            return None
+        LOGGER(__name__).info(f"Metrics endpoint on http://{host}:{port}/metrics")
+        return server
+
+
+METRICS = Metrics()
@@ -4,6 +4,8 @@
 from pyrogram.parser import Parser
 from pyrogram.utils import get_channel_id
 
+MEDIA_ATTRS = ("document", "video", "audio", "voice", "video_note", "animation", "sticker", "photo")
+
 
 async def get_parsed_msg(text, entities):
     return Parser.unparse(text, entities or [], is_html=False)
@@ -94,3 +96,12 @@ def get_file_name(message_id: int, chat_message) -> str:
         return f"{message_id}.jpg"
     else:
         return f"{message_id}"
+
+
+def get_media_object(chat_message):
+    """Return the media object (Video, Document, Photo, ...) of a message, if any."""
+    for attr in MEDIA_ATTRS:
+        media = getattr(chat_message, attr, None)
+        if media:
+            return media
+    return None
@@ -0,0 +1,112 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import asyncio
+from time import monotonic
+
+from logger import LOGGER
+from pyrogram.errors import FloodWait
+
+from helpers.metrics import METRICS
+
+PACER_START_RATE = float(os.getenv("PACER_START_RATE", "2"))  # user-session requests per second
+PACER_MIN_RATE = float(os.getenv("PACER_MIN_RATE", "0.2"))
+PACER_MAX_RATE = float(os.getenv("PACER_MAX_RATE", "20"))
+PACER_STEP = float(os.getenv("PACER_STEP", "0.1"))  # rate added per successful request
+PACER_BACKOFF = 0.5  # rate multiplier on FloodWait
+
+
+class Pacer:
+    """AIMD pacing for requests made with the user session.
+
+    Requests are spaced ``1 / rate`` seconds apart. Every success raises the
+    rate by ``step`` (additive increase); a FloodWait halves it
+    (multiplicative decrease) and blocks all requests for exactly the
+    number of seconds Telegram asked for.
+    """
+
+    def __init__(
+        self,
+        rate: float = PACER_START_RATE,
+        min_rate: float = PACER_MIN_RATE,
+        max_rate: float = PACER_MAX_RATE,
+        step: float = PACER_STEP,
+        backoff: float = PACER_BACKOFF,
+    ):
+        self.min_rate = max(0.01, min_rate)
+        self.max_rate = max(self.min_rate, max_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.step = step
+        self.backoff = backoff
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.requests = 0
+        self.flood_waits = 0
+        self._next_at = 0.0
+        self._generation = 0  # bumped by each FloodWait; slots from older generations are void
+
+    async def wait(self):
+        """Wait for this caller's send slot."""
+        self.waiting += 1
+        try:
+            while True:
+                now = monotonic()
+                start = max(now, self._next_at)
+                self._next_at = start + 1 / self.rate
+                generation = self._generation
+                if start > now:
+                    await asyncio.sleep(start - now)
+                if generation == self._generation and self.blocked_until <= monotonic():
+                    break
+                # A FloodWait arrived while this caller was waiting: sit it out, then
+                # queue again at the lowered rate instead of firing with the others
+                if self.blocked_until > monotonic():
+                    with METRICS.timer("floodwait"):
+                        while self.blocked_until > monotonic():
+                            await asyncio.sleep(self.blocked_until - monotonic())
+            self.requests += 1
+        finally:
+            self.waiting -= 1
+
+    def success(self):
+        self.rate = min(self.max_rate, self.rate + self.step)
+
+    def throttled(self, seconds: float):
+        self.flood_waits += 1
+        METRICS.error("user_requests", "FloodWait")
+        now = monotonic()
+        # Calls in flight when the FloodWait hit all report it; back off once per block
+        if now >= self.blocked_until:
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        # Slots handed out before the FloodWait are void; new ones start when the block ends
+        self._next_at = self.blocked_until
+        self._generation += 1
+        LOGGER(__name__).warning(f"FloodWait {seconds}s, pacing user requests at {self.rate:.2f}/s")
+
+    async def call(self, func, *args, retries: int = 2, **kwargs):
+        """Run ``func`` in a paced slot, retrying after FloodWait up to ``retries`` times."""
+        for attempt in range(retries + 1):
+            await self.wait()
+            try:
+                result = await func(*args, **kwargs)
+            except FloodWait as e:
+                self.throttled(e.value)
+                if attempt == retries:
+                    raise
+                continue
+            self.success()
+            return result
+
+    def snapshot(self):
+        return {
+            "rate": self.rate,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "flood_waits": self.flood_waits,
+            "blocked_for": max(0.0, self.blocked_until - monotonic()),
+        }
+
+
+PACER = Pacer()
@@ -0,0 +1,221 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import sqlite3
+from time import time
+
+from logger import LOGGER
+from pyrogram import raw
+from pyrogram.utils import get_channel_id
+from pyrogram.errors import (
+    ChannelInvalid,
+    ChannelPrivate,
+    PeerIdInvalid,
+    UsernameInvalid,
+    UsernameNotOccupied,
+)
+
+from helpers.files import get_data_path
+from helpers.metrics import METRICS
+from helpers.pacer import PACER
+
+PEER_NEGATIVE_TTL = int(os.getenv("PEER_NEGATIVE_TTL", "86400"))  # seconds a failed chat ID stays demoted
+
+# Errors that mean "this candidate is not the right chat", as opposed to a
+# transient failure that says nothing about the candidate
+PEER_ERRORS = (
+    ChannelInvalid,
+    ChannelPrivate,
+    PeerIdInvalid,
+    UsernameInvalid,
+    UsernameNotOccupied,
+    KeyError,
+    ValueError,
+)
+
+
+class PeerCache:
+    """Remembers how chat references resolve, across restarts.
+
+    ``getChatMsgID`` yields one or two candidate chat IDs per link. The
+    candidate that worked is stored so later links try it first, and the
+    ones that failed are kept as negative entries (tried last) for
+    ``negative_ttl`` seconds. Resolved peers (ID, access hash, type and
+    username) are stored too: user clients keep their peer cache in
+    memory, so they are written back into their storage on start and both
+    ``-100…`` and ``@username`` links resolve without an extra lookup.
+
+    Extra user sessions (see helpers.sessions) pass their own ``scope``, so
+    what one account can read says nothing about another. Access hashes
+    are per account too, so peers are stored and restored per scope.
+    """
+
+    def __init__(self, path: str, negative_ttl: int = PEER_NEGATIVE_TTL):
+        self.negative_ttl = negative_ttl
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_refs ("
+            " candidate TEXT PRIMARY KEY,"
+            " ok INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = [column[1] for column in self._db.execute("PRAGMA table_info(peers)")]
+        if columns and "scope" not in columns:
+            # Older databases keyed peers by ID alone; those rows belong to the primary session
+            if "username" not in columns:
+                self._db.execute("ALTER TABLE peers ADD COLUMN username TEXT")
+            self._db.execute("ALTER TABLE peers RENAME TO peers_old")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS peers ("
+            " scope TEXT NOT NULL,"
+            " id INTEGER NOT NULL,"
+            " access_hash INTEGER NOT NULL,"
+            " type TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " username TEXT,"
+            " PRIMARY KEY (scope, id))"
+        )
+        if columns and "scope" not in columns:
+            self._db.execute(
+                "INSERT OR IGNORE INTO peers SELECT '', id, access_hash, type, updated_at, username FROM peers_old"
+            )
+            self._db.execute("DROP TABLE peers_old")
+        self._db.commit()
+        self._refs = {}  # str(candidate) -> (ok, updated_at)
+        for candidate, ok, updated_at in self._db.execute("SELECT candidate, ok, updated_at FROM chat_refs"):
+            self._refs[candidate] = (bool(ok), updated_at)
+        self._peers = {}  # (scope, id) -> username
+        for scope, peer_id, username in self._db.execute("SELECT scope, id, username FROM peers"):
+            self._peers[(scope, peer_id)] = username
+
+    @staticmethod
+    def _key(candidate, scope: str = "") -> str:
+        return f"{scope}|{candidate}" if scope else str(candidate)
+
+    def order(self, candidates, scope: str = ""):
+        """Known-good candidates first, unknown next, recently failed last."""
+        good, unknown, bad = [], [], []
+        now = time()
+        for candidate in candidates:
+            entry = self._refs.get(self._key(candidate, scope))
+            if entry is None or (not entry[0] and now - entry[1] > self.negative_ttl):
+                unknown.append(candidate)
+            elif entry[0]:
+                good.append(candidate)
+            else:
+                bad.append(candidate)
+        return good + unknown + bad
+
+    def known_bad(self, candidates, scope: str = "") -> bool:
+        """True if every candidate failed recently, i.e. the session cannot read the chat."""
+        now = time()
+        for candidate in candidates:
+            entry = self._refs.get(self._key(candidate, scope))
+            if entry is None or entry[0] or now - entry[1] > self.negative_ttl:
+                return False
+        return bool(candidates)
+
+    def mark(self, candidate, ok: bool, scope: str = ""):
+        key = self._key(candidate, scope)
+        entry = self._refs.get(key)
+        if entry is not None and entry[0] == ok and (ok or time() - entry[1] < self.negative_ttl / 2):
+            return
+        self._refs[key] = (ok, time())
+        try:
+            self._db.execute("INSERT OR REPLACE INTO chat_refs VALUES (?, ?, ?)", (key, int(ok), time()))
+            self._db.commit()
+        except sqlite3.Error as e:
+            LOGGER(__name__).error(f"Peer cache write failed: {e}")
+
+    async def remember_peer(self, client, candidate, username: str = None, scope: str = ""):
+        """Store the access hash (and username) of a chat ``client`` has just resolved."""
+        try:
+            peer = await client.resolve_peer(candidate)
+        except Exception:
+            return
+        if isinstance(peer, raw.types.InputPeerChannel):
+            row = (get_channel_id(peer.channel_id), peer.access_hash, "channel")
+        elif isinstance(peer, raw.types.InputPeerUser):
+            row = (peer.user_id, peer.access_hash, "user")
+        elif isinstance(peer, raw.types.InputPeerChat):
+            row = (-peer.chat_id, 0, "group")
+        else:
+            return
+        if username is None and isinstance(candidate, str):
+            username = candidate
+        key = (scope, row[0])
+        # Pyrogram looks usernames up in lower case, without the @
+        username = username.lstrip("@").lower() if username else self._peers.get(key)
+        if key in self._peers and self._peers[key] == username:
+            return
+        self._peers[key] = username
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO peers (scope, id, access_hash, type, updated_at, username)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, *row, time(), username),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            LOGGER(__name__).error(f"Peer cache write failed: {e}")
+
+    async def restore(self, client, scope: str = ""):
+        """Load the peers stored for ``scope`` into the client's in-memory session storage."""
+        rows = self._db.execute(
+            "SELECT id, access_hash, type, username FROM peers WHERE scope = ?", (scope,)
+        ).fetchall()
+        if not rows:
+            return
+        # Storage rows are (id, access_hash, type, username, phone_number)
+        peers = [(peer_id, access_hash, peer_type, username, None) for peer_id, access_hash, peer_type, username in rows]
+        try:
+            await client.storage.update_peers(peers)
+            # Pyrofork also keeps usernames in their own table
+            usernames = [(peer_id, username) for peer_id, _, _, username in rows if username]
+            if usernames and hasattr(client.storage, "update_usernames"):
+                await client.storage.update_usernames(usernames)
+            LOGGER(__name__).info(f"Restored {len(peers)} peer(s) into {getattr(client, 'name', 'the user session')}")
+        except Exception as e:
+            LOGGER(__name__).error(f"Could not restore peers: {e}")
+
+try:
+    PEER_CACHE = PeerCache(get_data_path("peers.db"))
+except sqlite3.Error as e:
+    LOGGER(__name__).error(f"Peer cache disabled: {e}")
+    PEER_CACHE = None
+
+
+@METRICS.timed("fetch")
+async def get_source_message(client, candidates, message_id: int, pacer=None, scope: str = ""):
+    """Fetch ``message_id`` trying chat candidates in cached order.
+
+    Returns ``(chat_id, message, last_error)``; ``message`` is ``None`` when
+    no candidate worked. ``pacer`` and ``scope`` belong to the user session
+    that ``client`` is (the primary session's by default).
+    """
+    pacer = pacer or PACER
+    if PEER_CACHE is not None:
+        candidates = PEER_CACHE.order(candidates, scope)
+    last_error = None
+    for candidate in candidates:
+        try:
+            message = await pacer.call(client.get_messages, chat_id=candidate, message_ids=message_id)
+        except PEER_ERRORS as e:
+            last_error = e
+            if PEER_CACHE is not None:
+                PEER_CACHE.mark(candidate, False, scope)
+            continue
+        except Exception as e:
+            last_error = e
+            continue
+        if message:
+            if PEER_CACHE is not None:
+                PEER_CACHE.mark(candidate, True, scope)
+                chat = getattr(message, "chat", None)
+                await PEER_CACHE.remember_peer(client, candidate, getattr(chat, "username", None), scope)
+            return candidate, message, None
+    if last_error is not None:
+        METRICS.error("fetch", last_error)
+    return None, None, last_error
@@ -0,0 +1,208 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import json
+import shutil
+import asyncio
+from time import time
+from collections import OrderedDict
+from asyncio.subprocess import PIPE
+from asyncio import create_subprocess_exec, create_subprocess_shell
+
+from logger import LOGGER
+from helpers.files import THUMB_SUFFIX
+from helpers.metrics import METRICS
+
+FFMPEG_WORKERS = int(os.getenv("FFMPEG_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+FFMPEG_TIMEOUT = int(os.getenv("FFMPEG_TIMEOUT", "60"))  # seconds per ffmpeg/ffprobe run
+PROBE_CACHE_SIZE = int(os.getenv("PROBE_CACHE_SIZE", "256"))
+
+
+async def cmd_exec(cmd, shell=False):
+    if shell:
+        proc = await create_subprocess_shell(cmd, stdout=PIPE, stderr=PIPE)
+    else:
+        proc = await create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            # Reap it, or each cancelled run leaves a zombie and an open transport
+            await asyncio.shield(proc.wait())
+        raise
+    try:
+        stdout = stdout.decode().strip()
+    except:
+        stdout = "Unable to decode the response!"
+    try:
+        stderr = stderr.decode().strip()
+    except:
+        stderr = "Unable to decode the error!"
+    return stdout, stderr, proc.returncode
+
+
+class ProcessPool:
+    """Bounded pool for ffmpeg/ffprobe runs.
+
+    At most ``workers`` processes run at once; the rest wait in FIFO order
+    on the semaphore. Queue wait and run times are tracked so /stats can
+    show whether media tooling is a bottleneck.
+    """
+
+    def __init__(self, workers: int = FFMPEG_WORKERS):
+        self.workers = max(1, workers)
+        self._semaphore = asyncio.Semaphore(self.workers)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, cmd, timeout: int = FFMPEG_TIMEOUT):
+        queued_at = time()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        waited = time() - queued_at
+        self.wait_time += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.running += 1
+        started = time()
+        try:
+            result = await asyncio.wait_for(cmd_exec(cmd), timeout=timeout)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.run_time += time() - started
+            self._semaphore.release()
+        self.completed += 1
+        if result[2] != 0:
+            self.failed += 1
+        return result
+
+    def snapshot(self):
+        runs = max(self.completed, 1)
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": self.wait_time / runs,
+            "max_wait": self.max_wait,
+            "avg_run": self.run_time / runs,
+        }
+
+
+FFMPEG_POOL = ProcessPool()
+_PROBE_CACHE = OrderedDict()  # (path, size, mtime_ns) -> probe result
+
+
+def _tag(tags, name):
+    return tags.get(name) or tags.get(name.upper()) or tags.get(name.capitalize())
+
+
+def _parse_probe(data) -> dict:
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    tags = dict(audio.get("tags") or {})
+    tags.update(fmt.get("tags") or {})
+
+    try:
+        duration = round(float(fmt.get("duration") or video.get("duration") or audio.get("duration") or 0))
+    except (TypeError, ValueError):
+        duration = 0
+    width = int(video.get("width") or 0)
+    height = int(video.get("height") or 0)
+    rotation = (video.get("tags") or {}).get("rotate")
+    for side_data in video.get("side_data_list") or []:
+        rotation = side_data.get("rotation", rotation)
+    try:
+        if abs(int(float(rotation or 0))) in (90, 270):
+            width, height = height, width
+    except (TypeError, ValueError):
+        pass
+
+    return {
+        "duration": duration,
+        "width": width,
+        "height": height,
+        "artist": _tag(tags, "artist"),
+        "title": _tag(tags, "title"),
+        "has_video": bool(video),
+        "has_audio": bool(audio),
+    }
+
+
+async def probe(path: str):
+    """Return format and stream info for ``path`` from a single ffprobe run.
+
+    Results are cached by path, size and mtime. Returns ``None`` when
+    ffprobe is missing or fails.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    cached = _PROBE_CACHE.get(key)
+    if cached is not None:
+        _PROBE_CACHE.move_to_end(key)
+        return cached
+    if not shutil.which("ffprobe"):
+        return None
+    try:
+        with METRICS.timer("ffprobe"):
+            stdout, stderr, code = await FFMPEG_POOL.run([
+                "ffprobe", "-hide_banner", "-loglevel", "error",
+                "-print_format", "json", "-show_format", "-show_streams", path,
+            ])
+    except Exception as e:
+        LOGGER(__name__).info(f"ffprobe unavailable or failed: {e}")
+        return None
+    if code != 0 or not stdout:
+        LOGGER(__name__).info(f"ffprobe failed (code={code}): {stderr}")
+        return None
+    try:
+        info = _parse_probe(json.loads(stdout))
+    except (ValueError, AttributeError) as e:
+        LOGGER(__name__).info(f"ffprobe output unreadable: {e}")
+        return None
+    _PROBE_CACHE[key] = info
+    while len(_PROBE_CACHE) > PROBE_CACHE_SIZE:
+        _PROBE_CACHE.popitem(last=False)
+    return info
+
+
+async def make_thumbnail(video_file: str, duration: int = 0, output: str = None):
+    """Grab a frame from the middle of ``video_file`` into a per-file JPEG."""
+    if not shutil.which("ffmpeg"):
+        return None
+    output = output or video_file + THUMB_SUFFIX
+    seek = (duration or 3) // 2
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-ss", str(seek), "-i", video_file,
+        "-vf", "thumbnail", "-q:v", "1", "-frames:v", "1",
+        "-threads", "1", output,
+    ]
+    try:
+        with METRICS.timer("thumbnail"):
+            _, err, code = await FFMPEG_POOL.run(cmd)
+        if code != 0 or not os.path.exists(output):
+            LOGGER(__name__).info(f"Thumbnail generation failed (code={code}): {err}")
+            return None
+    except Exception as e:
+        LOGGER(__name__).info(f"Thumbnail generation exception: {e}")
+        return None
+    return output
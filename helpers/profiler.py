@@ -0,0 +1,159 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import sys
+import asyncio
+import threading
+from time import monotonic
+from collections import Counter
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # seconds between event-loop samples
+PROFILE_TASK_INTERVAL = float(os.getenv("PROFILE_TASK_INTERVAL", "0.05"))  # seconds between task-stack samples
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_MAX_DEPTH = 128
+
+# Leaf frames of an event loop waiting for I/O
+IDLE_FRAMES = ("selectors:select", "selectors:poll")
+
+
+def _label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def _frame_stack(frame):
+    """Frames from the outermost caller down to ``frame``."""
+    stack = []
+    while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+        stack.append(_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _task_stack(task):
+    """Await chain of a suspended task, from its coroutine down to what it awaits."""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None and len(stack) < PROFILE_MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        stack.append(_label(frame))
+        awaited = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+        if type(awaited).__name__ == "async_generator_asend":
+            # An @asynccontextmanager entering or leaving: follow the generator it drives
+            generator = getattr(frame.f_locals.get("self"), "gen", None)
+            if generator is not None:
+                coro = generator
+                continue
+        if awaited is not None and not hasattr(awaited, "cr_frame") and not hasattr(awaited, "gi_frame"):
+            stack.append(f"<{type(awaited).__name__}>")
+            break
+        coro = awaited
+    return stack
+
+
+class Profile:
+    """Samples collected by one ``SamplingProfiler.run``.
+
+    ``loop`` counts what the event-loop thread was executing (on-CPU time
+    and blocking calls; waiting for I/O ends in a ``selectors`` frame).
+    ``tasks`` counts where every pending task was suspended, which
+    attributes time spent awaiting network, disk or subprocesses to the
+    coroutine that is waiting.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.loop = Counter()
+        self.tasks = Counter()
+        self.loop_samples = 0
+        self.task_samples = 0
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> str:
+        """Brendan Gregg's collapsed format, one ``frame;frame;frame count`` per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def busy_ratio(self) -> float:
+        idle = sum(count for stack, count in self.loop.items() if stack.endswith(IDLE_FRAMES))
+        return 1 - idle / self.loop_samples if self.loop_samples else 0.0
+
+    def top_self(self, limit: int = 8):
+        """Leaf functions the loop thread spent the most samples in, idle excluded."""
+        leaves = Counter()
+        for stack, count in self.loop.items():
+            if not stack.endswith(IDLE_FRAMES):
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def top_waiting(self, limit: int = 8, prefixes=("main:", "helpers.")):
+        """Bot functions that appear in the most task samples (inclusive)."""
+        inclusive = Counter()
+        for stack, count in self.tasks.items():
+            for frame in set(stack.split(";")):
+                if frame.startswith(prefixes) and not frame.startswith("helpers.metrics:"):
+                    inclusive[frame] += count
+        return inclusive.most_common(limit)
+
+
+class SamplingProfiler:
+    """Low-overhead sampling profiler for the running event loop.
+
+    A daemon thread reads the loop thread's current frame every
+    ``interval`` seconds through ``sys._current_frames``; nothing is
+    instrumented, so the loop itself only pays for the GIL hand-offs. A
+    coroutine on the loop samples the await chains of all pending tasks
+    every ``task_interval`` seconds. Only one profile runs at a time.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, task_interval: float = PROFILE_TASK_INTERVAL):
+        self.interval = max(0.001, interval)
+        self.task_interval = max(0.01, task_interval)
+        self.running = False
+
+    def _sample_loop_thread(self, thread_id, stop, profile):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            profile.loop[";".join(_frame_stack(frame))] += 1
+            profile.loop_samples += 1
+
+    async def _sample_tasks(self, deadline, profile):
+        current = asyncio.current_task()
+        while monotonic() < deadline:
+            for task in asyncio.all_tasks():
+                if task is current or task.done():
+                    continue
+                stack = _task_stack(task)
+                if stack:
+                    profile.tasks[";".join(stack)] += 1
+            profile.task_samples += 1
+            await asyncio.sleep(self.task_interval)
+
+    async def run(self, seconds: float) -> Profile:
+        if self.running:
+            raise RuntimeError("A profile is already running")
+        seconds = min(max(1, seconds), PROFILE_MAX_SECONDS)
+        profile = Profile(seconds)
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample_loop_thread,
+            args=(threading.get_ident(), stop, profile),
+            name="loop-profiler",
+            daemon=True,
+        )
+        self.running = True
+        sampler.start()
+        try:
+            await self._sample_tasks(monotonic() + seconds, profile)
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+            self.running = False
+        return profile
+
+
+PROFILER = SamplingProfiler()
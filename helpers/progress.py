@@ -0,0 +1,160 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import asyncio
+from time import time
+
+from logger import LOGGER
+from pyrogram.errors import FloodWait, MessageNotModified
+
+PROGRESS_EDIT_INTERVAL = float(os.getenv("PROGRESS_EDIT_INTERVAL", "5"))  # min seconds between edits of one status message
+PROGRESS_CHAT_INTERVAL = float(os.getenv("PROGRESS_CHAT_INTERVAL", "3"))  # min seconds between edits in one chat
+PROGRESS_MAX_ITEMS = 5  # transfers listed per status message
+PROGRESS_IDLE_TTL = 600  # forget status messages with no updates for this long
+
+SIZE_UNITS = ["B", "KB", "MB", "GB", "TB"]
+
+
+def _size(value: float) -> str:
+    for unit in SIZE_UNITS:
+        if value < 1024:
+            return f"{value:.2f} {unit}"
+        value /= 1024
+    return f"{value:.2f} PB"
+
+
+def _bar(fraction: float, width: int = 10) -> str:
+    filled = min(width, int(fraction * width))
+    return "▓" * filled + "░" * (width - filled)
+
+
+class ProgressItem:
+    __slots__ = ("label", "current", "total", "started")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.current = 0
+        self.total = 0
+        self.started = time()
+
+
+class ProgressJob:
+    """One status message and the transfers currently reported in it."""
+
+    def __init__(self, message, start_time: float):
+        self.message = message
+        self.start_time = start_time
+        self.title = None
+        self.items = {}
+        self.next_edit = 0.0
+        self.last_update = time()
+        self.editing = False
+
+    def render(self) -> str:
+        lines = [self.title or "**📥 Transfer Progress**"]
+        active = [item for item in self.items.values() if item.total and item.current < item.total]
+        now = time()
+        for item in active[:PROGRESS_MAX_ITEMS]:
+            fraction = item.current / item.total
+            speed = item.current / max(now - item.started, 0.001)
+            eta = (item.total - item.current) / speed if speed else 0
+            lines.append(
+                f"\n{item.label}\n"
+                f"[{_bar(fraction)}] {fraction * 100:.2f}%\n"
+                f"{_size(item.current)}/{_size(item.total)} | {_size(speed)}/s | ETA {int(eta)}s"
+            )
+        if len(active) > PROGRESS_MAX_ITEMS:
+            lines.append(f"\n…and {len(active) - PROGRESS_MAX_ITEMS} more transfer(s)")
+        return "\n".join(lines)
+
+
+class ProgressReporter:
+    """Central, rate-limited progress reporting for every transfer.
+
+    Transfers report through ``update`` (a pyrogram progress callback); each
+    status message is a job that may aggregate many concurrent transfers
+    (album members, batch items). Only one edit per job is in flight, jobs
+    are edited at most every PROGRESS_EDIT_INTERVAL seconds, and every chat
+    has its own edit budget. Frames that are not due, or that fall into a
+    FloodWait, are dropped rather than queued.
+    """
+
+    def __init__(self, edit_interval: float = PROGRESS_EDIT_INTERVAL, chat_interval: float = PROGRESS_CHAT_INTERVAL):
+        self.edit_interval = edit_interval
+        self.chat_interval = chat_interval
+        self.cancel_event = None
+        self.jobs = {}       # (chat_id, message_id) -> ProgressJob
+        self.chat_next = {}  # chat_id -> earliest time the chat may be edited again
+        self.edits = 0
+        self.dropped = 0
+        self._tasks = set()  # edits in flight; the loop only keeps weak references to tasks
+
+    @staticmethod
+    def _key(message):
+        return message.chat.id, message.id
+
+    def job(self, message, start_time: float = None) -> ProgressJob:
+        key = self._key(message)
+        job = self.jobs.get(key)
+        if job is None:
+            job = self.jobs[key] = ProgressJob(message, start_time or time())
+        return job
+
+    def set_title(self, message, title: str):
+        self.job(message).title = title
+
+    def done(self, message, key=None):
+        """Forget one transfer of a status message, or the whole message."""
+        if key is None:
+            self.jobs.pop(self._key(message), None)
+            return
+        job = self.jobs.get(self._key(message))
+        if job is not None:
+            job.items.pop(key, None)
+
+    async def update(self, current, total, job: ProgressJob, label: str, key=None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise asyncio.CancelledError()
+        item = job.items.get(key or label)
+        if item is None:
+            item = job.items[key or label] = ProgressItem(label)
+        item.current = current
+        item.total = total
+        now = time()
+        job.last_update = now
+
+        chat_id = job.message.chat.id
+        if job.editing or now < job.next_edit or now < self.chat_next.get(chat_id, 0):
+            self.dropped += 1
+            return
+        job.editing = True
+        job.next_edit = now + self.edit_interval
+        self.chat_next[chat_id] = now + self.chat_interval
+        task = asyncio.create_task(self._edit(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _edit(self, job: ProgressJob):
+        try:
+            await job.message.edit_text(job.render())
+            self.edits += 1
+        except MessageNotModified:
+            pass
+        except FloodWait as e:
+            # Skip frames for this chat until Telegram lets us edit again
+            self.chat_next[job.message.chat.id] = time() + e.value
+        except Exception as e:
+            LOGGER(__name__).info(f"Progress edit failed, dropping status message: {e}")
+            self.jobs.pop(self._key(job.message), None)
+        finally:
+            job.editing = False
+            self._expire()
+
+    def _expire(self):
+        cutoff = time() - PROGRESS_IDLE_TTL
+        for key in [k for k, job in self.jobs.items() if job.last_update < cutoff]:
+            self.jobs.pop(key, None)
+
+
+PROGRESS = ProgressReporter()
@@ -0,0 +1,176 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from helpers.metrics import METRICS
+
+SCHEDULER_SLOTS = int(os.getenv("SCHEDULER_SLOTS", "8"))  # posts transferred at once, across all users
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "50"))  # waiting requests before new ones are refused
+
+PRIORITY_INTERACTIVE = 0  # /dl and pasted links
+PRIORITY_BATCH = 1        # /bdl items
+
+
+class QueueFull(Exception):
+    """Raised when a request arrives while the queue is at its depth limit."""
+
+
+class Ticket:
+    __slots__ = ("owner", "priority", "future", "held")
+
+    def __init__(self, owner, priority: int):
+        self.owner = owner
+        self.priority = priority
+        self.future = None
+        self.held = False
+
+
+class Scheduler:
+    """Grants transfer slots by priority, round-robin across users.
+
+    At most ``slots`` posts are processed at once. Waiters of a lower
+    priority number are always served first; within a priority every user
+    has their own FIFO and users take turns, so one long batch cannot starve
+    another user's batch. Interactive requests are refused with ``QueueFull``
+    once ``max_queue`` requests are already waiting.
+    """
+
+    def __init__(self, slots: int = SCHEDULER_SLOTS, max_queue: int = SCHEDULER_MAX_QUEUE):
+        self.slots = max(1, slots)
+        self.max_queue = max_queue
+        self.running = 0
+        self._queues = {}  # priority -> OrderedDict(owner -> deque[Ticket]), in round-robin order
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for users in self._queues.values() for q in users.values())
+
+    def full(self) -> bool:
+        return self.max_queue > 0 and self.queued >= self.max_queue
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place of a waiting ticket in the grant order, 0 if not waiting."""
+        users = self._queues.get(ticket.priority, {})
+        own = users.get(ticket.owner)
+        if not own or ticket not in own:
+            return 0
+        ahead = sum(
+            len(q) for priority, other in self._queues.items() if priority < ticket.priority
+            for q in other.values()
+        )
+        index = own.index(ticket)
+        owners = list(users)
+        own_rank = owners.index(ticket.owner)
+        for rank, owner in enumerate(owners):
+            if owner != ticket.owner:
+                # Users ahead in the rotation get one extra turn before ours
+                ahead += min(len(users[owner]), index + (1 if rank < own_rank else 0))
+        return ahead + index + 1
+
+    def _enqueue(self, ticket: Ticket, front: bool = False):
+        users = self._queues.setdefault(ticket.priority, OrderedDict())
+        queue = users.get(ticket.owner)
+        if queue is None:
+            queue = users[ticket.owner] = deque()
+        if front:
+            queue.appendleft(ticket)
+        else:
+            queue.append(ticket)
+
+    def _dispatch(self):
+        while self.running < self.slots:
+            ticket = self._next()
+            if ticket is None:
+                return
+            self.running += 1
+            ticket.held = True
+            ticket.future.set_result(None)
+
+    def _next(self):
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            while users:
+                owner, queue = next(iter(users.items()))
+                ticket = queue.popleft()
+                if queue:
+                    users.move_to_end(owner)
+                else:
+                    del users[owner]
+                if not ticket.future.done():
+                    return ticket
+        return None
+
+    def _remove(self, ticket: Ticket):
+        users = self._queues.get(ticket.priority, {})
+        queue = users.get(ticket.owner)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del users[ticket.owner]
+
+    def submit(self, owner, priority: int, check_full: bool = False) -> Ticket:
+        """Queue a ticket; await ``acquire`` to wait for its slot."""
+        if check_full and self.full():
+            raise QueueFull()
+        ticket = Ticket(owner, priority)
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._enqueue(ticket)
+        self._dispatch()
+        return ticket
+
+    async def acquire(self, ticket: Ticket):
+        try:
+            with METRICS.timer("queue_interactive" if ticket.priority == PRIORITY_INTERACTIVE else "queue_batch"):
+                await ticket.future
+        except asyncio.CancelledError:
+            self.cancel(ticket)
+            raise
+
+    def cancel(self, ticket: Ticket):
+        """Withdraw a ticket that will never be awaited, freeing its slot if granted."""
+        self._remove(ticket)
+        self.release(ticket)
+
+    def release(self, ticket: Ticket):
+        if ticket.held:
+            ticket.held = False
+            self.running -= 1
+            self._dispatch()
+
+    async def yield_while(self, ticket: Ticket, awaitable):
+        """Give the slot up while ``awaitable`` waits on something else, then take it back.
+
+        The returning ticket goes to the front of its owner's queue so it is
+        not overtaken by that owner's newer work.
+        """
+        self.release(ticket)
+        await awaitable
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._enqueue(ticket, front=True)
+        self._dispatch()
+        await self.acquire(ticket)
+
+    @asynccontextmanager
+    async def slot(self, owner, priority: int, ticket: Ticket = None):
+        ticket = ticket or self.submit(owner, priority)
+        await self.acquire(ticket)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def snapshot(self):
+        return {
+            "slots": self.slots,
+            "running": self.running,
+            "queued": self.queued,
+            "interactive": sum(len(q) for q in self._queues.get(PRIORITY_INTERACTIVE, {}).values()),
+            "batch": sum(len(q) for q in self._queues.get(PRIORITY_BATCH, {}).values()),
+        }
+
+
+SCHEDULER = Scheduler()
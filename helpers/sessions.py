@@ -0,0 +1,146 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import asyncio
+from time import monotonic
+from contextlib import contextmanager
+
+from logger import LOGGER
+
+from helpers.pacer import PACER, Pacer
+from helpers.peers import PEER_CACHE, get_source_message
+
+
+class UserSession:
+    """One user account: its client, its own pacer and how many transfers it is running."""
+
+    def __init__(self, client, pacer: Pacer, scope: str = ""):
+        self.client = client
+        self.name = getattr(client, "name", "user")
+        self.pacer = pacer
+        self.scope = scope  # PeerCache scope; "" for the primary session
+        self.active = 0
+
+    @property
+    def load(self) -> int:
+        return self.active + self.pacer.waiting
+
+    def blocked_for(self) -> float:
+        return max(0.0, self.pacer.blocked_until - monotonic())
+
+
+class SessionPool:
+    """Routes source fetches and downloads across several user sessions.
+
+    The first session added is the primary one (``SESSION_STRING``); it
+    uses the global ``PACER`` and the unscoped peer cache. Every other
+    session gets its own pacer, since FloodWaits are per account. A fetch
+    goes to the least-loaded session that has not recently failed to read
+    the source chat, skipping FloodWaited sessions while any other is
+    free; the next session is tried when one fails. Media is downloaded by the session that fetched the
+    message, because file references are tied to that account.
+    """
+
+    def __init__(self):
+        self.sessions = []
+        self._by_client = {}
+
+    def add(self, client) -> UserSession:
+        if not self.sessions:
+            session = UserSession(client, PACER)
+        else:
+            session = UserSession(client, Pacer(), scope=getattr(client, "name", f"user_{len(self.sessions)}"))
+        self.sessions.append(session)
+        self._by_client[id(client)] = session
+        return session
+
+    def remove(self, session: UserSession):
+        self.sessions.remove(session)
+        self._by_client.pop(id(session.client), None)
+
+    def clear(self):
+        self.sessions.clear()
+        self._by_client.clear()
+
+    @property
+    def primary(self) -> UserSession:
+        return self.sessions[0]
+
+    def session(self, client):
+        return self._by_client.get(id(client))
+
+    def pacer(self, client) -> Pacer:
+        session = self.session(client)
+        return session.pacer if session is not None else PACER
+
+    def rank(self, candidates):
+        """Sessions in the order a fetch for ``candidates`` should try them."""
+        def key(item):
+            index, session = item
+            cannot_read = PEER_CACHE is not None and PEER_CACHE.known_bad(candidates, session.scope)
+            return (cannot_read, session.blocked_for() > 0, session.load, index)
+        return [session for _, session in sorted(enumerate(self.sessions), key=key)]
+
+    def pick(self, candidates) -> UserSession:
+        return self.rank(candidates)[0]
+
+    @contextmanager
+    def busy(self, client):
+        """Count a transfer running on ``client`` towards its session's load."""
+        session = self.session(client)
+        if session is not None:
+            session.active += 1
+        try:
+            yield
+        finally:
+            if session is not None:
+                session.active -= 1
+
+    async def fetch(self, candidates, message_id: int, client=None):
+        """``get_source_message`` through the pool; ``client`` pins the session.
+
+        Returns ``(chat_id, message, last_error)`` like ``get_source_message``.
+        """
+        if client is not None and self.session(client) is None:
+            return await get_source_message(client, candidates, message_id)
+        sessions = [self.session(client)] if client is not None else self.rank(candidates)
+        last_error = None
+        for session in sessions:
+            with self.busy(session.client):
+                chat_id, message, error = await get_source_message(
+                    session.client, candidates, message_id, pacer=session.pacer, scope=session.scope
+                )
+            if message is not None:
+                return chat_id, message, None
+            last_error = error or last_error
+            if len(sessions) > 1:
+                LOGGER(__name__).info(f"{session.name} could not fetch {message_id}: {error}")
+        return None, None, last_error
+
+    async def start(self):
+        """Start every session; extra sessions that fail to start are dropped."""
+        results = await asyncio.gather(*(s.client.start() for s in self.sessions), return_exceptions=True)
+        for session, result in list(zip(self.sessions, results)):
+            if not isinstance(result, BaseException):
+                continue
+            if session is self.primary:
+                raise result
+            LOGGER(__name__).error(f"User session {session.name} failed to start, leaving it out: {result}")
+            self.remove(session)
+
+    def snapshot(self):
+        return [
+            {
+                "name": session.name,
+                "active": session.active,
+                "waiting": session.pacer.waiting,
+                "rate": session.pacer.rate,
+                "requests": session.pacer.requests,
+                "flood_waits": session.pacer.flood_waits,
+                "blocked_for": session.blocked_for(),
+            }
+            for session in self.sessions
+        ]
+
+
+SESSIONS = SessionPool()
@@ -0,0 +1,107 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import shutil
+import asyncio
+
+from logger import LOGGER
+
+DOWNLOAD_DIR = "downloads"
+STORAGE_BUDGET = int(os.getenv("STORAGE_BUDGET", "0"))  # bytes for downloads/, 0 = free disk space minus STORAGE_MIN_FREE
+STORAGE_MIN_FREE = int(os.getenv("STORAGE_MIN_FREE", str(512 * 1024 * 1024)))  # bytes always left free
+
+
+class StorageManager:
+    """Byte reservations for files written under downloads/.
+
+    A download reserves its expected size before it starts and waits while
+    the reservation would push the total over the budget. Reservations are
+    keyed by absolute path and released when the file is cleaned up. A file
+    bigger than the whole budget is let through once nothing else is
+    reserved, so it fails on its own instead of blocking the queue forever.
+    ``urgent`` lets a caller that others depend on (the batch item whose
+    turn it is to deliver) overcommit instead of waiting.
+    """
+
+    def __init__(self, root: str = DOWNLOAD_DIR, budget: int = STORAGE_BUDGET, min_free: int = STORAGE_MIN_FREE):
+        self.root = root
+        self.min_free = min_free
+        self._budget = budget
+        self._reserved = {}  # path -> bytes
+        self._cond = None
+        self.waiting = 0
+
+    @property
+    def budget(self) -> int:
+        if self._budget <= 0:
+            # Fixed on first use so our own downloads do not shrink it
+            usage = shutil.disk_usage(os.path.dirname(os.path.abspath(self.root)))
+            self._budget = max(0, usage.free - self.min_free) or 1
+        return self._budget
+
+    @property
+    def reserved(self) -> int:
+        return sum(self._reserved.values())
+
+    def _fits(self, size: int) -> bool:
+        return not self._reserved or self.reserved + size <= self.budget
+
+    async def reserve(self, path: str, size: int, urgent=None):
+        """Wait until ``size`` bytes fit in the budget and reserve them for ``path``."""
+        path = os.path.abspath(path)
+        if path in self._reserved:
+            return
+        size = max(0, int(size or 0))
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            if not self._fits(size):
+                LOGGER(__name__).info(
+                    f"Waiting for disk budget: {path} needs {size} bytes, {self.reserved} of {self.budget} reserved"
+                )
+                self.waiting += 1
+                try:
+                    while not self._fits(size) and not (urgent and urgent()):
+                        # Timed wait: ``urgent`` can turn true without a release
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), timeout=1)
+                        except asyncio.TimeoutError:
+                            pass
+                finally:
+                    self.waiting -= 1
+            self._reserved[path] = size
+
+    def release(self, path: str):
+        if self._reserved.pop(os.path.abspath(path), None) is None or self._cond is None:
+            return
+        try:
+            asyncio.get_running_loop().create_task(self._notify())
+        except RuntimeError:
+            pass
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    def used(self) -> int:
+        """Bytes on disk under ``root``. Walks the tree, so call it off the event loop."""
+        total = 0
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(folder, name))
+                except OSError:
+                    pass
+        return total
+
+    def snapshot(self):
+        return {
+            "budget": self.budget,
+            "reserved": self.reserved,
+            "files": len(self._reserved),
+            "waiting": self.waiting,
+        }
+
+
+STORAGE = StorageManager()
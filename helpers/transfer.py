@@ -0,0 +1,381 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import asyncio
+import inspect
+import mimetypes
+from math import ceil
+
+from logger import LOGGER
+from helpers.msg import get_media_object
+from pyrogram import raw
+from pyrogram.errors import FloodWait
+from pyrogram.session import Auth, Session
+from pyrogram.file_id import FileId, FileType
+
+UPLOAD_PART_SIZE = 512 * 1024  # Telegram maximum for upload.saveBigFilePart
+BIG_FILE_SIZE = 10 * 1024 * 1024  # files above this must use saveBigFilePart
+MAX_DOWNLOAD_PART_SIZE = 1024 * 1024  # upload.getFile limit; must divide 1 MiB
+TRANSIENT_ERRORS = (OSError, asyncio.TimeoutError, ConnectionError)
+
+_DC_SESSIONS = {}  # (client name, dc_id) -> [Session], reused across transfers
+_DC_SESSIONS_LOCK = asyncio.Lock()
+
+FILE_TYPES = {
+    "video": FileType.VIDEO,
+    "audio": FileType.AUDIO,
+    "document": FileType.DOCUMENT,
+}
+
+
+def rnd_id() -> int:
+    return int.from_bytes(os.urandom(8), "big", signed=True)
+
+
+async def call_progress(progress, current, total, progress_args=()):
+    if progress is None:
+        return
+    result = progress(current, total, *progress_args)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def start_dc_session(client, dc_id: int) -> Session:
+    """Open a media session on ``dc_id``, exporting our authorization if it is foreign."""
+    test_mode = await client.storage.test_mode()
+    home_dc = await client.storage.dc_id()
+    if dc_id == home_dc:
+        auth_key = await client.storage.auth_key()
+    else:
+        auth_key = await Auth(client, dc_id, test_mode).create()
+    session = Session(client, dc_id, auth_key, test_mode, is_media=True)
+    await session.start()
+    if dc_id != home_dc:
+        exported = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+        await session.invoke(raw.functions.auth.ImportAuthorization(id=exported.id, bytes=exported.bytes))
+    return session
+
+
+async def get_dc_sessions(client, dc_id: int, count: int):
+    """Return ``count`` pooled media sessions for ``dc_id``, opening missing ones."""
+    async with _DC_SESSIONS_LOCK:
+        sessions = _DC_SESSIONS.setdefault((client.name, dc_id), [])
+        while len(sessions) < count:
+            sessions.append(await start_dc_session(client, dc_id))
+    return sessions[:count]
+
+
+async def stop_media_sessions():
+    for sessions in _DC_SESSIONS.values():
+        for session in sessions:
+            try:
+                await session.stop()
+            except Exception as e:
+                LOGGER(__name__).info(f"Failed to stop media session: {e}")
+    _DC_SESSIONS.clear()
+
+
+def valid_part_size(part_size: int) -> int:
+    """Clamp a download part size to what upload.getFile accepts."""
+    if 4096 <= part_size <= MAX_DOWNLOAD_PART_SIZE and MAX_DOWNLOAD_PART_SIZE % part_size == 0:
+        return part_size
+    return MAX_DOWNLOAD_PART_SIZE
+
+
+def _file_location(file_id: FileId):
+    if file_id.file_type == FileType.PHOTO:
+        return raw.types.InputPhotoFileLocation(
+            id=file_id.media_id,
+            access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference,
+            thumb_size=file_id.thumbnail_size,
+        )
+    return raw.types.InputDocumentFileLocation(
+        id=file_id.media_id,
+        access_hash=file_id.access_hash,
+        file_reference=file_id.file_reference,
+        thumb_size=file_id.thumbnail_size or "",
+    )
+
+
+async def _get_part(session, location, offset: int, limit: int, retries: int = 3) -> bytes:
+    for attempt in range(retries + 1):
+        try:
+            # Every FloodWait is raised so the user session's pacer sees it
+            r = await session.invoke(
+                raw.functions.upload.GetFile(location=location, offset=offset, limit=limit),
+                sleep_threshold=0,
+            )
+        except TRANSIENT_ERRORS:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(attempt + 1)
+            continue
+        if not isinstance(r, raw.types.upload.File):
+            raise ValueError("File is served from a CDN; parallel download not supported")
+        return r.bytes
+
+
+async def iter_file_parts(client, media, connections: int = 4, part_size: int = MAX_DOWNLOAD_PART_SIZE):
+    """Yield ``(offset, bytes)`` for every part of ``media``, fetched concurrently.
+
+    One worker per pooled session pulls the next part offset and fetches it
+    with ``upload.getFile``. Parts are yielded as they complete (not in
+    order) through a queue bounded to twice the connection count.
+    """
+    file_id = FileId.decode(media.file_id)
+    location = _file_location(file_id)
+    part_size = valid_part_size(part_size)
+    total_parts = max(1, ceil(media.file_size / part_size))
+    sessions = await get_dc_sessions(client, file_id.dc_id, max(1, connections))
+    pending = iter(range(total_parts))
+    queue = asyncio.Queue(maxsize=2 * len(sessions))
+
+    async def _worker(session):
+        for index in pending:
+            offset = index * part_size
+            await queue.put((offset, await _get_part(session, location, offset, part_size)))
+
+    tasks = [asyncio.create_task(_worker(session)) for session in sessions]
+
+    async def _watch():
+        try:
+            await asyncio.gather(*tasks)
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    watcher = asyncio.create_task(_watch())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for task in tasks + [watcher]:
+            if not task.done():
+                task.cancel()
+
+
+async def download_parallel(
+    client, media, file_path: str, connections: int = 4, part_size: int = MAX_DOWNLOAD_PART_SIZE,
+    progress=None, progress_args=(),
+) -> str:
+    """Download ``media`` to ``file_path`` over several connections.
+
+    The file is preallocated and every part is written at its own offset as
+    soon as it arrives, so parts may complete in any order. The partial
+    ``.temp`` file is removed here if the download fails or is cancelled.
+    """
+    file_size = media.file_size
+    temp_path = file_path + ".temp"
+    loop = asyncio.get_running_loop()
+    current = 0
+    try:
+        with open(temp_path, "wb") as f:
+            f.truncate(file_size)
+            fd = f.fileno()
+            async for offset, chunk in iter_file_parts(client, media, connections, part_size):
+                await loop.run_in_executor(None, os.pwrite, fd, chunk, offset)
+                current += len(chunk)
+                await call_progress(progress, min(current, file_size), file_size, progress_args)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return file_path
+
+
+async def file_parts(path: str):
+    """Yield ``(index, bytes)`` upload parts read from a local file."""
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as f:
+        fd = f.fileno()
+        index = 0
+        while True:
+            chunk = await loop.run_in_executor(None, os.pread, fd, UPLOAD_PART_SIZE, index * UPLOAD_PART_SIZE)
+            if not chunk:
+                return
+            yield index, chunk
+            index += 1
+
+
+async def upload_parts(
+    client, parts, file_size: int, file_name: str, workers: int = 4, connections: int = 1,
+    retries: int = 3, progress=None, progress_args=(),
+):
+    """Upload ``(index, bytes)`` parts from the async iterable ``parts`` as one big file.
+
+    Up to ``workers`` parts are in flight at once, spread over ``connections``
+    pooled media sessions. A failed part is retried on its own before the
+    upload is given up. Parts may come from a stream that is still being
+    downloaded. Returns the ``InputFileBig`` to attach to a media upload.
+    """
+    file_id = rnd_id()
+    total_parts = max(1, ceil(file_size / UPLOAD_PART_SIZE))
+    queue = asyncio.Queue(maxsize=max(1, workers))
+    errors = []
+    uploaded = 0
+    sessions = await get_dc_sessions(client, await client.storage.dc_id(), max(1, connections))
+
+    async def _save_part(session, index, chunk):
+        for attempt in range(retries + 1):
+            try:
+                return await session.invoke(
+                    raw.functions.upload.SaveBigFilePart(
+                        file_id=file_id,
+                        file_part=index,
+                        file_total_parts=total_parts,
+                        bytes=chunk,
+                    ),
+                    sleep_threshold=0,
+                )
+            except FloodWait as e:
+                # Bot-side wait: honoured here, it must not slow down the user pacer
+                if attempt == retries:
+                    raise
+                LOGGER(__name__).info(f"FloodWait {e.value}s on upload part {index}")
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                LOGGER(__name__).info(f"Retrying upload part {index} (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(attempt + 1)
+
+    async def _worker(session):
+        nonlocal uploaded
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if errors:
+                # Keep draining so the feeder never blocks on a dead pool
+                continue
+            index, chunk = item
+            try:
+                await _save_part(session, index, chunk)
+            except Exception as e:
+                errors.append(e)
+                continue
+            uploaded += len(chunk)
+            await call_progress(progress, min(uploaded, file_size), file_size, progress_args)
+
+    tasks = [
+        asyncio.create_task(_worker(sessions[i % len(sessions)]))
+        for i in range(max(1, workers))
+    ]
+    try:
+        async for item in parts:
+            if errors:
+                break
+            await queue.put(item)
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if hasattr(parts, "aclose"):
+            await parts.aclose()
+    if errors:
+        raise errors[0]
+
+    return raw.types.InputFileBig(id=file_id, parts=total_parts, name=file_name)
+
+
+async def upload_media_file_id(
+    client, chat_id, input_file, media_type: str, file_name: str, mime_type: str = None,
+    duration: int = 0, width: int = 0, height: int = 0, performer: str = None, title: str = None, thumb: str = None,
+) -> str:
+    """Attach an uploaded file to a media object and return its bot-side file_id.
+
+    The file_id can then be sent with the regular reply_* methods, so captions
+    and parse modes behave exactly like a normal upload.
+    """
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if media_type == "video":
+        attributes.append(
+            raw.types.DocumentAttributeVideo(duration=duration or 0, w=width or 0, h=height or 0, supports_streaming=True)
+        )
+    elif media_type == "audio":
+        attributes.append(raw.types.DocumentAttributeAudio(duration=duration or 0, performer=performer, title=title))
+
+    media = await client.invoke(
+        raw.functions.messages.UploadMedia(
+            peer=await client.resolve_peer(chat_id),
+            media=raw.types.InputMediaUploadedDocument(
+                file=input_file,
+                mime_type=mime_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream",
+                attributes=attributes,
+                thumb=await client.save_file(thumb) if thumb else None,
+                force_file=media_type == "document" or None,
+            ),
+        )
+    )
+    document = media.document
+    return FileId(
+        file_type=FILE_TYPES.get(media_type, FileType.DOCUMENT),
+        dc_id=document.dc_id,
+        media_id=document.id,
+        access_hash=document.access_hash,
+        file_reference=document.file_reference,
+    ).encode()
+
+
+async def stream_parts(client, chat_message, buffer_parts: int = 8, connections: int = 1, part_size: int = MAX_DOWNLOAD_PART_SIZE):
+    """Yield ``(index, bytes)`` upload parts while the source is still downloading.
+
+    With one connection ``stream_media`` hands out 1 MiB chunks in order and
+    they are re-sliced into upload parts. With several connections, parts
+    are fetched in parallel and mapped to upload part indexes by offset,
+    which is fine because big-file parts may be uploaded in any order. Either
+    way a bounded queue keeps at most ``buffer_parts`` parts in memory and
+    nothing touches the disk.
+    """
+    queue = asyncio.Queue(maxsize=max(1, buffer_parts))
+    part_size = valid_part_size(part_size)
+    parallel = connections > 1 and part_size % UPLOAD_PART_SIZE == 0
+
+    async def _producer():
+        try:
+            if parallel:
+                media = get_media_object(chat_message)
+                async for offset, chunk in iter_file_parts(client, media, connections, part_size):
+                    for start in range(0, len(chunk), UPLOAD_PART_SIZE):
+                        await queue.put(((offset + start) // UPLOAD_PART_SIZE, chunk[start:start + UPLOAD_PART_SIZE]))
+            else:
+                pending = b""
+                index = 0
+                async for chunk in client.stream_media(chat_message):
+                    pending += chunk
+                    while len(pending) >= UPLOAD_PART_SIZE:
+                        await queue.put((index, pending[:UPLOAD_PART_SIZE]))
+                        pending = pending[UPLOAD_PART_SIZE:]
+                        index += 1
+                if pending:
+                    await queue.put((index, pending))
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(_producer())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+    LOGGER(__name__).info(f"Streamed message {chat_message.id} without touching disk")
@@ -0,0 +1,133 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
+from logger import LOGGER
+
+from helpers.metrics import METRICS
+from helpers.msg import get_media_object
+
+RELAY_CHAT_ID = int(os.getenv("RELAY_CHAT_ID", "0"))  # chat every bot can post in; 0 disables helper bots
+RELAY_CLEANUP = os.getenv("RELAY_CLEANUP", "1") == "1"  # delete relay messages once delivered
+
+
+class Uploader:
+    """One bot account and the number of uploads it is running."""
+
+    def __init__(self, client):
+        self.client = client
+        self.name = getattr(client, "name", "bot")
+        self.active = 0
+        self.uploads = 0
+
+
+class UploaderPool:
+    """Spreads uploads over the primary bot and optional helper bots.
+
+    Telegram file_ids only work for the bot that produced them, so a helper
+    bot uploads into ``relay_chat_id`` and the primary bot reads that
+    message back to get its own file_id for the same file. The user then
+    gets the file from the primary bot by file_id, which costs no upload
+    bandwidth. Without helpers or a relay chat every upload goes through
+    the primary bot as before.
+    """
+
+    def __init__(self, relay_chat_id: int = RELAY_CHAT_ID):
+        self.relay_chat_id = relay_chat_id
+        self.uploaders = []
+
+    def add(self, client) -> Uploader:
+        uploader = Uploader(client)
+        self.uploaders.append(uploader)
+        return uploader
+
+    def remove(self, uploader: Uploader):
+        self.uploaders.remove(uploader)
+
+    def clear(self):
+        self.uploaders.clear()
+
+    @property
+    def primary(self) -> Uploader:
+        return self.uploaders[0]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.relay_chat_id) and len(self.uploaders) > 1
+
+    @property
+    def size(self) -> int:
+        """Uploads that can run side by side, one per bot."""
+        return len(self.uploaders) if self.enabled else 1
+
+    @asynccontextmanager
+    async def lease(self, bot):
+        """Yield the least busy bot for one upload; ``bot`` itself when fan-out is off."""
+        uploader = None
+        if self.enabled and self.primary.client is bot:
+            # Ties go to helpers: the primary bot also does every delivery
+            uploader = min(self.uploaders, key=lambda u: (u.active, u is self.primary))
+            uploader.active += 1
+        try:
+            yield uploader.client if uploader is not None else bot
+        finally:
+            if uploader is not None:
+                uploader.active -= 1
+                uploader.uploads += 1
+
+    async def relay(self, client, media, media_type: str, progress=None, progress_args=(), **attrs):
+        """Send ``media`` (a path or ``client``'s file_id) to the relay chat with ``client``.
+
+        Returns ``(file_id, relay_message_id)`` where ``file_id`` is the
+        primary bot's own file_id for the uploaded file.
+        """
+        send = {
+            "photo": client.send_photo,
+            "video": client.send_video,
+            "audio": client.send_audio,
+            "document": client.send_document,
+        }[media_type]
+        relayed = await send(self.relay_chat_id, media, progress=progress, progress_args=progress_args, **attrs)
+        fetched = relayed
+        if client is not self.primary.client:
+            with METRICS.timer("relay"):
+                fetched = await self.primary.client.get_messages(chat_id=self.relay_chat_id, message_ids=relayed.id)
+        uploaded = get_media_object(fetched)
+        if uploaded is None:
+            await self.discard(client, relayed.id)
+            raise ValueError(f"Relay message {relayed.id} has no media")
+        return uploaded.file_id, relayed.id
+
+    async def discard(self, client, message_id: int):
+        """Delete a relay message once the primary bot has delivered its file."""
+        if not RELAY_CLEANUP or message_id is None:
+            return
+        try:
+            await client.delete_messages(self.relay_chat_id, message_id)
+        except Exception as e:
+            LOGGER(__name__).info(f"Could not delete relay message {message_id}: {e}")
+
+    async def start(self):
+        """Start every bot; helper bots that fail to start are dropped."""
+        results = await asyncio.gather(*(u.client.start() for u in self.uploaders), return_exceptions=True)
+        for uploader, result in list(zip(self.uploaders, results)):
+            if not isinstance(result, BaseException):
+                continue
+            if uploader is self.primary:
+                raise result
+            LOGGER(__name__).error(f"Helper bot {uploader.name} failed to start, leaving it out: {result}")
+            self.remove(uploader)
+        if len(self.uploaders) > 1 and not self.relay_chat_id:
+            LOGGER(__name__).warning("Helper bots are configured but RELAY_CHAT_ID is not set; they stay unused")
+
+    def snapshot(self):
+        return [
+            {"name": u.name, "active": u.active, "uploads": u.uploads}
+            for u in self.uploaders
+        ]
+
+
+UPLOADERS = UploaderPool()
@@ -2,16 +2,13 @@
 # Channel: https://t.me/itsSmartDev
 
 import os
-import shutil
 from time import time
-from PIL import Image
 from logger import LOGGER
 from typing import Optional
-from asyncio.subprocess import PIPE
-from asyncio import create_subprocess_exec, create_subprocess_shell, wait_for
+from asyncio import Semaphore, gather
 
-from pyleaves import Leaves
 from pyrogram.parser import Parser
+from pyrogram.errors import FloodWait
 from pyrogram.utils import get_channel_id
 from pyrogram.types import (
     InputMediaPhoto,
@@ -22,37 +19,65 @@ from pyrogram.types import (
 )
 
 from helpers.files import (
+    THUMB_SUFFIX,
     fileSizeLimit,
+    get_download_path,
     cleanup_download
 )
 
 from helpers.msg import (
+    get_file_name,
+    get_media_object,
     get_parsed_msg
 )
 
-# Progress bar template
-PROGRESS_BAR = """
-Percentage: {percentage:.2f}% | {current}/{total}
-Speed: {speed}/s
-Estimated Time Left: {est_time} seconds
-"""
-
-async def cmd_exec(cmd, shell=False):
-    if shell:
-        proc = await create_subprocess_shell(cmd, stdout=PIPE, stderr=PIPE)
-    else:
-        proc = await create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
-    stdout, stderr = await proc.communicate()
-    try:
-        stdout = stdout.decode().strip()
-    except:
-        stdout = "Unable to decode the response!"
-    try:
-        stderr = stderr.decode().strip()
-    except:
-        stderr = "Unable to decode the error!"
-    return stdout, stderr, proc.returncode
+from helpers.transfer import (
+    BIG_FILE_SIZE,
+    download_parallel,
+    file_parts,
+    stream_parts,
+    upload_media_file_id,
+    upload_parts
+)
+
+from helpers.probe import (
+    make_thumbnail,
+    probe
+)
+
+from helpers.cache import FILE_CACHE
+from helpers.metrics import METRICS
+from helpers.progress import PROGRESS
+from helpers.sessions import SESSIONS
+from helpers.storage import STORAGE
+from helpers.uploaders import UPLOADERS
 
+# Server-side copy fast path (skips download + re-upload for unprotected chats)
+COPY_FAST_PATH = os.getenv("COPY_FAST_PATH", "1") == "1"
+COPY_RETRY_AFTER = int(os.getenv("COPY_RETRY_AFTER", "3600"))  # seconds before retrying a chat the bot could not copy from
+_COPY_DENIED = {}  # source chat -> time copying last failed
+
+# Streaming transfer: pipe the user-side download straight into the bot-side upload
+STREAM_TRANSFER = os.getenv("STREAM_TRANSFER", "1") == "1"
+STREAM_MIN_SIZE = int(os.getenv("STREAM_MIN_SIZE", str(20 * 1024 * 1024)))  # bytes; smaller files use the disk path
+# Streamed uploads are sent as big-file parts, which Telegram refuses for files up to BIG_FILE_SIZE
+STREAM_MIN_SIZE = max(STREAM_MIN_SIZE, BIG_FILE_SIZE + 1)
+STREAM_BUFFER_PARTS = int(os.getenv("STREAM_BUFFER_PARTS", "16"))  # 512 KiB parts buffered in memory
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))  # parts uploaded concurrently
+
+# Parallel part uploads for big local files
+PARALLEL_UPLOAD = os.getenv("PARALLEL_UPLOAD", "1") == "1"
+UPLOAD_CONNECTIONS = int(os.getenv("UPLOAD_CONNECTIONS", "2"))  # media sessions shared by upload workers
+UPLOAD_PART_RETRIES = int(os.getenv("UPLOAD_PART_RETRIES", "3"))
+
+# Album members downloaded at the same time
+ALBUM_CONCURRENCY = int(os.getenv("ALBUM_CONCURRENCY", "3"))
+
+# Parallel multi-connection downloads for large files
+PARALLEL_DOWNLOAD = os.getenv("PARALLEL_DOWNLOAD", "1") == "1"
+PARALLEL_DOWNLOAD_MIN_SIZE = int(os.getenv("PARALLEL_DOWNLOAD_MIN_SIZE", str(10 * 1024 * 1024)))  # bytes
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "4"))
+DOWNLOAD_PART_SIZE = int(os.getenv("DOWNLOAD_PART_SIZE", str(1024 * 1024)))  # bytes; must divide 1 MiB
 
 async def get_media_info(path):
     """Return (duration, artist, title) if ffprobe available, else safe fallbacks.
@@ -60,249 +85,705 @@ async def get_media_info(path):
     On Heroku, ffprobe comes from the ffmpeg package installed via Aptfile. If not
     present (e.g., local minimal install), we degrade gracefully.
     """
-    if not shutil.which("ffprobe"):
+    info = await probe(path)
+    if not info:
         return 0, None, None
+    return info["duration"], info["artist"], info["title"]
+
+
+async def get_video_thumbnail(video_file, duration):
+    """Write a thumbnail next to ``video_file`` so concurrent uploads never share one."""
+    return await make_thumbnail(video_file, duration)
+
+
+async def download_source_thumb(source_message, thumb_path: str):
+    """Download Telegram's own thumbnail of the source media, if it has one.
+
+    Goes through the source session's pacer like every other user-side download.
+    """
+    media = get_media_object(source_message)
+    thumbs = getattr(media, "thumbs", None) or []
+    if not thumbs:
+        return None
+    thumb = max(thumbs, key=lambda t: (t.width or 0) * (t.height or 0))
+    client = source_message._client
     try:
-        result = await cmd_exec([
-            "ffprobe", "-hide_banner", "-loglevel", "error",
-            "-print_format", "json", "-show_format", path,
-        ])
+        with SESSIONS.busy(client):
+            return await SESSIONS.pacer(client).call(client.download_media, thumb.file_id, file_name=thumb_path)
     except Exception as e:
-        LOGGER(__name__).info(f"ffprobe unavailable or failed: {e}")
-        return 0, None, None
-    if result[0] and result[2] == 0:
-        try:
-            fields = eval(result[0]).get("format")
-        except Exception:
-            return 0, None, None
-        if not fields:
-            return 0, None, None
-        try:
-            duration = round(float(fields.get("duration", 0)))
-        except Exception:
-            duration = 0
-        tags = fields.get("tags", {})
-        artist = tags.get("artist") or tags.get("ARTIST") or tags.get("Artist")
-        title = tags.get("title") or tags.get("TITLE") or tags.get("Title")
-        return duration, artist, title
-    return 0, None, None
+        LOGGER(__name__).info(f"Source thumbnail download failed: {e}")
+        return None
 
 
-async def get_video_thumbnail(video_file, duration):
-    if not shutil.which("ffmpeg"):
+async def resolve_media_attributes(source_message, media_path, media_type, thumb_path=None):
+    """Return upload attributes for a video or audio file.
+
+    Duration, dimensions, performer, title and the thumbnail are taken from
+    the source message, which already carries them. ffprobe/ffmpeg only run
+    on ``media_path`` to fill in whatever the source is missing.
+    """
+    media = get_media_object(source_message) if source_message is not None else None
+    duration = getattr(media, "duration", 0) or 0
+    thumb_path = thumb_path or (media_path + THUMB_SUFFIX if media_path else None)
+
+    if media_type == "audio":
+        performer = getattr(media, "performer", None)
+        title = getattr(media, "title", None)
+        if media_path and not duration:
+            probed_duration, artist, probed_title = await get_media_info(media_path)
+            duration = probed_duration
+            performer = performer or artist
+            title = title or probed_title
+        return {"duration": duration, "performer": performer, "title": title}
+
+    width = getattr(media, "width", 0) or 0
+    height = getattr(media, "height", 0) or 0
+    thumb = await download_source_thumb(source_message, thumb_path) if media and thumb_path else None
+    if media_path and not (duration and width and height):
+        info = await probe(media_path) or {}
+        duration = duration or info.get("duration", 0)
+        width = width or info.get("width", 0)
+        height = height or info.get("height", 0)
+    if media_path and thumb is None:
+        thumb = await get_video_thumbnail(media_path, duration)
+    return {
+        "duration": duration,
+        "width": width or 480,
+        "height": height or 320,
+        "thumb": thumb,
+    }
+
+
+def _copy_source(chat_message, source_chat_id):
+    chat = getattr(chat_message, "chat", None)
+    return (chat.username if chat is not None and chat.username else None) or source_chat_id
+
+
+def can_copy(chat_message, source_chat_id=None) -> bool:
+    """True if the source post may be copied server-side by the bot."""
+    if not COPY_FAST_PATH:
+        return False
+    if getattr(chat_message, "has_protected_content", False):
+        return False
+    chat = getattr(chat_message, "chat", None)
+    if chat is not None and getattr(chat, "has_protected_content", False):
+        return False
+    denied_at = _COPY_DENIED.get(_copy_source(chat_message, source_chat_id))
+    return not (denied_at and time() - denied_at < COPY_RETRY_AFTER)
+
+
+async def copy_to_chat(bot, chat_message, source_chat_id, message):
+    """Deliver a post with copy_message/copy_media_group instead of re-uploading.
+
+    Only works when the bot itself can read the source chat (public channel or
+    bot is a member). Chats where copying fails are remembered for
+    COPY_RETRY_AFTER seconds so the download path is used without extra RPCs.
+    Returns the copied message(s), or ``None`` when the post was not copied.
+    The file_id of a copied single post is cached like an upload's, so repeat
+    requests are re-sent from the cache.
+    """
+    if not can_copy(chat_message, source_chat_id):
         return None
-    output = os.path.join("Assets", "video_thumb.jpg")
-    if duration is None:
-        duration = (await get_media_info(video_file))[0]
-    if not duration:
-        duration = 3
-    duration //= 2
-    cmd = [
-        "ffmpeg", "-hide_banner", "-loglevel", "error",
-        "-ss", str(duration), "-i", video_file,
-        "-vf", "thumbnail", "-q:v", "1", "-frames:v", "1",
-        "-threads", str(max(1, (os.cpu_count() or 2) // 2)), output,
-    ]
+    source = _copy_source(chat_message, source_chat_id)
+
+    try:
+        with METRICS.timer("copy"):
+            if chat_message.media_group_id:
+                copied = await bot.copy_media_group(
+                    chat_id=message.chat.id,
+                    from_chat_id=source,
+                    message_id=chat_message.id,
+                )
+            else:
+                copied = await bot.copy_message(
+                    chat_id=message.chat.id,
+                    from_chat_id=source,
+                    message_id=chat_message.id,
+                )
+    except FloodWait:
+        raise
+    except Exception as e:
+        _COPY_DENIED[source] = time()
+        LOGGER(__name__).info(f"Copy fast path unavailable for {source}: {e}")
+        return None
+
+    _COPY_DENIED.pop(source, None)
+    if not chat_message.media_group_id and chat_message.media:
+        remember_upload(chat_message, copied, _media_type(chat_message))
+    LOGGER(__name__).info(f"Copied message {chat_message.id} from {source} server-side")
+    return copied
+
+
+def remember_upload(source_message, sent_message, media_type: str):
+    """Store the bot-side file_id of an upload under the source file_unique_id."""
+    if FILE_CACHE is None or sent_message is None:
+        return
+    source = get_media_object(source_message)
+    sent = get_media_object(sent_message)
+    if source is None or sent is None:
+        return
     try:
-        _, err, code = await wait_for(cmd_exec(cmd), timeout=60)
-        if code != 0 or not os.path.exists(output):
-            LOGGER(__name__).info(f"Thumbnail generation failed (code={code}): {err}")
-            return None
+        FILE_CACHE.put(source.file_unique_id, sent.file_id, media_type, getattr(source, "file_size", 0))
     except Exception as e:
-        LOGGER(__name__).info(f"Thumbnail generation exception: {e}")
+        LOGGER(__name__).error(f"Failed to cache file_id: {e}")
+
+
+def get_cached_file_id(source_message):
+    if FILE_CACHE is None:
+        return None
+    source = get_media_object(source_message)
+    if source is None:
         return None
-    return output
+    cached = FILE_CACHE.get(source.file_unique_id)
+    return cached[0] if cached else None
 
 
-# Generate progress bar for downloading/uploading
-def progressArgs(action: str, progress_message, start_time):
-    return (action, progress_message, start_time, PROGRESS_BAR, "▓", "░")
+async def send_cached(bot, chat_message, message, caption, file_id=None) -> bool:
+    """Re-send a previously uploaded file by its cached bot-side file_id.
+
+    ``file_id`` skips the cache lookup when the caller already did it.
+    """
+    file_id = file_id or get_cached_file_id(chat_message)
+    if not file_id:
+        return False
+    try:
+        with METRICS.timer("cached_send"):
+            await bot.send_cached_media(chat_id=message.chat.id, file_id=file_id, caption=caption or "")
+    except FloodWait:
+        raise
+    except Exception as e:
+        FILE_CACHE.delete(get_media_object(chat_message).file_unique_id)
+        LOGGER(__name__).info(f"Cached file_id rejected, falling back to upload: {e}")
+        return False
+    LOGGER(__name__).info(f"Sent message {chat_message.id} from file_id cache")
+    return True
+
+
+# Progress callback args for downloading/uploading; concurrent transfers
+# sharing a progress_message are merged into one status message
+def progressArgs(action: str, progress_message, start_time, key=None):
+    return (PROGRESS.job(progress_message, start_time), action, key)
+
+
+async def upload_big_file(bot, chat_id, media_path, media_type, progress_args=(), **attributes):
+    """Upload a big local file with parallel parts and return its bot-side file_id.
+
+    Returns ``None`` when the file is too small for big-file parts, parallel
+    uploads are disabled, or the upload fails, so callers can fall back to
+    the regular single-connection upload.
+    """
+    if not PARALLEL_UPLOAD or media_type not in ("video", "audio", "document"):
+        return None
+    file_size = os.path.getsize(media_path)
+    if file_size <= BIG_FILE_SIZE:
+        return None
+    file_name = os.path.basename(media_path)
+    try:
+        input_file = await upload_parts(
+            bot,
+            file_parts(media_path),
+            file_size,
+            file_name,
+            workers=UPLOAD_WORKERS,
+            connections=UPLOAD_CONNECTIONS,
+            retries=UPLOAD_PART_RETRIES,
+            progress=PROGRESS.update if progress_args else None,
+            progress_args=progress_args,
+        )
+        return await upload_media_file_id(bot, chat_id, input_file, media_type, file_name, **attributes)
+    except Exception as e:
+        LOGGER(__name__).info(f"Parallel upload failed for {media_path}, falling back: {e}")
+        return None
 
 
 async def send_media(
-    bot, message, media_path, media_type, caption, progress_message, start_time
+    bot, message, media_path, media_type, caption, progress_message, start_time, progress_key=None,
+    source_message=None,
 ):
     file_size = os.path.getsize(media_path)
 
     if not await fileSizeLimit(file_size, message, "upload"):
-        return
+        return None
 
-    progress_args = progressArgs("📥 Uploading Progress", progress_message, start_time)
+    progress_args = progressArgs(
+        "📤 Uploading Progress", progress_message, start_time,
+        key=(progress_key, "up") if progress_key is not None else None,
+    )
     LOGGER(__name__).info(f"Uploading media: {media_path} ({media_type})")
 
+    attrs = {}
+    if media_type in ("video", "audio"):
+        with METRICS.timer("metadata"):
+            attrs = await resolve_media_attributes(source_message, media_path, media_type)
+    with METRICS.timer("upload"):
+        sent = await _upload_media(bot, message, media_path, media_type, caption, progress_args, attrs)
+    if sent is not None:
+        METRICS.add_bytes("upload", file_size)
+    return sent
+
+
+async def _upload_media(bot, message, media_path, media_type, caption, progress_args, attrs):
+    async with UPLOADERS.lease(bot) as uploader:
+        if uploader is not bot:
+            try:
+                return await _relay_upload(uploader, message, media_path, media_type, caption, progress_args, attrs)
+            except Exception as e:
+                LOGGER(__name__).info(f"Upload through {uploader.name} failed, using the primary bot: {e}")
+        return await _upload_direct(bot, message, media_path, media_type, caption, progress_args, attrs)
+
+
+async def _upload_direct(bot, message, media_path, media_type, caption, progress_args, attrs):
     if media_type == "photo":
-        await message.reply_photo(
+        return await message.reply_photo(
             media_path,
             caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
+            progress=PROGRESS.update,
             progress_args=progress_args,
         )
     elif media_type == "video":
-        if os.path.exists("Assets/video_thumb.jpg"):
-            os.remove("Assets/video_thumb.jpg")
-        duration = (await get_media_info(media_path))[0]
-        thumb = await get_video_thumbnail(media_path, duration)
-        if thumb is not None and thumb != "none":
-            with Image.open(thumb) as img:
-                width, height = img.size
-        else:
-            width = 480
-            height = 320
-
-        if thumb == "none":
-            thumb = None
-
-        await message.reply_video(
-            media_path,
-            duration=duration,
-            width=width,
-            height=height,
-            thumb=thumb,
+        file_id = await upload_big_file(
+            bot, message.chat.id, media_path, "video", progress_args, **attrs
+        )
+        return await message.reply_video(
+            file_id or media_path,
+            **attrs,
             caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
+            progress=PROGRESS.update,
             progress_args=progress_args,
         )
     elif media_type == "audio":
-        duration, artist, title = await get_media_info(media_path)
-        await message.reply_audio(
-            media_path,
-            duration=duration,
-            performer=artist,
-            title=title,
+        file_id = await upload_big_file(
+            bot, message.chat.id, media_path, "audio", progress_args, **attrs
+        )
+        return await message.reply_audio(
+            file_id or media_path,
+            **attrs,
             caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
+            progress=PROGRESS.update,
             progress_args=progress_args,
         )
     elif media_type == "document":
-        await message.reply_document(
-            media_path,
+        file_id = await upload_big_file(bot, message.chat.id, media_path, "document", progress_args)
+        return await message.reply_document(
+            file_id or media_path,
             caption=caption or "",
-            progress=Leaves.progress_for_pyrogram,
+            progress=PROGRESS.update,
             progress_args=progress_args,
         )
+    return None
 
 
-async def processMediaGroup(chat_message, bot, message):
-    media_group_messages = await chat_message.get_media_group()
-    valid_media = []
-    temp_paths = []
-    invalid_paths = []
+async def _relay_upload(uploader, message, media_path, media_type, caption, progress_args, attrs):
+    """Upload through a helper bot, then reply from the primary bot by file_id."""
+    media = media_path
+    if media_type != "photo":
+        media = await upload_big_file(
+            uploader, UPLOADERS.relay_chat_id, media_path, media_type, progress_args, **attrs
+        ) or media_path
+    file_id, relay_id = await UPLOADERS.relay(
+        uploader, media, media_type, progress=PROGRESS.update, progress_args=progress_args, **attrs
+    )
+    try:
+        reply = {
+            "photo": message.reply_photo,
+            "video": message.reply_video,
+            "audio": message.reply_audio,
+            "document": message.reply_document,
+        }[media_type]
+        return await reply(file_id, caption=caption or "", **attrs)
+    finally:
+        await UPLOADERS.discard(uploader, relay_id)
+
+
+async def _relay_album_item(uploader, media, media_type, progress_args, attrs):
+    """Upload one album member into the relay chat; ``(None, None)`` if that fails."""
+    try:
+        file = media.media
+        if media_type != "photo":
+            file = await upload_big_file(
+                uploader, UPLOADERS.relay_chat_id, media.media, media_type, progress_args, **attrs
+            ) or media.media
+        return await UPLOADERS.relay(
+            uploader, file, media_type, progress=PROGRESS.update, progress_args=progress_args, **attrs
+        )
+    except Exception as e:
+        LOGGER(__name__).info(f"Album item upload through {uploader.name} failed, using the primary bot: {e}")
+        return None, None
+
+
+async def drop_progress(progress_message, owned: bool = True, key=None):
+    """Delete a status message we created and stop reporting into it.
+
+    For a shared status message (``owned=False``) only the finished
+    transfer ``key`` is removed from it.
+    """
+    if not owned:
+        if key is not None:
+            PROGRESS.done(progress_message, key)
+            PROGRESS.done(progress_message, (key, "up"))
+        return
+    PROGRESS.done(progress_message)
+    await progress_message.delete()
+
+
+def _media_type(msg) -> str:
+    if msg.photo:
+        return "photo"
+    if msg.video:
+        return "video"
+    if msg.audio:
+        return "audio"
+    return "document"
+
+
+def _input_media(msg, media, caption):
+    """Build the InputMedia for an album member from a local path or file_id."""
+    if msg.photo:
+        return InputMediaPhoto(media=media, caption=caption)
+    if msg.video:
+        return InputMediaVideo(media=media, caption=caption)
+    if msg.document:
+        return InputMediaDocument(media=media, caption=caption)
+    return InputMediaAudio(media=media, caption=caption)
+
+
+async def download_media_file(user, chat_message, file_name, progress=None, progress_args=(), urgent=None):
+    """Download a post's media, using parallel connections for large files.
+
+    Falls back to the regular sequential ``Message.download`` for small files,
+    photos, or when the parallel path fails (e.g. CDN-served files). Each
+    download starts in a slot of the ``user`` session's pacer and reports
+    FloodWaits back to it. The file's size is reserved in STORAGE first and released by
+    ``cleanup_download``, or right away if the download fails.
+    """
+    media = get_media_object(chat_message)
+    await STORAGE.reserve(file_name, getattr(media, "file_size", 0) or 0, urgent=urgent)
+    pacer = SESSIONS.pacer(user)
+    await pacer.wait()
+    try:
+        with METRICS.timer("download"), SESSIONS.busy(user):
+            path = await _download_media_file(user, chat_message, file_name, progress, progress_args)
+    except BaseException as e:
+        STORAGE.release(file_name)
+        if isinstance(e, FloodWait):
+            pacer.throttled(e.value)
+        raise
+    pacer.success()
+    METRICS.add_bytes("download", getattr(media, "file_size", 0) or 0)
+    return path
+
+
+async def _download_media_file(user, chat_message, file_name, progress, progress_args):
+    media = get_media_object(chat_message)
+    if (
+        PARALLEL_DOWNLOAD
+        and DOWNLOAD_CONNECTIONS > 1
+        and media is not None
+        and not chat_message.photo
+        and (getattr(media, "file_size", 0) or 0) >= PARALLEL_DOWNLOAD_MIN_SIZE
+    ):
+        try:
+            return await download_parallel(
+                user,
+                media,
+                file_name,
+                connections=DOWNLOAD_CONNECTIONS,
+                part_size=DOWNLOAD_PART_SIZE,
+                progress=progress,
+                progress_args=progress_args,
+            )
+        except FloodWait:
+            raise
+        except Exception as e:
+            LOGGER(__name__).info(f"Parallel download failed, falling back to sequential: {e}")
+    return await chat_message.download(
+        file_name=file_name,
+        progress=progress,
+        progress_args=progress_args,
+    )
+
+
+def can_stream(chat_message, media_type: str) -> bool:
+    if not STREAM_TRANSFER or media_type not in ("video", "audio", "document"):
+        return False
+    media = get_media_object(chat_message)
+    return media is not None and (getattr(media, "file_size", 0) or 0) >= STREAM_MIN_SIZE
+
+
+async def stream_media_to_chat(
+    user, bot, message, chat_message, media_type, caption, progress_message, start_time, wait_turn=None,
+    progress_key=None,
+):
+    """Stream a single-media post from the user client into a bot upload.
+
+    Download and upload overlap through a bounded in-memory buffer, so the
+    transfer takes roughly as long as the slower leg and uses no disk space.
+    Metadata and the thumbnail come from the source message since there is
+    no local file to probe.
+    """
+    media = get_media_object(chat_message)
+    file_size = media.file_size
+
+    if not await fileSizeLimit(file_size, message, "upload"):
+        return None
 
+    file_name = get_file_name(chat_message.id, chat_message)
+    LOGGER(__name__).info(f"Streaming media: {file_name} ({media_type}, {file_size} bytes)")
+    attrs = {}
+    thumb_path = None
+    if media_type in ("video", "audio"):
+        thumb_path = get_download_path(f"{message.id}_{chat_message.id}", "thumb.jpg")
+        attrs = await resolve_media_attributes(chat_message, None, media_type, thumb_path=thumb_path)
+    pacer = SESSIONS.pacer(user)
+    await pacer.wait()
+    relay = None  # (helper bot, relay message id) when a helper bot did the upload
+    try:
+        with METRICS.timer("stream"), SESSIONS.busy(user):
+            async with UPLOADERS.lease(bot) as uploader:
+                chat_id = message.chat.id if uploader is bot else UPLOADERS.relay_chat_id
+                file_id = await _stream_upload(user, uploader, chat_id, chat_message, media_type, file_name, attrs, progress_message, start_time, progress_key)
+                if uploader is not bot:
+                    file_id, relay_id = await UPLOADERS.relay(uploader, file_id, media_type)
+                    relay = (uploader, relay_id)
+    except FloodWait as e:
+        pacer.throttled(e.value)
+        raise
+    finally:
+        if thumb_path:
+            cleanup_download(thumb_path)
+    pacer.success()
+    METRICS.add_bytes("stream", file_size)
+
+    try:
+        if wait_turn is not None:
+            await wait_turn()
+        reply = {
+            "video": message.reply_video,
+            "audio": message.reply_audio,
+            "document": message.reply_document,
+        }[media_type]
+        return await reply(file_id, caption=caption or "")
+    finally:
+        if relay is not None:
+            await UPLOADERS.discard(*relay)
+
+
+async def _stream_upload(user, bot, chat_id, chat_message, media_type, file_name, attrs, progress_message, start_time, progress_key):
+    media = get_media_object(chat_message)
+    file_size = media.file_size
+    input_file = await upload_parts(
+        bot,
+        stream_parts(
+            user,
+            chat_message,
+            STREAM_BUFFER_PARTS,
+            connections=DOWNLOAD_CONNECTIONS if PARALLEL_DOWNLOAD else 1,
+            part_size=DOWNLOAD_PART_SIZE,
+        ),
+        file_size,
+        file_name,
+        workers=UPLOAD_WORKERS,
+        connections=UPLOAD_CONNECTIONS,
+        retries=UPLOAD_PART_RETRIES,
+        progress=PROGRESS.update,
+        progress_args=progressArgs("📥 Streaming Progress", progress_message, start_time, key=progress_key),
+    )
+    return await upload_media_file_id(
+        bot,
+        chat_id,
+        input_file,
+        media_type,
+        file_name,
+        mime_type=getattr(media, "mime_type", None),
+        **attrs,
+    )
+
+
+@METRICS.timed("album")
+async def processMediaGroup(chat_message, bot, message, wait_turn=None, progress_message=None, urgent=None):
+    """Download and re-send an album. ``progress_message`` lets a batch job
+    report album members in its own status message instead of a new one.
+
+    Every download path is recorded as soon as its download starts and
+    cleaned up when the album is done, however it ends, so a cancelled or
+    failed album never keeps its STORAGE reservations.
+    """
+    media_group_messages = await SESSIONS.pacer(chat_message._client).call(chat_message.get_media_group)
+    temp_paths = []  # every download path, finished or not
+    relayed = []  # (helper bot, relay message id) to delete once the album is sent
+    try:
+        return await _process_media_group(
+            chat_message, media_group_messages, bot, message, wait_turn, progress_message, urgent,
+            temp_paths, relayed,
+        )
+    finally:
+        for path in temp_paths:
+            cleanup_download(path)
+        for uploader, relay_id in relayed:
+            await UPLOADERS.discard(uploader, relay_id)
+
+
+async def _process_media_group(
+    chat_message, media_group_messages, bot, message, wait_turn, progress_message, urgent, temp_paths, relayed,
+):
     start_time = time()
-    progress_message = await message.reply("📥 Downloading media group...")
+    owns_progress = progress_message is None
+    if owns_progress:
+        progress_message = await message.reply("📥 Downloading media group...")
     LOGGER(__name__).info(
         f"Downloading media group with {len(media_group_messages)} items..."
     )
 
-    for msg in media_group_messages:
-        if msg.photo or msg.video or msg.document or msg.audio:
-            try:
-                media_path = await msg.download(
-                    progress=Leaves.progress_for_pyrogram,
+    items = [
+        msg for msg in media_group_messages
+        if msg.photo or msg.video or msg.document or msg.audio
+    ]
+    semaphore = Semaphore(max(1, ALBUM_CONCURRENCY))
+
+    async def _fetch(index, msg):
+        caption = await get_parsed_msg(msg.caption or "", msg.caption_entities)
+        cached_id = get_cached_file_id(msg)
+        if cached_id:
+            return _input_media(msg, cached_id, caption), None, None, None
+        download_path = get_download_path(
+            f"{message.id}_{msg.id}", get_file_name(msg.id, msg)
+        )
+        temp_paths.append(download_path)
+        try:
+            async with semaphore:
+                media_path = await download_media_file(
+                    msg._client,
+                    msg,
+                    download_path,
+                    progress=PROGRESS.update,
                     progress_args=progressArgs(
-                        "📥 Downloading Progress", progress_message, start_time
+                        f"📥 Album item {index + 1}/{len(items)}", progress_message, start_time,
+                        key=(chat_message.media_group_id, msg.id),
                     ),
+                    urgent=urgent,
                 )
-                temp_paths.append(media_path)
-
-                if msg.photo:
-                    valid_media.append(
-                        InputMediaPhoto(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-                elif msg.video:
-                    valid_media.append(
-                        InputMediaVideo(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-                elif msg.document:
-                    valid_media.append(
-                        InputMediaDocument(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-                elif msg.audio:
-                    valid_media.append(
-                        InputMediaAudio(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
+        except Exception as e:
+            LOGGER(__name__).info(f"Error downloading media {msg.id}: {e}")
+            return None, None, download_path, e
+        finally:
+            PROGRESS.done(progress_message, (chat_message.media_group_id, msg.id))
+        return _input_media(msg, media_path, caption), msg, media_path, None
 
-            except Exception as e:
-                LOGGER(__name__).info(f"Error downloading media: {e}")
-                if media_path and os.path.exists(media_path):
-                    invalid_paths.append(media_path)
-                continue
+    valid_media = []
+    sources = []  # source message per valid_media entry (None if sent from the file_id cache)
+    failures = []
+    results = await gather(*(_fetch(i, msg) for i, msg in enumerate(items)))
+    for msg, (input_media, source, path, error) in zip(items, results):
+        if error is not None:
+            failures.append((msg.id, error))
+            continue
+        valid_media.append(input_media)
+        sources.append(source)
 
     LOGGER(__name__).info(f"Valid media count: {len(valid_media)}")
 
+    # Big album members are uploaded with parallel parts and sent by file_id;
+    # with helper bots every member is uploaded into the relay chat by one of
+    # the bots, side by side, and the album is sent by file_id
+    upload_slots = Semaphore(UPLOADERS.size)
+
+    async def _upload_item(media, source):
+        media_type = _media_type(source)
+        extra = {}
+        if media_type in ("video", "audio"):
+            with METRICS.timer("metadata"):
+                extra = await resolve_media_attributes(source, media.media, media_type)
+            for name, value in extra.items():
+                setattr(media, name, value)
+        item_progress = progressArgs(
+            "📤 Uploading album item", progress_message, start_time,
+            key=(chat_message.media_group_id, source.id, "up"),
+        )
+        async with upload_slots, UPLOADERS.lease(bot) as uploader:
+            with METRICS.timer("upload"):
+                if not UPLOADERS.enabled:
+                    file_id = None if source.photo else await upload_big_file(
+                        bot, message.chat.id, media.media, media_type, item_progress, **extra
+                    )
+                else:
+                    file_id, relay_id = await _relay_album_item(uploader, media, media_type, item_progress, extra)
+                    if relay_id is not None:
+                        relayed.append((uploader, relay_id))
+        PROGRESS.done(progress_message, (chat_message.media_group_id, source.id, "up"))
+        if file_id:
+            media.media = file_id
+
+    await gather(*(
+        _upload_item(media, source)
+        for media, source in zip(valid_media, sources)
+        if source is not None
+    ))
+
+    # Batch workers download concurrently but must deliver in message order
+    if wait_turn is not None:
+        await wait_turn()
+
     if valid_media:
         try:
-            await bot.send_media_group(chat_id=message.chat.id, media=valid_media)
-            await progress_message.delete()
+            with METRICS.timer("upload"):
+                sent_messages = await bot.send_media_group(chat_id=message.chat.id, media=valid_media)
+            METRICS.add_bytes("upload", sum(os.path.getsize(path) for path in temp_paths if os.path.exists(path)))
+            for source, sent in zip(sources, sent_messages or []):
+                if source is not None:
+                    remember_upload(source, sent, _media_type(source))
+            await drop_progress(progress_message, owns_progress)
         except Exception:
             await message.reply(
                 "**❌ Failed to send media group, trying individual uploads**"
             )
-            for media in valid_media:
+            for media, source in zip(valid_media, sources):
                 try:
+                    sent = None
                     if isinstance(media, InputMediaPhoto):
-                        await bot.send_photo(
+                        sent = await bot.send_photo(
                             chat_id=message.chat.id,
                             photo=media.media,
                             caption=media.caption,
                         )
                     elif isinstance(media, InputMediaVideo):
-                        await bot.send_video(
+                        sent = await bot.send_video(
                             chat_id=message.chat.id,
                             video=media.media,
                             caption=media.caption,
                         )
                     elif isinstance(media, InputMediaDocument):
-                        await bot.send_document(
+                        sent = await bot.send_document(
                             chat_id=message.chat.id,
                             document=media.media,
                             caption=media.caption,
                         )
                     elif isinstance(media, InputMediaAudio):
-                        await bot.send_audio(
+                        sent = await bot.send_audio(
                             chat_id=message.chat.id,
                             audio=media.media,
                             caption=media.caption,
                         )
                     elif isinstance(media, Voice):
-                        await bot.send_voice(
+                        sent = await bot.send_voice(
                             chat_id=message.chat.id,
                             voice=media.media,
                             caption=media.caption,
                         )
+                    if source is not None:
+                        remember_upload(source, sent, _media_type(source))
                 except Exception as individual_e:
                     await message.reply(
                         f"Failed to upload individual media: {individual_e}"
                     )
 
-            await progress_message.delete()
+            await drop_progress(progress_message, owns_progress)
 
-        for path in temp_paths + invalid_paths:
-            cleanup_download(path)
+        if failures:
+            await message.reply(
+                f"**⚠️ {len(failures)} of {len(items)} album item(s) could not be downloaded.**"
+            )
         return True
 
-    await progress_message.delete()
+    await drop_progress(progress_message, owns_progress)
     await message.reply("❌ No valid media found in the media group.")
-    for path in invalid_paths:
-        cleanup_download(path)
     return False
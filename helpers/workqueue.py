@@ -0,0 +1,339 @@
+# Copyright (C) @TheSmartBisnu
+# Channel: https://t.me/itsSmartDev
+
+import os
+import json
+import socket
+import sqlite3
+import threading
+from time import time
+
+from logger import LOGGER
+from helpers.files import get_data_path
+
+MODE = os.getenv("MODE", "standalone").lower()  # standalone, coordinator or worker
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", "")  # default DATA_DIR/work_queue.db; must be shared by all nodes
+WORK_LEASE = int(os.getenv("WORK_LEASE", "60"))  # seconds a claimed item stays owned without a heartbeat
+WORK_HEARTBEAT = max(1, WORK_LEASE // 4)
+WORK_POLL_INTERVAL = float(os.getenv("WORK_POLL_INTERVAL", "1"))  # seconds between claims when the queue is empty
+WORK_MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", "3"))  # claims before an item whose worker keeps dying fails
+WORK_RETENTION = int(os.getenv("WORK_RETENTION", "86400"))  # seconds finished items and silent workers are kept
+WORK_BUSY_TIMEOUT = float(os.getenv("WORK_BUSY_TIMEOUT", "2"))  # seconds a query waits for another node's write lock
+
+# Open items are 'queued' or 'leased'; finished ones 'done', 'failed' or 'cancelled'
+OPEN_STATES = ("queued", "leased")
+
+
+class WorkQueue:
+    """SQLite work queue shared by one coordinator and any number of workers.
+
+    The coordinator enqueues items; a worker claims one at a time and owns
+    it for ``lease`` seconds, renewed by ``heartbeat`` while it runs. When
+    a worker dies its lease runs out and another worker claims the item
+    again, up to ``max_attempts`` times. ``control`` lets the coordinator
+    ask the owning worker to cancel or pause an item; the worker sees the
+    request on its next heartbeat.
+
+    The same database holds the locks and dedup marks that must hold
+    across workers: a lock on a source post is leased like an item and is
+    dropped when its worker stops heartbeating. Every state change runs in
+    a ``BEGIN IMMEDIATE`` transaction, so concurrent processes never claim
+    the same item or lock. Timestamps are wall-clock, so nodes sharing one
+    queue need synchronized clocks.
+
+    Every method blocks on SQLite, so callers on the event loop run them
+    with ``asyncio.to_thread``; each thread gets its own connection. Items
+    finished more than ``retention`` seconds ago, expired locks and workers
+    silent that long are pruned every ``prune_interval`` seconds, and
+    expired dedup marks every ``prune_every`` marks.
+    """
+
+    def __init__(self, path: str, lease: int = WORK_LEASE, max_attempts: int = WORK_MAX_ATTEMPTS,
+                 retention: int = WORK_RETENTION, prune_interval: int = 600, prune_every: int = 500):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self.prune_every = max(1, prune_every)
+        self._local = threading.local()
+        self._state_lock = threading.Lock()
+        self._pruned_at = 0.0
+        self._marks = 0
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS work ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " owner_id INTEGER NOT NULL DEFAULT 0,"
+            " state TEXT NOT NULL,"
+            " control TEXT,"
+            " worker TEXT,"
+            " lease_until REAL NOT NULL DEFAULT 0,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS work_state ON work (state, id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS locks ("
+            " key TEXT PRIMARY KEY,"
+            " worker TEXT NOT NULL,"
+            " lease_until REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS recent ("
+            " key TEXT PRIMARY KEY,"
+            " marked_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS recent_marked_at ON recent (marked_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS work_updated ON work (updated_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            " worker TEXT PRIMARY KEY,"
+            " running INTEGER NOT NULL,"
+            " started_at REAL NOT NULL,"
+            " heartbeat_at REAL NOT NULL)"
+        )
+        self.prune()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # A short busy timeout: a worker thread waiting on another node's write holds up its caller
+            db = sqlite3.connect(self.path, timeout=WORK_BUSY_TIMEOUT, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self, func, *args):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _item(row):
+        if row is None:
+            return None
+        item = dict(zip(("id", "kind", "payload", "owner_id", "attempts"), row))
+        item["payload"] = json.loads(item["payload"])
+        return item
+
+    # Coordinator side
+
+    def enqueue(self, kind: str, payload: dict, owner_id: int = 0) -> int:
+        now = time()
+        cursor = self._db.execute(
+            "INSERT INTO work (kind, payload, owner_id, state, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (kind, json.dumps(payload), owner_id, now, now),
+        )
+        return cursor.lastrowid
+
+    def pending(self, kind: str = None) -> int:
+        """Items of ``kind`` (any when ``None``) not yet claimed by a worker."""
+        if kind is None:
+            return self._db.execute("SELECT COUNT(*) FROM work WHERE state = 'queued'").fetchone()[0]
+        return self._db.execute(
+            "SELECT COUNT(*) FROM work WHERE state = 'queued' AND kind = ?", (kind,)
+        ).fetchone()[0]
+
+    def open_items(self, kind: str):
+        """``(id, payload, state, owner_id)`` of every queued or leased item of ``kind``."""
+        rows = self._db.execute(
+            "SELECT id, payload, state, owner_id FROM work WHERE kind = ? AND state IN ('queued', 'leased') ORDER BY id",
+            (kind,),
+        ).fetchall()
+        return [(item_id, json.loads(payload), state, owner_id) for item_id, payload, state, owner_id in rows]
+
+    def request(self, item_id: int, control: str) -> bool:
+        """Ask the worker running ``item_id`` to act on ``control`` ('cancel' or 'pause:<name>')."""
+        def _request():
+            row = self._db.execute("SELECT state FROM work WHERE id = ?", (item_id,)).fetchone()
+            if row is None or row[0] not in OPEN_STATES:
+                return False
+            if row[0] == "queued" and control == "cancel":
+                self._db.execute(
+                    "UPDATE work SET state = 'cancelled', updated_at = ? WHERE id = ?", (time(), item_id)
+                )
+            else:
+                self._db.execute(
+                    "UPDATE work SET control = ?, updated_at = ? WHERE id = ?", (control, time(), item_id)
+                )
+            return True
+        return self._transaction(_request)
+
+    def cancel_all(self, owner_id: int = None) -> int:
+        """Cancel every open item (of ``owner_id`` when given); returns how many."""
+        ids = [
+            item_id for item_id, owner in self._db.execute(
+                "SELECT id, owner_id FROM work WHERE state IN ('queued', 'leased')"
+            ).fetchall()
+            if owner_id is None or owner == owner_id
+        ]
+        return sum(1 for item_id in ids if self.request(item_id, "cancel"))
+
+    # Worker side
+
+    def claim(self, worker: str, kinds=("download", "batch")):
+        """Lease the oldest claimable item of ``kinds``; single downloads go before batches.
+
+        Returns ``{'id', 'kind', 'payload', 'owner_id', 'attempts'}`` or ``None``.
+        """
+        if time() - self._pruned_at >= self.prune_interval:
+            self.prune()
+        def _claim():
+            now = time()
+            while True:
+                row = self._db.execute(
+                    f"SELECT id, kind, payload, owner_id, attempts FROM work"
+                    f" WHERE kind IN ({', '.join('?' for _ in kinds)})"
+                    " AND (state = 'queued' OR (state = 'leased' AND lease_until < ?))"
+                    " ORDER BY kind = 'batch', id LIMIT 1",
+                    (*kinds, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                item = self._item(row)
+                if item["attempts"] >= self.max_attempts:
+                    LOGGER(__name__).warning(f"Work item {item['id']} failed after {item['attempts']} claims")
+                    self._db.execute(
+                        "UPDATE work SET state = 'failed', updated_at = ? WHERE id = ?", (now, item["id"])
+                    )
+                    continue
+                self._db.execute(
+                    "UPDATE work SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1,"
+                    " updated_at = ? WHERE id = ?",
+                    (worker, now + self.lease, now, item["id"]),
+                )
+                item["attempts"] += 1
+                return item
+        return self._transaction(_claim)
+
+    def heartbeat(self, worker: str, item_ids, started_at: float):
+        """Renew the leases of ``worker``'s items and locks.
+
+        Returns ``{item_id: control}`` for items the worker must act on:
+        the coordinator's control request, or 'lost' when the lease
+        expired and another worker took the item over.
+        """
+        item_ids = list(item_ids)
+
+        def _heartbeat():
+            now = time()
+            actions = {}
+            for item_id in item_ids:
+                row = self._db.execute(
+                    "SELECT state, worker, control FROM work WHERE id = ?", (item_id,)
+                ).fetchone()
+                if row is None or row[0] != "leased" or row[1] != worker:
+                    actions[item_id] = "cancel" if row is not None and row[0] == "cancelled" else "lost"
+                    continue
+                self._db.execute("UPDATE work SET lease_until = ? WHERE id = ?", (now + self.lease, item_id))
+                if row[2]:
+                    actions[item_id] = row[2]
+                    self._db.execute("UPDATE work SET control = NULL WHERE id = ?", (item_id,))
+            self._db.execute("UPDATE locks SET lease_until = ? WHERE worker = ?", (now + self.lease, worker))
+            self._db.execute(
+                "INSERT OR REPLACE INTO workers (worker, running, started_at, heartbeat_at) VALUES (?, ?, ?, ?)",
+                (worker, len(item_ids), started_at, now),
+            )
+            return actions
+        return self._transaction(_heartbeat)
+
+    def finish(self, item_id: int, worker: str, state: str = "done"):
+        self._db.execute(
+            "UPDATE work SET state = ?, control = NULL, updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+            (state, time(), item_id, worker),
+        )
+
+    def leave(self, worker: str):
+        """Hand ``worker``'s unfinished items back to the queue and drop its locks (clean shutdown)."""
+        def _leave():
+            self._db.execute(
+                "UPDATE work SET state = 'queued', worker = NULL, attempts = MAX(attempts - 1, 0), updated_at = ?"
+                " WHERE worker = ? AND state = 'leased'",
+                (time(), worker),
+            )
+            self._db.execute("DELETE FROM locks WHERE worker = ?", (worker,))
+            self._db.execute("DELETE FROM workers WHERE worker = ?", (worker,))
+        self._transaction(_leave)
+
+    # Cross-worker locks and dedup
+
+    def try_lock(self, key: str, worker: str) -> bool:
+        def _try_lock():
+            now = time()
+            row = self._db.execute("SELECT worker, lease_until FROM locks WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] != worker and row[1] >= now:
+                return False
+            self._db.execute(
+                "INSERT OR REPLACE INTO locks (key, worker, lease_until) VALUES (?, ?, ?)",
+                (key, worker, now + self.lease),
+            )
+            return True
+        return self._transaction(_try_lock)
+
+    def unlock(self, key: str, worker: str):
+        self._db.execute("DELETE FROM locks WHERE key = ? AND worker = ?", (key, worker))
+
+    def is_recent(self, key: str, ttl: int) -> bool:
+        row = self._db.execute("SELECT marked_at FROM recent WHERE key = ?", (key,)).fetchone()
+        return row is not None and time() - row[0] <= ttl
+
+    def mark_recent(self, key: str, ttl: int):
+        now = time()
+        self._db.execute("INSERT OR REPLACE INTO recent (key, marked_at) VALUES (?, ?)", (key, now))
+        with self._state_lock:
+            self._marks += 1
+            due = self._marks >= self.prune_every
+            if due:
+                self._marks = 0
+        if due:
+            self._db.execute("DELETE FROM recent WHERE marked_at < ?", (now - ttl,))
+
+    def prune(self):
+        """Drop finished items and silent workers older than ``retention``, and expired locks."""
+        now = time()
+        self._pruned_at = now
+        try:
+            self._db.execute(
+                "DELETE FROM work WHERE state NOT IN ('queued', 'leased') AND updated_at < ?", (now - self.retention,)
+            )
+            self._db.execute("DELETE FROM locks WHERE lease_until < ?", (now,))
+            self._db.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - self.retention,))
+        except sqlite3.Error as e:
+            LOGGER(__name__).error(f"Work queue prune failed: {e}")
+
+    def snapshot(self):
+        counts = dict(self._db.execute(
+            "SELECT state, COUNT(*) FROM work WHERE state IN ('queued', 'leased') GROUP BY state"
+        ).fetchall())
+        workers = self._db.execute(
+            "SELECT worker, running, heartbeat_at FROM workers WHERE heartbeat_at >= ? ORDER BY worker",
+            (time() - self.lease,),
+        ).fetchall()
+        return {
+            "queued": counts.get("queued", 0),
+            "leased": counts.get("leased", 0),
+            "workers": [{"worker": w, "running": running, "seen": time() - seen} for w, running, seen in workers],
+        }
+
+
+WORK_QUEUE = None
+if MODE not in ("standalone", "coordinator", "worker"):
+    LOGGER(__name__).error(f"Unknown MODE {MODE!r}, running standalone")
+    MODE = "standalone"
+if MODE != "standalone":
+    try:
+        WORK_QUEUE = WorkQueue(WORK_QUEUE_PATH or get_data_path("work_queue.db"))
+    except sqlite3.Error as e:
+        LOGGER(__name__).error(f"Work queue unavailable, running standalone: {e}")
+        MODE = "standalone"
@@ -1,22 +1,87 @@
-import logging
 import os
-from logging.handlers import RotatingFileHandler
+import json
+import queue
+import atexit
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "logs.txt"
+LOG_MAX_BYTES = 5000000
+LOG_BACKUPS = 10
 
 # removing old logs file if they exist.
 try:
-    os.remove("logs.txt")
+    os.remove(LOG_FILE)
 except:
     pass
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s - %(levelname)s] - %(funcName)s() - Line %(lineno)d: %(name)s - %(message)s",
+# Job/message IDs attached to every record logged in the current task
+_LOG_CONTEXT = ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach ``fields`` (e.g. job, msg_id) to records logged inside the block."""
+    token = _LOG_CONTEXT.set({**_LOG_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _LOG_CONTEXT.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    # Runs in the logging task, before the record crosses the queue
+    def filter(self, record):
+        record.ctx = _LOG_CONTEXT.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, function, line, message and context."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "line": record.lineno,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "ctx", None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        ctx = getattr(record, "ctx", None)
+        if ctx:
+            text += " [" + " ".join(f"{key}={value}" for key, value in ctx.items()) + "]"
+        return text
+
+
+# Callers only put records on a queue; a background thread does the disk and
+# stdout writes so logging never blocks the event loop
+_file_handler = RotatingFileHandler(LOG_FILE, mode="w+", maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+_file_handler.setFormatter(JsonFormatter())
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(TextFormatter(
+    "[%(asctime)s - %(levelname)s] - %(funcName)s() - Line %(lineno)d: %(name)s - %(message)s",
     datefmt="%d-%b-%y %I:%M:%S %p",
-    handlers=[
-        RotatingFileHandler("logs.txt", mode="w+", maxBytes=5000000, backupCount=10),
-        logging.StreamHandler(),
-    ],
-)
+))
+
+_queue = queue.SimpleQueue()
+_queue_handler = QueueHandler(_queue)
+_queue_handler.addFilter(_ContextFilter())
+_listener = QueueListener(_queue, _file_handler, _stream_handler, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
+
+logging.getLogger().setLevel(logging.INFO)
+logging.getLogger().addHandler(_queue_handler)
 
 logging.getLogger("pyrogram").setLevel(logging.ERROR)
 
@@ -2,8 +2,6 @@
 # Channel: https://t.me/itsSmartDev
 
 import os
-import shutil
-import psutil
 import asyncio
 import signal
 from time import time
@@ -17,38 +15,56 @@ from config import PyroConf
 raw = PyroConf.SESSION_STRING or ""
 clean_session = raw.strip().strip('"').strip("'")
 
-def _validate_session(s: str):
+def _validate_session(s: str, name: str = "SESSION_STRING"):
     if not s:
-        raise ValueError("SESSION_STRING missing. Generate with: python -m pyrogram")
+        raise ValueError(f"{name} missing. Generate with: python -m pyrogram")
     # Basic char set check (urlsafe base64)
     allowed = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
     invalid = set(s) - allowed
     if invalid:
-        raise ValueError(f"Invalid characters in SESSION_STRING: {''.join(sorted(invalid))}")
+        raise ValueError(f"Invalid characters in {name}: {''.join(sorted(invalid))}")
     core_len = len(s.rstrip("="))
     if core_len % 4 == 1:
-        raise ValueError("Invalid SESSION_STRING (corrupt length mod 4 == 1). Regenerate with: python -m pyrogram")
+        raise ValueError(f"Invalid {name} (corrupt length mod 4 == 1). Regenerate with: python -m pyrogram")
     # Try urlsafe decode with padding fix
     padded = s + "=" * ((4 - len(s) % 4) % 4)
     try:
         decoded = urlsafe_b64decode(padded.encode())
     except Exception:
-        raise ValueError("Invalid SESSION_STRING (urlsafe base64 decode failed). Regenerate.")
+        raise ValueError(f"Invalid {name} (urlsafe base64 decode failed). Regenerate.")
     if len(decoded) < 200:
-        raise ValueError("Invalid SESSION_STRING (decoded blob too small). Regenerate.")
+        raise ValueError(f"Invalid {name} (decoded blob too small). Regenerate.")
 
-_validate_session(clean_session)
+from helpers.workqueue import MODE
+
+extra_sessions = []
+# The coordinator only hands work to workers, so it runs without user sessions
+if MODE != "coordinator":
+    _validate_session(clean_session)
+    for index, extra in enumerate(PyroConf.EXTRA_SESSION_STRINGS, start=1):
+        extra = extra.strip().strip('"').strip("'")
+        _validate_session(extra, f"SESSION_STRING_{index}")
+        if extra != clean_session and extra not in extra_sessions:
+            extra_sessions.append(extra)
 
-from pyleaves import Leaves
 from pyrogram.enums import ParseMode
 from pyrogram import Client, filters, idle
 from pyrogram.errors import PeerIdInvalid, BadRequest
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, BotCommand
 
 from helpers.utils import (
+    can_copy,
+    can_stream,
+    copy_to_chat,
+    download_media_file,
+    drop_progress,
+    get_cached_file_id,
     processMediaGroup,
     progressArgs,
-    send_media
+    remember_upload,
+    send_cached,
+    send_media,
+    stream_media_to_chat
 )
 
 from helpers.files import (
@@ -59,6 +75,23 @@ from helpers.files import (
     cleanup_download
 )
 
+from helpers.cache import FILE_CACHE, RECENT_DOWNLOADS
+from helpers.probe import FFMPEG_POOL
+from helpers.progress import PROGRESS
+from helpers.transfer import stop_media_sessions
+from helpers.batch import MessagePrefetcher, run_batch_pool
+from helpers.jobs import JOB_STORE
+from helpers.logs import gzip_logs, log_files, parse_log_query, write_logs
+from helpers.metrics import METRICS, METRICS_HOST, METRICS_PORT
+from helpers.pacer import PACER
+from helpers.profiler import PROFILER, PROFILE_MAX_SECONDS
+from helpers.peers import PEER_CACHE
+from helpers.sessions import SESSIONS
+from helpers.uploaders import UPLOADERS
+from helpers.workqueue import WORKER_ID, WORK_QUEUE, WORK_HEARTBEAT, WORK_POLL_INTERVAL
+from helpers.storage import STORAGE
+from helpers.scheduler import SCHEDULER, PRIORITY_BATCH, PRIORITY_INTERACTIVE, QueueFull
+
 from helpers.msg import (
     getChatMsgID,
     get_file_name,
@@ -66,7 +99,7 @@ from helpers.msg import (
 )
 
 print("Loaded SESSION_STRING length:", len(PyroConf.SESSION_STRING) if PyroConf.SESSION_STRING else "None")
-from logger import LOGGER
+from logger import LOGGER, log_context
 
 # Initialize the bot client
 _WORKERS = int(os.getenv("BOT_WORKERS", "32"))  # tune for Heroku dyno size (32 is plenty for most dynos)
@@ -77,14 +110,39 @@ bot = Client(
     bot_token=PyroConf.BOT_TOKEN,
     workers=_WORKERS,
     parse_mode=ParseMode.MARKDOWN,
+    # Workers only send; commands reach the coordinator, which owns the session file
+    no_updates=MODE == "worker",
+    in_memory=MODE == "worker",
 )
 
+# Helper bots upload into the relay chat; the bot above delivers by file_id
+UPLOADERS.add(bot)
+for index, token in enumerate(PyroConf.HELPER_BOT_TOKENS, start=1):
+    UPLOADERS.add(Client(
+        f"helper_bot_{index}",
+        api_id=PyroConf.API_ID,
+        api_hash=PyroConf.API_HASH,
+        bot_token=token,
+        workers=4,
+        no_updates=True,
+    ))
+
 # Client for user session
-user = Client("user_session", workers=1000, session_string=clean_session)
+# sleep_threshold=0: pyrogram would otherwise sleep through short FloodWaits unseen by the pacer
+user = Client("user_session", workers=1000, session_string=clean_session, sleep_threshold=0)
+
+# Extra user sessions share fetches and downloads with the primary one
+if MODE != "coordinator":
+    SESSIONS.add(user)
+for index, session_string in enumerate(extra_sessions, start=1):
+    SESSIONS.add(Client(
+        f"user_session_{index}", workers=1000, session_string=session_string, no_updates=True, sleep_threshold=0,
+    ))
 
 RUNNING_TASKS = set()
 from asyncio import Event
 CANCEL_EVENT = Event()
+SHUTDOWN_EVENT = Event()  # set on SIGTERM/SIGINT; interrupted batches stay resumable
 
 def cancel_all_running():
     CANCEL_EVENT.set()
@@ -95,13 +153,15 @@ def cancel_all_running():
 def reset_cancellation():
     if CANCEL_EVENT.is_set():
         CANCEL_EVENT.clear()
-RECENT_DOWNLOADS = {}  # (chat_id, message_id) -> last_success_timestamp
 ACTIVE_LOCKS = {}      # (chat_id, message_id) -> asyncio.Lock
-RECENT_TTL = int(os.getenv("DOWNLOAD_DEDUP_TTL", "900"))  # seconds (default 15 min)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))  # concurrent IDs per /bdl job
+PREFETCH_CHUNK = int(os.getenv("PREFETCH_CHUNK", "200"))  # message IDs per get_messages call (API max 200)
+PREFETCH_WINDOW = int(os.getenv("PREFETCH_WINDOW", "400"))  # messages held ahead of the batch workers
 
 # Batch job state for pause/continue
 class BatchJob:
-    def __init__(self, *, name: str, start_id: int, end_id: int, prefix: str, candidates, chat_id: int, start_url: str, end_url: str, initiator_id: int):
+    def __init__(self, *, name: str, start_id: int, end_id: int, prefix: str, candidates, chat_id: int, start_url: str, end_url: str, initiator_id: int, origin_msg_id: int = 0):
+        self.job_id = None  # row id in JOB_STORE
         self.name = name
         self.start_id = start_id
         self.end_id = end_id
@@ -110,6 +170,7 @@ class BatchJob:
         self.candidates = candidates  # primary_candidates list
         self.chat_id = chat_id
         self.initiator_id = initiator_id
+        self.origin_msg_id = origin_msg_id  # the /bdl message, replied to when resuming after a restart
         self.start_url = start_url
         self.end_url = end_url
         self.downloaded = 0
@@ -117,6 +178,10 @@ class BatchJob:
         self.failed = 0
         self.active = True
         self.paused = False
+        self.restored = False  # loaded from JOB_STORE after a restart
+        self.released = False  # another worker took the job over after this one lost its lease
+        self.store_lock = asyncio.Lock()  # JOB_STORE writes for this job run one at a time
+        self.checkpoint_due = False  # a checkpoint is scheduled and has not started yet
         self.created_at = time()
         self.updated_at = time()
 
@@ -131,25 +196,93 @@ class BatchJob:
             "progress": f"{self.next_id - self.start_id}/{self.end_id - self.start_id + 1}",
         }
 
+    def to_record(self):
+        record = {field: getattr(self, field) for field in (
+            "name", "start_id", "end_id", "next_id", "prefix", "candidates", "chat_id",
+            "origin_msg_id", "initiator_id", "start_url", "end_url",
+            "downloaded", "skipped", "failed", "created_at", "updated_at",
+        )}
+        record["state"] = "paused" if self.paused else "active"
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls(
+            name=record["name"],
+            start_id=record["start_id"],
+            end_id=record["end_id"],
+            prefix=record["prefix"],
+            candidates=record["candidates"],
+            chat_id=record["chat_id"],
+            start_url=record["start_url"],
+            end_url=record["end_url"],
+            initiator_id=record["initiator_id"],
+            origin_msg_id=record["origin_msg_id"],
+        )
+        job.job_id = record["job_id"]
+        job.next_id = record["next_id"]
+        job.downloaded = record["downloaded"]
+        job.skipped = record["skipped"]
+        job.failed = record["failed"]
+        job.created_at = record["created_at"]
+        job.updated_at = record["updated_at"]
+        job.paused = record["state"] == "paused"
+        job.active = not job.paused
+        job.restored = True
+        return job
+
+
+# JOB_STORE may be shared with other processes, so its calls run in a thread.
+# Each write stores the job as it is when the write starts, so they never go backwards.
+async def _save_job(job: BatchJob):
+    if JOB_STORE is None:
+        return
+    async with job.store_lock:
+        job.checkpoint_due = False
+        if job.job_id is None:
+            job.job_id = await asyncio.to_thread(JOB_STORE.add, job.to_record())
+        else:
+            await asyncio.to_thread(JOB_STORE.save, job.job_id, job.to_record())
+
+
+_CHECKPOINTS = set()  # scheduled checkpoint tasks, referenced until done
+
+def _checkpoint_job(job: BatchJob):
+    """Schedule ``_save_job`` from sync code; checkpoints queued behind a running write merge into one."""
+    if JOB_STORE is None or job.checkpoint_due:
+        return
+    job.checkpoint_due = True
+    task = asyncio.create_task(_save_job(job))
+    _CHECKPOINTS.add(task)
+    task.add_done_callback(_CHECKPOINTS.discard)
+
+
+async def _forget_job(job: BatchJob):
+    if JOB_STORE is None:
+        return
+    async with job.store_lock:
+        if job.job_id is not None:
+            await asyncio.to_thread(JOB_STORE.delete, job.job_id)
+
 PAUSED_JOBS = {}  # name -> BatchJob
-ACTIVE_BATCH_JOB: BatchJob | None = None
+ACTIVE_BATCH_JOBS = []  # running BatchJob objects
+MAX_ACTIVE_BATCHES = int(os.getenv("MAX_ACTIVE_BATCHES", "4"))  # batch jobs running at once
+WORKER_ITEMS = int(os.getenv("WORKER_ITEMS", str(SCHEDULER.slots)))  # queue items a worker runs at once
 _pause_name_counter = 0
 
-def _is_recent(chat_id, message_id):
-    ts = RECENT_DOWNLOADS.get((chat_id, message_id))
-    if not ts:
-        return False
-    if time() - ts > RECENT_TTL:
-        RECENT_DOWNLOADS.pop((chat_id, message_id), None)
-        return False
-    return True
-
-def _mark_download(chat_id, message_id):
-    RECENT_DOWNLOADS[(chat_id, message_id)] = time()
-    if len(RECENT_DOWNLOADS) > 200:
-        expired = [k for k, v in RECENT_DOWNLOADS.items() if time() - v > RECENT_TTL]
-        for k in expired:
-            RECENT_DOWNLOADS.pop(k, None)
+# With a work queue, locks and dedup marks are also kept in it so they hold across workers
+# (WorkQueue calls block on SQLite, so they run in a thread)
+async def _is_recent(chat_id, message_id):
+    if (chat_id, message_id) in RECENT_DOWNLOADS:
+        return True
+    return WORK_QUEUE is not None and await asyncio.to_thread(
+        WORK_QUEUE.is_recent, f"{chat_id}:{message_id}", RECENT_DOWNLOADS.ttl
+    )
+
+async def _mark_download(chat_id, message_id):
+    RECENT_DOWNLOADS.mark((chat_id, message_id))
+    if WORK_QUEUE is not None:
+        await asyncio.to_thread(WORK_QUEUE.mark_recent, f"{chat_id}:{message_id}", RECENT_DOWNLOADS.ttl)
 
 async def _acquire_lock(chat_id, message_id):
     key = (chat_id, message_id)
@@ -158,12 +291,23 @@ async def _acquire_lock(chat_id, message_id):
         lock = asyncio.Lock()
         ACTIVE_LOCKS[key] = lock
     await lock.acquire()
+    if WORK_QUEUE is not None:
+        try:
+            while not await asyncio.to_thread(WORK_QUEUE.try_lock, f"{chat_id}:{message_id}", WORKER_ID):
+                await asyncio.sleep(WORK_POLL_INTERVAL)
+        except BaseException:
+            await _release_lock(key, lock)
+            raise
     return key, lock
 
-def _release_lock(key, lock):
-    if lock.locked():
-        lock.release()
-    ACTIVE_LOCKS.pop(key, None)
+async def _release_lock(key, lock):
+    try:
+        if WORK_QUEUE is not None:
+            await asyncio.to_thread(WORK_QUEUE.unlock, f"{key[0]}:{key[1]}", WORKER_ID)
+    finally:
+        if lock.locked():
+            lock.release()
+        ACTIVE_LOCKS.pop(key, None)
 
 def track_task(coro):
     task = asyncio.create_task(coro)
@@ -173,13 +317,31 @@ def track_task(coro):
     task.add_done_callback(_remove)
     return task
 
-# Patch progress function to allow mid-transfer cancellation
-_orig_progress = Leaves.progress_for_pyrogram
-def _cancellable_progress(current, total, *args):
-    if CANCEL_EVENT.is_set():
-        raise asyncio.CancelledError()
-    return _orig_progress(current, total, *args)
-Leaves.progress_for_pyrogram = _cancellable_progress
+# Progress callbacks raise CancelledError once /killall is requested
+PROGRESS.cancel_event = CANCEL_EVENT
+
+# Queue depths, read when /metrics is scraped
+METRICS.gauge("scheduler_running", "Posts holding a transfer slot.", lambda: SCHEDULER.running)
+METRICS.gauge("scheduler_interactive_waiting", "Single downloads waiting for a slot.", lambda: SCHEDULER.snapshot()["interactive"])
+METRICS.gauge("scheduler_batch_waiting", "Batch posts waiting for a slot.", lambda: SCHEDULER.snapshot()["batch"])
+METRICS.gauge("pacer_rate", "Current user-session request rate per second.", lambda: PACER.rate)
+METRICS.gauge("pacer_waiting", "User-session requests waiting to be paced.", lambda: PACER.waiting)
+METRICS.gauge("user_sessions", "User sessions in the pool.", lambda: len(SESSIONS.sessions))
+METRICS.gauge("user_sessions_flood_waited", "User sessions out of rotation for a FloodWait.", lambda: sum(1 for s in SESSIONS.sessions if s.blocked_for() > 0))
+METRICS.gauge("storage_reserved_bytes", "Bytes reserved in downloads/.", lambda: STORAGE.reserved)
+METRICS.gauge("storage_waiting", "Downloads waiting for disk budget.", lambda: STORAGE.waiting)
+METRICS.gauge("ffmpeg_running", "ffmpeg/ffprobe processes running.", lambda: FFMPEG_POOL.running)
+METRICS.gauge("ffmpeg_queued", "ffmpeg/ffprobe runs waiting.", lambda: FFMPEG_POOL.queued)
+METRICS.gauge("batch_jobs_active", "Running /bdl jobs.", lambda: len(ACTIVE_BATCH_JOBS))
+METRICS.gauge("tasks_running", "Tracked download tasks.", lambda: sum(1 for t in RUNNING_TASKS if not t.done()))
+if WORK_QUEUE is not None:
+    _work_queued = {"count": 0}
+
+    async def _count_work_queued():
+        _work_queued["count"] = await asyncio.to_thread(WORK_QUEUE.pending)
+
+    METRICS.refresh(_count_work_queued)
+    METRICS.gauge("work_queue_queued", "Queue items waiting for a worker.", lambda: _work_queued["count"])
 
 BOT_COMMANDS = [
     ("start", "Start bot / greeting"),
@@ -191,6 +353,8 @@ BOT_COMMANDS = [
     ("killall", "Cancel active downloads"),
     ("logs", "Fetch recent logs"),
     ("stats", "Show resource stats"),
+    ("metrics", "Show pipeline timings"),
+    ("profile", "Profile the bot (admins)"),
 ]
 
 DEBUG_UPDATES = os.getenv("DEBUG_UPDATES", "0") == "1"
@@ -254,8 +418,9 @@ async def help_command(_, message: Message):
     "   • `/help` – This help message.\n"
     "   • `/dl <post_URL>` – Download single post media/text.\n"
     "   • `/bdl <start_link> <end_link>` – Batch range download.\n"
+    "   • `/pause [name]` / `/continue [name|list]` – Pause, resume or list batches (kept across restarts).\n"
     "   • `/killall` – Cancel all active downloads.\n"
-    "   • `/logs` – Get recent log file.\n"
+    "   • `/logs [tail N] [level L] [job NAME] [msg ID] [grep TEXT]` – All logs as gzip, or matching lines.\n"
     "   • `/stats` – Runtime & resource stats.\n\n"
         "**Example**:\n"
         "  • `/dl https://t.me/itsSmartDev/547`\n"
@@ -273,6 +438,7 @@ async def help_command(_, message: Message):
     await message.reply(help_text, reply_markup=markup, disable_web_page_preview=True)
 
 
+@METRICS.timed("request")
 async def handle_download(bot: Client, message: Message, post_url: str):
     # Cut off URL at '?' if present
     if "?" in post_url:
@@ -280,28 +446,35 @@ async def handle_download(bot: Client, message: Message, post_url: str):
 
     try:
         chat_candidates, message_id = getChatMsgID(post_url)
-        last_error = None
-        chat_message = None
-        chosen_chat_id = None
-        for candidate in chat_candidates:
-            try:
-                chat_message = await user.get_messages(chat_id=candidate, message_ids=message_id)
-                if chat_message:
-                    chosen_chat_id = candidate
-                    break
-            except Exception as e:
-                last_error = e
-                continue
+        chosen_chat_id, chat_message, last_error = await SESSIONS.fetch(chat_candidates, message_id)
         if not chat_message:
             raise last_error or ValueError("Failed to fetch message with any chat id variant")
 
-        # Dedup check
+        # Repeat requests for an uploaded file are re-sent by file_id, for any user
         lock_key = lock_obj = None
-        if chosen_chat_id is not None and _is_recent(chosen_chat_id, message_id):
+        if chat_message.media and not chat_message.media_group_id:
+            cached_caption = await get_parsed_msg(
+                chat_message.caption or "", chat_message.caption_entities
+            )
+            if await send_cached(bot, chat_message, message, cached_caption):
+                return
+
+        # Dedup check (albums go through processMediaGroup, which uses the cache per item)
+        if (
+            chosen_chat_id is not None
+            and not chat_message.media_group_id
+            and await _is_recent(chosen_chat_id, message_id)
+        ):
             return await message.reply("**Cached:** Already downloaded recently.")
         if chosen_chat_id is not None:
             lock_key, lock_obj = await _acquire_lock(chosen_chat_id, message_id)
 
+        if (chat_message.media or chat_message.media_group_id) and await copy_to_chat(
+            bot, chat_message, chosen_chat_id, message
+        ):
+            await _mark_download(chosen_chat_id, message_id)
+            return
+
         LOGGER(__name__).info(f"Downloading media from URL: {post_url}")
 
         if chat_message.document or chat_message.video or chat_message.audio:
@@ -314,7 +487,7 @@ async def handle_download(bot: Client, message: Message, post_url: str):
             )
 
             if not await fileSizeLimit(
-                file_size, message, "download", user.me.is_premium
+                file_size, message, "download", chat_message._client.me.is_premium
             ):
                 return
 
@@ -336,19 +509,6 @@ async def handle_download(bot: Client, message: Message, post_url: str):
             start_time = time()
             progress_message = await message.reply("**📥 Downloading Progress...**")
 
-            filename = get_file_name(message_id, chat_message)
-            download_path = get_download_path(message.id, filename)
-
-            media_path = await chat_message.download(
-                file_name=download_path,
-                progress=Leaves.progress_for_pyrogram,
-                progress_args=progressArgs(
-                    "📥 Downloading Progress", progress_message, start_time
-                ),
-            )
-
-            LOGGER(__name__).info(f"Downloaded media: {media_path}")
-
             media_type = (
                 "photo"
                 if chat_message.photo
@@ -358,29 +518,65 @@ async def handle_download(bot: Client, message: Message, post_url: str):
                 if chat_message.audio
                 else "document"
             )
-            await send_media(
-                bot,
-                message,
-                media_path,
-                media_type,
-                parsed_caption,
-                progress_message,
-                start_time,
+
+            if can_stream(chat_message, media_type):
+                try:
+                    sent = await stream_media_to_chat(
+                        chat_message._client, bot, message, chat_message, media_type,
+                        parsed_caption, progress_message, start_time,
+                    )
+                    remember_upload(chat_message, sent, media_type)
+                    if chosen_chat_id is not None:
+                        await _mark_download(chosen_chat_id, message_id)
+                    await drop_progress(progress_message)
+                    return
+                except Exception as e:
+                    LOGGER(__name__).info(f"Streaming failed, falling back to download: {e}")
+
+            filename = get_file_name(message_id, chat_message)
+            download_path = get_download_path(message.id, filename)
+
+            media_path = await download_media_file(
+                chat_message._client,
+                chat_message,
+                download_path,
+                progress=PROGRESS.update,
+                progress_args=progressArgs(
+                    "📥 Downloading Progress", progress_message, start_time
+                ),
             )
 
-            cleanup_download(media_path)
+            LOGGER(__name__).info(f"Downloaded media: {media_path}")
+
+            try:
+                sent = await send_media(
+                    bot,
+                    message,
+                    media_path,
+                    media_type,
+                    parsed_caption,
+                    progress_message,
+                    start_time,
+                    source_message=chat_message,
+                )
+            finally:
+                cleanup_download(media_path)
+            remember_upload(chat_message, sent, media_type)
+
             if chosen_chat_id is not None:
-                _mark_download(chosen_chat_id, message_id)
-            await progress_message.delete()
+                await _mark_download(chosen_chat_id, message_id)
+            await drop_progress(progress_message)
 
         elif chat_message.text or chat_message.caption:
             await message.reply(parsed_text or parsed_caption)
         else:
             await message.reply("**No media or text found in the post URL.**")
 
-    except (PeerIdInvalid, BadRequest, KeyError):
+    except (PeerIdInvalid, BadRequest, KeyError) as e:
+        METRICS.error("request", e)
         await message.reply("**Make sure the user client is part of the chat.**")
     except Exception as e:
+        METRICS.error("request", e)
         error_message = f"**❌ {str(e)}**"
         await message.reply(error_message)
         LOGGER(__name__).error(e)
@@ -389,15 +585,27 @@ async def handle_download(bot: Client, message: Message, post_url: str):
         LOGGER(__name__).info("Download task cancelled by /killall")
     finally:
         if 'lock_key' in locals() and lock_key and 'lock_obj' in locals() and lock_obj:
-            _release_lock(lock_key, lock_obj)
+            await _release_lock(lock_key, lock_obj)
 
 
-async def handle_download_status(bot: Client, message: Message, post_url: str) -> str:
+@METRICS.timed("batch_item")
+async def handle_download_status(
+    bot: Client, message: Message, post_url: str, wait_turn=None, prefetched=None, status_message=None,
+    turn_ready=None,
+) -> str:
     """Batch-friendly variant of handle_download.
 
     Returns one of: 'downloaded', 'skipped', 'failed'.
     It will retry transient download failures a limited number of times
     (controlled by RETRY_DOWNLOADS env or default 2) before deciding.
+    When ``wait_turn`` is given it is awaited right before anything is sent
+    to the user, so concurrent batch workers still deliver in ID order.
+    ``prefetched`` is an optional ``(chat_id, Message)`` pair from the batch
+    prefetcher; the per-ID lookup is only done when it is missing.
+    ``status_message`` is the batch job's status message; transfers report
+    into it instead of posting a progress message per item. ``turn_ready()``
+    is true once it is this item's turn; such an item may exceed the disk
+    budget, since later items holding space are waiting on it.
     """
     retries = int(os.getenv("RETRY_DOWNLOADS", "2"))
     try:
@@ -406,37 +614,80 @@ async def handle_download_status(bot: Client, message: Message, post_url: str) -
         return "skipped"
 
     last_error = None
-    chat_message = None
-    chosen_chat_id = None
-    for candidate in chat_candidates:
-        try:
-            chat_message = await user.get_messages(chat_id=candidate, message_ids=message_id)
-            if chat_message:
-                chosen_chat_id = candidate
-                break
-        except Exception as e:
-            last_error = e
-            continue
+    chosen_chat_id, chat_message = prefetched or (None, None)
+    if not chat_message:
+        chosen_chat_id, chat_message, last_error = await SESSIONS.fetch(chat_candidates, message_id)
     if not chat_message:
         LOGGER(__name__).info(f"All candidates failed for {post_url}: {last_error}")
         return "skipped"
 
-    if chosen_chat_id is not None and _is_recent(chosen_chat_id, message_id):
+    # One cache lookup per item; the result is passed down to the cached send
+    cached_id = (
+        get_cached_file_id(chat_message) if chat_message.media and not chat_message.media_group_id else None
+    )
+    if (
+        chosen_chat_id is not None
+        and not chat_message.media_group_id
+        and await _is_recent(chosen_chat_id, message_id)
+        and not cached_id
+    ):
         return "skipped"
     lock_key = lock_obj = None
     if chosen_chat_id is not None:
         lock_key, lock_obj = await _acquire_lock(chosen_chat_id, message_id)
 
+    try:
+        return await _process_status_message(
+            bot, message, post_url, chat_message, chat_candidates,
+            chosen_chat_id, message_id, retries, wait_turn, status_message, turn_ready, cached_id,
+        )
+    finally:
+        if lock_key and lock_obj:
+            await _release_lock(lock_key, lock_obj)
+
+
+async def _process_status_message(
+    bot, message, post_url, chat_message, chat_candidates,
+    chosen_chat_id, message_id, retries, wait_turn, status_message=None, turn_ready=None, cached_id=None,
+) -> str:
     # Nothing to process
     if not (chat_message.media_group_id or chat_message.media or chat_message.text or chat_message.caption):
         return "skipped"
 
+    # Previously uploaded file: re-send by file_id, in order
+    if cached_id:
+        if wait_turn is not None:
+            await wait_turn()
+        try:
+            parsed_caption = await get_parsed_msg(chat_message.caption or "", chat_message.caption_entities)
+            if await send_cached(bot, chat_message, message, parsed_caption, file_id=cached_id):
+                if chosen_chat_id is not None:
+                    await _mark_download(chosen_chat_id, message_id)
+                return "downloaded"
+        except Exception as e:
+            LOGGER(__name__).info(f"Cached send failed for {post_url}: {e}")
+
+    # Unprotected source: let Telegram copy it server-side, in order
+    if (chat_message.media_group_id or chat_message.media) and can_copy(chat_message, chosen_chat_id):
+        if wait_turn is not None:
+            await wait_turn()
+        try:
+            if await copy_to_chat(bot, chat_message, chosen_chat_id, message):
+                if chosen_chat_id is not None:
+                    await _mark_download(chosen_chat_id, message_id)
+                return "downloaded"
+        except Exception as e:
+            LOGGER(__name__).info(f"Copy failed for {post_url}: {e}")
+
     # Media group path reuses existing logic; failures count as failed
     if chat_message.media_group_id:
         try:
-            ok = await processMediaGroup(chat_message, bot, message)
+            ok = await processMediaGroup(
+                chat_message, bot, message, wait_turn=wait_turn, progress_message=status_message,
+                urgent=turn_ready,
+            )
             if ok and chosen_chat_id is not None:
-                _mark_download(chosen_chat_id, message_id)
+                await _mark_download(chosen_chat_id, message_id)
             return "downloaded" if ok else "skipped"
         except Exception as e:
             LOGGER(__name__).error(f"Media group error: {e}")
@@ -447,9 +698,11 @@ async def handle_download_status(bot: Client, message: Message, post_url: str) -
         try:
             parsed_caption = await get_parsed_msg(chat_message.caption or "", chat_message.caption_entities)
             parsed_text = await get_parsed_msg(chat_message.text or "", chat_message.entities)
+            if wait_turn is not None:
+                await wait_turn()
             await message.reply(parsed_text or parsed_caption or "")
             if chosen_chat_id is not None:
-                _mark_download(chosen_chat_id, message_id)
+                await _mark_download(chosen_chat_id, message_id)
             return "downloaded"
         except Exception as e:
             LOGGER(__name__).error(f"Reply text error: {e}")
@@ -457,11 +710,34 @@ async def handle_download_status(bot: Client, message: Message, post_url: str) -
 
     # Media (single) with retry
     filename = get_file_name(message_id, chat_message)
-    download_path = get_download_path(message.id, filename)
+    download_path = get_download_path(f"{message.id}_{message_id}", filename)
     parsed_caption = await get_parsed_msg(chat_message.caption or "", chat_message.caption_entities)
     start_time = time()
-    progress_message = await message.reply("**📥 Downloading Progress...**")
+    owns_progress = status_message is None
+    progress_message = status_message or await message.reply("**📥 Downloading Progress...**")
+
+    media_type = (
+        "photo" if chat_message.photo else
+        "video" if chat_message.video else
+        "audio" if chat_message.audio else
+        "document"
+    )
+    if can_stream(chat_message, media_type):
+        try:
+            sent = await stream_media_to_chat(
+                chat_message._client, bot, message, chat_message, media_type,
+                parsed_caption, progress_message, start_time, wait_turn=wait_turn,
+                progress_key=message_id,
+            )
+            remember_upload(chat_message, sent, media_type)
+            if chosen_chat_id is not None:
+                await _mark_download(chosen_chat_id, message_id)
+            await drop_progress(progress_message, owns_progress, message_id)
+            return "downloaded"
+        except Exception as e:
+            LOGGER(__name__).info(f"Streaming failed for {post_url}, falling back to download: {e}")
 
+    last_error = None
     attempt = 0
     while attempt <= retries:
         attempt += 1
@@ -469,19 +745,21 @@ async def handle_download_status(bot: Client, message: Message, post_url: str) -
             chat_message_refreshed = chat_message
             if attempt > 1:
                 # Re-fetch message to refresh file reference in case it's expired
-                for candidate in chat_candidates:
-                    try:
-                        chat_message_refreshed = await user.get_messages(chat_id=candidate, message_ids=message_id)
-                        if chat_message_refreshed:
-                            break
-                    except Exception:
-                        continue
-            media_path = await chat_message_refreshed.download(
-                file_name=download_path,
-                progress=Leaves.progress_for_pyrogram,
+                # (any session will do: the download follows the one that fetched it)
+                _, refreshed, _ = await SESSIONS.fetch(
+                    [chosen_chat_id] if chosen_chat_id is not None else chat_candidates, message_id
+                )
+                chat_message_refreshed = refreshed or chat_message
+            media_path = await download_media_file(
+                chat_message_refreshed._client,
+                chat_message_refreshed,
+                download_path,
+                progress=PROGRESS.update,
                 progress_args=progressArgs(
-                    f"📥 Downloading Progress (Attempt {attempt}/{retries+1})", progress_message, start_time
+                    f"📥 Downloading {message_id} (Attempt {attempt}/{retries+1})", progress_message, start_time,
+                    key=message_id,
                 ),
+                urgent=turn_ready,
             )
             media_type = (
                 "photo" if chat_message_refreshed.photo else
@@ -489,7 +767,9 @@ async def handle_download_status(bot: Client, message: Message, post_url: str) -
                 "audio" if chat_message_refreshed.audio else
                 "document"
             )
-            await send_media(
+            if wait_turn is not None:
+                await wait_turn()
+            sent = await send_media(
                 bot,
                 message,
                 media_path,
@@ -497,32 +777,34 @@ async def handle_download_status(bot: Client, message: Message, post_url: str) -
                 parsed_caption,
                 progress_message,
                 start_time,
+                progress_key=message_id,
+                source_message=chat_message_refreshed,
             )
+            remember_upload(chat_message_refreshed, sent, media_type)
             cleanup_download(media_path)
             if chosen_chat_id is not None:
-                _mark_download(chosen_chat_id, message_id)
-            await progress_message.delete()
+                await _mark_download(chosen_chat_id, message_id)
+            await drop_progress(progress_message, owns_progress, message_id)
             return "downloaded"
         except Exception as e:
             last_error = e
+            # No fixed sleep: the next attempt is paced by the session's pacer,
+            # which also holds its requests for the exact FloodWait duration
             LOGGER(__name__).info(f"Download attempt {attempt} failed for {post_url}: {e}")
-            await asyncio.sleep(min(5, attempt * 2))
             continue
         except asyncio.CancelledError:
-            await progress_message.delete()
+            await drop_progress(progress_message, owns_progress, message_id)
+            cleanup_download(download_path)
             LOGGER(__name__).info(f"Cancelled download {post_url}")
             return "skipped"
 
-    await progress_message.delete()
+    await drop_progress(progress_message, owns_progress, message_id)
+    cleanup_download(download_path)
     # Decide skipped vs failed: treat typical file ref issues as skipped
     error_text = str(last_error) if last_error else "Unknown error"
     if any(k in error_text for k in ["FILE_REFERENCE_", "MEDIA_EMPTY", "ENTITY_BOUNDS"]):
-        result = "skipped"
-    else:
-        result = "failed"
-    if lock_key and lock_obj:
-        _release_lock(lock_key, lock_obj)
-    return result
+        return "skipped"
+    return "failed"
 
 
 @bot.on_message(filters.command("dl") & (filters.private | filters.group))
@@ -532,7 +814,152 @@ async def download_media(bot: Client, message: Message):
         return
 
     post_url = message.command[1]
-    await track_task(handle_download(bot, message, post_url))
+    await _dispatch_download(bot, message, post_url)
+
+
+async def _dispatch_download(bot: Client, message: Message, post_url: str):
+    """Download here, or hand the request to a worker in coordinator mode."""
+    if MODE != "coordinator":
+        track_task(_queued_download(bot, message, post_url))
+        return
+    owner = message.from_user.id if message.from_user else message.chat.id
+    if SCHEDULER.max_queue > 0 and await asyncio.to_thread(WORK_QUEUE.pending, "download") >= SCHEDULER.max_queue:
+        return await message.reply("**⏳ The bot is busy right now. Please try again in a few minutes.**")
+    await asyncio.to_thread(
+        WORK_QUEUE.enqueue,
+        "download", {"chat_id": message.chat.id, "message_id": message.id, "post_url": post_url}, owner,
+    )
+    position = await asyncio.to_thread(WORK_QUEUE.pending, "download")
+    if position > 1:
+        await message.reply(f"**⏳ Queued at position {position}.** Your download starts automatically.")
+
+
+async def _queued_download(bot: Client, message: Message, post_url: str):
+    """Wait for a scheduler slot, telling the user their place in the queue, then download."""
+    owner = message.from_user.id if message.from_user else message.chat.id
+    try:
+        ticket = SCHEDULER.submit(owner, PRIORITY_INTERACTIVE, check_full=True)
+    except QueueFull:
+        return await message.reply("**⏳ The bot is busy right now. Please try again in a few minutes.**")
+
+    queued_msg = None
+    position = SCHEDULER.position(ticket)
+    if position:
+        try:
+            queued_msg = await message.reply(f"**⏳ Queued at position {position}.** Your download starts automatically.")
+        except asyncio.CancelledError:
+            SCHEDULER.cancel(ticket)
+            raise
+        except Exception:
+            pass
+
+    async with SCHEDULER.slot(owner, PRIORITY_INTERACTIVE, ticket=ticket):
+        if queued_msg:
+            try:
+                await queued_msg.delete()
+            except Exception:
+                pass
+        try:
+            _, source_msg_id = getChatMsgID(post_url.split("?", 1)[0])
+        except Exception:
+            source_msg_id = None
+        with log_context(user=owner, request=message.id, msg_id=source_msg_id, url=post_url):
+            await handle_download(bot, message, post_url)
+
+
+async def _run_batch(job: BatchJob, message: Message, loading_msg: Message, resumed: bool = False):
+    """Drive a batch job through the worker pool until done, paused or cancelled."""
+    prefetcher = MessagePrefetcher(
+        user, job.candidates, job.next_id, job.end_id,
+        chunk=PREFETCH_CHUNK, window=PREFETCH_WINDOW, pacer=PACER, sessions=SESSIONS,
+    )
+
+    async def _process(msg_id, wait_turn):
+        prefetched = await prefetcher.get(msg_id)
+        async with SCHEDULER.slot(job.initiator_id or job.chat_id, PRIORITY_BATCH) as ticket:
+            # The slot is handed back while an item waits for earlier IDs to be delivered
+            with log_context(job=job.name, msg_id=msg_id, user=job.initiator_id):
+                return await handle_download_status(
+                    bot, message, f"{job.prefix}/{msg_id}",
+                    wait_turn=lambda: SCHEDULER.yield_while(ticket, wait_turn()),
+                    prefetched=prefetched,
+                    status_message=loading_msg,
+                    turn_ready=wait_turn.ready,
+                )
+
+    def _commit(msg_id, status):
+        METRICS.result("batch", status)
+        if status == "downloaded":
+            job.downloaded += 1
+        elif status == "skipped":
+            job.skipped += 1
+        else:
+            job.failed += 1
+        job.next_id = msg_id + 1
+        job.updated_at = time()
+        _checkpoint_job(job)
+        PROGRESS.set_title(
+            loading_msg,
+            f"📥 **Batch `{job.name}`** – {job.next_id - job.start_id}/{job.end_id - job.start_id + 1}\n"
+            f"Downloaded: `{job.downloaded}` | Skipped: `{job.skipped}` | Failed: `{job.failed}`",
+        )
+
+    try:
+        try:
+            await run_batch_pool(
+                job.next_id,
+                job.end_id,
+                _process,
+                _commit,
+                lambda: job.paused or job.released or CANCEL_EVENT.is_set(),
+                workers=BATCH_WORKERS,
+            )
+        except asyncio.CancelledError:
+            pass
+
+        job.active = False
+        await drop_progress(loading_msg)
+
+        if job.released:
+            # The new owner checkpoints the job from here on
+            LOGGER(__name__).info(f"Batch {job.name} was taken over by another worker at {job.next_id}")
+            return
+
+        if SHUTDOWN_EVENT.is_set() and not job.paused and job.next_id <= job.end_id:
+            # Leave the job 'active' in the store so it resumes on the next start
+            await _save_job(job)
+            LOGGER(__name__).info(f"Batch {job.name} interrupted by shutdown at {job.next_id}")
+            return
+
+        if job.paused:
+            await _save_job(job)
+            PAUSED_JOBS[job.name] = job
+            if resumed:
+                await message.reply(
+                    f"**⏸️ Re-paused `{job.name}`** at `{job.next_id}`. Resume with `/continue {job.name}`"
+                )
+            else:
+                await message.reply(
+                    "**⏸️ Batch Paused**\n"
+                    f"Name: `{job.name}`\n"
+                    f"Next ID: `{job.next_id}` of `{job.end_id}`\n"
+                    f"Downloaded: `{job.downloaded}` | Skipped: `{job.skipped}` | Failed: `{job.failed}`\n"
+                    f"Resume with `/continue {job.name}`"
+                )
+        else:
+            await _forget_job(job)
+            summary = (
+                "**✅ Batch Process Complete!**\n"
+                "━━━━━━━━━━━━━━━━━━━\n"
+                f"📥 **Downloaded** : `{job.downloaded}` post(s)\n"
+                f"⏭️ **Skipped**    : `{job.skipped}` (no content)\n"
+                f"❌ **Failed**     : `{job.failed}` error(s)"
+            )
+            await message.reply(summary)
+    finally:
+        prefetcher.close()
+        if job in ACTIVE_BATCH_JOBS:
+            ACTIVE_BATCH_JOBS.remove(job)
 
 
 @bot.on_message(filters.command("bdl") & (filters.private | filters.group))
@@ -560,23 +987,35 @@ async def download_range(bot: Client, message: Message):
         return await message.reply("**❌ Both links must be from the same channel (no overlap after normalization).**")
     # Use first overlapping as primary; keep entire candidate list for fallback fetches
     primary_candidates = overlap + [c for c in start_candidates if c not in overlap]
+    if PEER_CACHE is not None:
+        primary_candidates = PEER_CACHE.order(primary_candidates)
     if start_id > end_id:
         return await message.reply("**❌ Invalid range: start ID cannot exceed end ID.**")
 
-    # Preload chat (best effort) using first candidate
-    try:
-        await user.get_chat(primary_candidates[0])
-    except Exception:
-        pass
+    # Preload chat (best effort) using first candidate; the coordinator has no user session
+    if MODE != "coordinator":
+        try:
+            await SESSIONS.pick(primary_candidates).client.get_chat(primary_candidates[0])
+        except Exception:
+            pass
 
     prefix = args[1].rsplit("/", 1)[0]
-    global ACTIVE_BATCH_JOB
-    if ACTIVE_BATCH_JOB and ACTIVE_BATCH_JOB.active:
-        return await message.reply("**❌ A batch is already running. Pause or wait until it finishes.**")
+    if MODE == "coordinator" and JOB_STORE is None:
+        return await message.reply("**❌ Batch downloads need the job store, which is unavailable.**")
+    running_batches = await _running_batches()
+    if running_batches >= MAX_ACTIVE_BATCHES:
+        return await message.reply(
+            f"**❌ {running_batches} batches are already running. Try again when one finishes.**"
+        )
 
     # Create and start job
     job_name = f"batch_{int(time())}"
-    ACTIVE_BATCH_JOB = BatchJob(
+    taken = await _job_names()
+    suffix = 1
+    while job_name in taken:
+        suffix += 1
+        job_name = f"batch_{int(time())}_{suffix}"
+    job = BatchJob(
         name=job_name,
         start_id=start_id,
         end_id=end_id,
@@ -586,99 +1025,196 @@ async def download_range(bot: Client, message: Message):
         start_url=args[1],
         end_url=args[2],
         initiator_id=message.from_user.id if message.from_user else 0,
+        origin_msg_id=message.id,
     )
+    if MODE == "coordinator":
+        # A worker claims the job and runs it from its JOB_STORE checkpoint
+        await _save_job(job)
+        await asyncio.to_thread(WORK_QUEUE.enqueue, "batch", {"job_id": job.job_id}, job.initiator_id)
+        return await message.reply(f"**🚀 Batch `{job_name}` queued.** Use `/pause [name]` to pause.")
+    ACTIVE_BATCH_JOBS.append(job)
+    await _save_job(job)
     loading = await message.reply(f"📥 **Downloading posts {start_id}–{end_id}… (job: {job_name})**")
 
-    async def _run_batch(job: BatchJob, loading_msg: Message):
-        try:
-            while job.next_id <= job.end_id and not job.paused and not CANCEL_EVENT.is_set():
-                msg_id = job.next_id
-                url = f"{job.prefix}/{msg_id}"
-                try:
-                    status = await handle_download_status(bot, message, url)
-                    if status == "downloaded":
-                        job.downloaded += 1
-                    elif status == "skipped":
-                        job.skipped += 1
-                    else:
-                        job.failed += 1
-                except asyncio.CancelledError:
-                    break
-                except Exception as e:
-                    job.failed += 1
-                    LOGGER(__name__).error(f"Unhandled error at {url}: {e}")
-                finally:
-                    job.next_id += 1
-                    job.updated_at = time()
-                await asyncio.sleep(3)
-
-            await loading_msg.delete()
-
-            if job.paused:
-                job.active = False
-                PAUSED_JOBS[job.name] = job
-                await message.reply(
-                    "**⏸️ Batch Paused**\n"
-                    f"Name: `{job.name}`\n"
-                    f"Next ID: `{job.next_id}` of `{job.end_id}`\n"
-                    f"Downloaded: `{job.downloaded}` | Skipped: `{job.skipped}` | Failed: `{job.failed}`\n"
-                    f"Resume with `/continue {job.name}`"
-                )
-            else:
-                summary = (
-                    "**✅ Batch Process Complete!**\n"
-                    "━━━━━━━━━━━━━━━━━━━\n"
-                    f"📥 **Downloaded** : `{job.downloaded}` post(s)\n"
-                    f"⏭️ **Skipped**    : `{job.skipped}` (no content)\n"
-                    f"❌ **Failed**     : `{job.failed}` error(s)"
-                )
-                await message.reply(summary)
-        finally:
-            # Clear active job if finished or paused
-            if ACTIVE_BATCH_JOB is job:
-                ACTIVE_BATCH_JOB = None
+    track_task(_run_batch(job, message, loading))
+    queue = SCHEDULER.snapshot()
+    busy = (
+        f"\n⏳ All {queue['slots']} transfer slots are busy ({queue['queued']} waiting); "
+        "posts start as slots free up."
+        if queue["running"] >= queue["slots"] else ""
+    )
+    await message.reply(f"**🚀 Batch started.** Use `/pause [name]` to pause.{busy}")
+
+
+async def _job_names():
+    if MODE == "coordinator":
+        if JOB_STORE is None:
+            return set()
+        return {record["name"] for record in await asyncio.to_thread(JOB_STORE.load)}
+    return {job.name for job in ACTIVE_BATCH_JOBS} | set(PAUSED_JOBS)
 
-    track_task(_run_batch(ACTIVE_BATCH_JOB, loading))
-    await message.reply(f"**🚀 Batch started.** Use `/pause [name]` to pause.")
+
+async def _running_batches():
+    if MODE == "coordinator":
+        return len(await asyncio.to_thread(WORK_QUEUE.open_items, "batch"))
+    return len(ACTIVE_BATCH_JOBS)
+
+
+async def _queued_batch_jobs():
+    """Coordinator mode: ``{work item id: BatchJob}`` for batches queued or running on a worker."""
+    if JOB_STORE is None:
+        return {}
+    open_items = await asyncio.to_thread(WORK_QUEUE.open_items, "batch")
+    items = {payload["job_id"]: item_id for item_id, payload, _, _ in open_items}
+    return {
+        items[record["job_id"]]: BatchJob.from_record(record)
+        for record in await asyncio.to_thread(JOB_STORE.load)
+        if record["job_id"] in items and record["state"] == "active"
+    }
+
+
+async def _requeue_stored_jobs():
+    """Coordinator mode: queue stored active jobs no worker holds, e.g. after a full restart."""
+    if JOB_STORE is None:
+        return
+    open_items = await asyncio.to_thread(WORK_QUEUE.open_items, "batch")
+    held = {payload["job_id"] for _, payload, _, _ in open_items}
+    for record in await asyncio.to_thread(JOB_STORE.load):
+        if record["state"] == "active" and record["job_id"] not in held:
+            LOGGER(__name__).info(f"Queueing interrupted batch {record['name']} at {record['next_id']}")
+            await asyncio.to_thread(WORK_QUEUE.enqueue, "batch", {"job_id": record["job_id"]}, record["initiator_id"])
+    await _sync_paused_jobs()
+
+
+async def _sync_paused_jobs():
+    """Coordinator mode: paused jobs are written to JOB_STORE by workers; reload them."""
+    if JOB_STORE is None:
+        return
+    records = await asyncio.to_thread(JOB_STORE.load)
+    PAUSED_JOBS.clear()
+    for record in records:
+        if record["state"] == "paused":
+            job = BatchJob.from_record(record)
+            PAUSED_JOBS[job.name] = job
 
 
 @bot.on_message(filters.command("pause") & (filters.private | filters.group))
 async def pause_batch(_, message: Message):
-    global ACTIVE_BATCH_JOB, _pause_name_counter
-    if not ACTIVE_BATCH_JOB or not ACTIVE_BATCH_JOB.active:
+    global _pause_name_counter
+    queued = await _queued_batch_jobs() if MODE == "coordinator" else {}
+    if MODE == "coordinator":
+        running = list(queued.values())
+    else:
+        running = [job for job in ACTIVE_BATCH_JOBS if job.active and not job.paused]
+    if not running:
         return await message.reply("**No active batch to pause.**")
-    # Only initiator (or chat admins?) For simplicity - allow initiator or same chat
-    if message.from_user and ACTIVE_BATCH_JOB.initiator_id and message.from_user.id != ACTIVE_BATCH_JOB.initiator_id:
-        return await message.reply("**Only the user who started the batch can pause it.**")
+    # Only the initiator can pause their batch
+    if message.from_user:
+        running = [job for job in running if not job.initiator_id or job.initiator_id == message.from_user.id]
+        if not running:
+            return await message.reply("**Only the user who started the batch can pause it.**")
 
     parts = message.text.split(maxsplit=1)
-    if len(parts) == 2:
-        desired_name = parts[1].strip()
+    requested = parts[1].strip() if len(parts) == 2 else None
+    named = [job for job in running if job.name == requested]
+    job = named[0] if named else max(running, key=lambda j: j.created_at)
+    if requested:
+        desired_name = requested
     else:
         _pause_name_counter += 1
+        taken = await _job_names()
+        while f"pause{_pause_name_counter}" in taken:
+            _pause_name_counter += 1
         desired_name = f"pause{_pause_name_counter}"
-    if desired_name in PAUSED_JOBS:
-        return await message.reply("**Name already used for a paused batch. Choose another.**")
+    if not named and desired_name in await _job_names():
+        return await message.reply("**Name already used for another batch. Choose another.**")
 
-    # Flag pause; loop will persist state after current item
-    ACTIVE_BATCH_JOB.paused = True
-    ACTIVE_BATCH_JOB.name = desired_name
+    # Flag pause; the pool stops dispatching and persists state once in-flight items finish
+    if MODE == "coordinator":
+        item_id = next(item_id for item_id, queued_job in queued.items() if queued_job is job)
+        await asyncio.to_thread(WORK_QUEUE.request, item_id, f"pause:{desired_name}")
+    else:
+        job.paused = True
+        job.name = desired_name
     await message.reply(f"**Pausing batch...** Will store as `{desired_name}` shortly.")
 
 
+def _paused_jobs_text():
+    if not PAUSED_JOBS:
+        return "**No paused batches available.**"
+    lines = ["**⏸️ Paused batches** (`/continue name` to resume)"]
+    for job in sorted(PAUSED_JOBS.values(), key=lambda j: j.updated_at, reverse=True):
+        snap = job.snapshot()
+        lines.append(
+            f"• `{job.name}` – {snap['range']}, next `{job.next_id}` ({snap['progress']})"
+            f"{' – restored after restart' if job.restored else ''}"
+        )
+    return "\n".join(lines)
+
+
+async def resume_stored_jobs():
+    """Reload jobs from JOB_STORE: paused ones become resumable, active ones restart."""
+    if JOB_STORE is None:
+        return
+    records = await asyncio.to_thread(JOB_STORE.load)
+    active = []
+    for record in records:
+        job = BatchJob.from_record(record)
+        if job.next_id > job.end_id:
+            await _forget_job(job)
+        elif job.paused:
+            PAUSED_JOBS[job.name] = job
+        else:
+            active.append(job)
+    # Interrupted jobs beyond the concurrency limit are kept as paused
+    overflow = active[:-MAX_ACTIVE_BATCHES] if len(active) > MAX_ACTIVE_BATCHES else []
+    for job in overflow:
+        await _park_job(job)
+    if PAUSED_JOBS:
+        LOGGER(__name__).info(f"Restored {len(PAUSED_JOBS)} paused batch job(s)")
+
+    for job in active[len(overflow):]:
+        try:
+            message = await bot.get_messages(job.chat_id, job.origin_msg_id)
+            if message is None or message.empty:
+                raise ValueError("origin message is gone")
+            remaining = job.end_id - job.next_id + 1
+            loading = await message.reply(
+                f"▶️ **Resuming `{job.name}` after restart** at `{job.next_id}` (remaining {remaining})"
+            )
+        except Exception as e:
+            LOGGER(__name__).error(f"Cannot auto-resume batch {job.name}, keeping it paused: {e}")
+            await _park_job(job)
+            continue
+        ACTIVE_BATCH_JOBS.append(job)
+        LOGGER(__name__).info(f"Auto-resuming batch {job.name} at {job.next_id}")
+        track_task(_run_batch(job, message, loading, resumed=True))
+
+
+async def _park_job(job: BatchJob):
+    job.paused = True
+    job.active = False
+    PAUSED_JOBS[job.name] = job
+    await _save_job(job)
+
+
 @bot.on_message(filters.command("continue") & (filters.private | filters.group))
 async def continue_batch(_, message: Message):
-    global ACTIVE_BATCH_JOB
-    if ACTIVE_BATCH_JOB and ACTIVE_BATCH_JOB.active:
-        return await message.reply("**A batch is already running. Pause or wait until it finishes.**")
-
     parts = message.text.split(maxsplit=1)
+    if MODE == "coordinator":
+        await _sync_paused_jobs()
+    if len(parts) == 2 and parts[1].strip() == "list":
+        return await message.reply(_paused_jobs_text())
+    running_batches = await _running_batches()
+    if running_batches >= MAX_ACTIVE_BATCHES:
+        return await message.reply(
+            f"**{running_batches} batches are already running. Pause one or wait until it finishes.**"
+        )
     if len(parts) == 2:
         name = parts[1].strip()
         job = PAUSED_JOBS.get(name)
         if not job:
-            available = ", ".join(PAUSED_JOBS.keys()) or "(none)"
-            return await message.reply(f"**Unknown paused name. Available:** {available}")
+            return await message.reply(f"**Unknown paused name.**\n\n{_paused_jobs_text()}")
     else:
         # Pick most recently updated paused job
         if not PAUSED_JOBS:
@@ -693,58 +1229,25 @@ async def continue_batch(_, message: Message):
     PAUSED_JOBS.pop(job.name, None)
     job.paused = False
     job.active = True
-    ACTIVE_BATCH_JOB = job
+    if MODE == "coordinator":
+        await _save_job(job)
+        await asyncio.to_thread(WORK_QUEUE.enqueue, "batch", {"job_id": job.job_id}, job.initiator_id)
+        return await message.reply(f"**Resumed `{name}`.** A worker picks it up shortly; use `/pause` again to pause.")
+    ACTIVE_BATCH_JOBS.append(job)
+    await _save_job(job)
     remaining = job.end_id - job.next_id + 1
     loading = await message.reply(f"▶️ **Resuming `{name}`** at `{job.next_id}` (remaining {remaining})")
 
-    async def _resume(job: BatchJob, loading_msg: Message):
-        try:
-            while job.next_id <= job.end_id and not job.paused and not CANCEL_EVENT.is_set():
-                msg_id = job.next_id
-                url = f"{job.prefix}/{msg_id}"
-                try:
-                    status = await handle_download_status(bot, message, url)
-                    if status == "downloaded":
-                        job.downloaded += 1
-                    elif status == "skipped":
-                        job.skipped += 1
-                    else:
-                        job.failed += 1
-                except asyncio.CancelledError:
-                    break
-                except Exception as e:
-                    job.failed += 1
-                    LOGGER(__name__).error(f"Unhandled error at {url}: {e}")
-                finally:
-                    job.next_id += 1
-                    job.updated_at = time()
-                await asyncio.sleep(3)
-
-            await loading_msg.delete()
-            if job.paused:
-                PAUSED_JOBS[job.name] = job
-                await message.reply(
-                    f"**⏸️ Re-paused `{job.name}`** at `{job.next_id}`. Resume with `/continue {job.name}`"
-                )
-            else:
-                summary = (
-                    "**✅ Batch Process Complete!**\n"
-                    "━━━━━━━━━━━━━━━━━━━\n"
-                    f"📥 **Downloaded** : `{job.downloaded}` post(s)\n"
-                    f"⏭️ **Skipped**    : `{job.skipped}` (no content)\n"
-                    f"❌ **Failed**     : `{job.failed}` error(s)"
-                )
-                await message.reply(summary)
-        finally:
-            if ACTIVE_BATCH_JOB is job:
-                ACTIVE_BATCH_JOB = None
-
-    track_task(_resume(job, loading))
+    track_task(_run_batch(job, message, loading, resumed=True))
     await message.reply(f"**Resumed `{name}`.** Use `/pause` again to pause.")
 
 
 @bot.on_message(filters.command("stats") & (filters.private | filters.group))
 async def stats(_, message: Message):
+    # Only needed here; imported lazily to keep startup fast
+    import shutil
+    import psutil
+
     currentTime = get_readable_time(time() - PyroConf.BOT_START_TIME)
     total, used, free = shutil.disk_usage(".")
     total = get_readable_file_size(total)
@@ -756,6 +1259,33 @@ async def stats(_, message: Message):
     memory = psutil.virtual_memory().percent
     disk = psutil.disk_usage("/").percent
     process = psutil.Process(os.getpid())
+    ffmpeg = FFMPEG_POOL.snapshot()
+    queue = SCHEDULER.snapshot()
+    pacer = PACER.snapshot()
+    storage = STORAGE.snapshot()
+    storage_used = await asyncio.to_thread(STORAGE.used)
+    flood_block = f" | blocked `{int(pacer['blocked_for'])}s`" if pacer["blocked_for"] else ""
+    pools = ""
+    if len(SESSIONS.sessions) > 1:
+        pools = "**➜ Sessions:**\n" + "".join(
+            f"   `{s['name']}` – `{s['active']}` active | `{s['waiting']}` waiting | `{s['rate']:.2f}/s` | "
+            f"`{s['requests']}` requests"
+            + (f" | FloodWait `{int(s['blocked_for'])}s`" if s["blocked_for"] else "")
+            + "\n"
+            for s in SESSIONS.snapshot()
+        )
+    if WORK_QUEUE is not None:
+        work = await asyncio.to_thread(WORK_QUEUE.snapshot)
+        pools += (
+            f"**➜ Work Queue:** `{work['queued']}` queued | `{work['leased']}` running | "
+            f"`{len(work['workers'])}` worker(s)"
+            + "".join(f"\n   `{w['worker']}` – `{w['running']}` item(s)" for w in work["workers"])
+            + "\n"
+        )
+    if UPLOADERS.enabled:
+        pools += "**➜ Upload Bots:** " + " | ".join(
+            f"`{u['name']}` `{u['active']}` active, `{u['uploads']}` done" for u in UPLOADERS.snapshot()
+        ) + "\n"
 
     stats = (
         "**≧◉◡◉≦ Bot is Up and Running successfully.**\n\n"
@@ -763,7 +1293,21 @@ async def stats(_, message: Message):
         f"**➜ Total Disk Space:** `{total}`\n"
         f"**➜ Used:** `{used}`\n"
         f"**➜ Free:** `{free}`\n"
-        f"**➜ Memory Usage:** `{round(process.memory_info()[0] / 1024**2)} MiB`\n\n"
+        f"**➜ Downloads:** `{get_readable_file_size(storage_used)}` used | "
+        f"`{get_readable_file_size(storage['reserved'])}` reserved of "
+        f"`{get_readable_file_size(storage['budget'])}` | `{storage['waiting']}` waiting\n"
+        f"**➜ Memory Usage:** `{round(process.memory_info()[0] / 1024**2)} MiB`\n"
+        f"**➜ File Cache:** `{len(FILE_CACHE) if FILE_CACHE else 0}` files | "
+        f"`{FILE_CACHE.hits if FILE_CACHE else 0}` hits\n"
+        f"**➜ FFmpeg Pool:** `{ffmpeg['running']}/{ffmpeg['workers']}` running | "
+        f"`{ffmpeg['queued']}` queued | avg wait `{ffmpeg['avg_wait']:.2f}s` | "
+        f"avg run `{ffmpeg['avg_run']:.2f}s`\n"
+        f"**➜ Queue:** `{queue['running']}/{queue['slots']}` running | "
+        f"`{queue['interactive']}` interactive + `{queue['batch']}` batch waiting | "
+        f"`{await _running_batches()}` batch job(s)\n"
+        f"**➜ User Requests:** `{pacer['rate']:.2f}/s` | `{pacer['waiting']}` waiting | "
+        f"`{pacer['flood_waits']}` FloodWait(s){flood_block}\n"
+        f"{pools}\n"
         f"**➜ Upload:** `{sent}`\n"
         f"**➜ Download:** `{recv}`\n\n"
         f"**➜ CPU:** `{cpuUsage}%` | "
@@ -773,16 +1317,138 @@ async def stats(_, message: Message):
     await message.reply(stats)
 
 
+METRICS_STAGE_ORDER = [
+    "queue_interactive", "queue_batch", "fetch", "prefetch", "floodwait", "cached_send", "copy",
+    "download", "metadata", "ffprobe", "thumbnail", "upload", "relay", "stream", "album", "request", "batch_item",
+]
+
+
+@bot.on_message(filters.command("metrics") & (filters.private | filters.group))
+async def metrics(_, message: Message):
+    summary = METRICS.summary()
+    stages = summary["stages"]
+    ordered = [s for s in METRICS_STAGE_ORDER if s in stages] + sorted(set(stages) - set(METRICS_STAGE_ORDER))
+
+    lines = [f"**📊 Pipeline Metrics** (last `{get_readable_time(summary['uptime'])}`)\n"]
+    if ordered:
+        lines.append("**Stage** – count | avg | p50 | p95 | total")
+        for stage in ordered:
+            s = stages[stage]
+            lines.append(
+                f"`{stage}` – {s['count']} | {s['avg']:.2f}s | {s['p50']:.2f}s | "
+                f"{s['p95']:.2f}s | {get_readable_time(s['total'])}"
+            )
+    else:
+        lines.append("No downloads yet.")
+    if summary["bytes"]:
+        lines.append("\n**Transferred:** " + " | ".join(
+            f"{direction} `{get_readable_file_size(size)}` (`{get_readable_file_size(summary['rates'][direction])}/s`)"
+            for direction, size in sorted(summary["bytes"].items())
+        ))
+    if summary["results"]:
+        lines.append("**Batch items:** " + " | ".join(
+            f"{outcome} `{count}`" for (_, outcome), count in sorted(summary["results"].items())
+        ))
+    if summary["errors"]:
+        lines.append("**Errors:** " + " | ".join(
+            f"{stage}/{error_type} `{count}`" for (stage, error_type), count in summary["errors"][:8]
+        ))
+    queue = SCHEDULER.snapshot()
+    lines.append(
+        f"**Queues:** slots `{queue['running']}/{queue['slots']}` | waiting `{queue['interactive']}` + "
+        f"`{queue['batch']}` | user requests `{PACER.waiting}` | disk `{STORAGE.waiting}` | "
+        f"ffmpeg `{FFMPEG_POOL.queued}`"
+    )
+    lines.append(
+        f"\nPrometheus: `http://{METRICS_HOST}:{METRICS_PORT}/metrics`" if METRICS_PORT
+        else "\nPrometheus endpoint is off (set `METRICS_PORT`)."
+    )
+    await message.reply("\n".join(lines))
+
+
+@bot.on_message(filters.command("profile") & (filters.private | filters.group))
+async def profile(_, message: Message):
+    if not message.from_user or message.from_user.id not in PyroConf.ADMIN_IDS:
+        return await message.reply("**This command is only available to the bot admins (`ADMIN_IDS`).**")
+    try:
+        seconds = int(message.command[1]) if len(message.command) > 1 else 30
+    except ValueError:
+        return await message.reply(f"**Usage:** `/profile [seconds]` (1-{PROFILE_MAX_SECONDS}, default 30)")
+    if PROFILER.running:
+        return await message.reply("**A profile is already running.**")
+
+    status = await message.reply(f"**🔬 Profiling the event loop for {min(max(1, seconds), PROFILE_MAX_SECONDS)}s...**")
+    result = await PROFILER.run(seconds)
+
+    top_self = "\n".join(f"`{count:>5}  {frame}`" for frame, count in result.top_self(6)) or "—"
+    top_waiting = "\n".join(f"`{count:>5}  {frame}`" for frame, count in result.top_waiting(6)) or "—"
+    summary = (
+        f"**🔬 Profile ({int(result.seconds)}s)**\n"
+        f"Loop busy: `{result.busy_ratio():.0%}` of `{result.loop_samples}` samples\n\n"
+        f"**Top on-loop functions (self):**\n{top_self}\n\n"
+        f"**Most-awaited bot functions (task samples):**\n{top_waiting}"
+    )
+    paths = []
+    try:
+        for kind, stacks in (("loop", result.loop), ("tasks", result.tasks)):
+            path = get_download_path(f"profile_{message.id}", f"profile-{kind}.collapsed.txt")
+            with open(path, "w") as f:
+                f.write(result.collapsed(stacks))
+            paths.append(path)
+        await status.delete()
+        await message.reply(summary[:4000])
+        await message.reply_document(
+            paths[0], caption="**Event-loop thread stacks** (collapsed; render with flamegraph.pl or speedscope)"
+        )
+        await message.reply_document(paths[1], caption="**Pending task await stacks** (collapsed)")
+    finally:
+        for path in paths:
+            cleanup_download(path)
+
+
 @bot.on_message(filters.command("logs") & (filters.private | filters.group))
 async def logs(_, message: Message):
-    if os.path.exists("logs.txt"):
-        await message.reply_document(document="logs.txt", caption="**Logs**")
+    if not log_files():
+        return await message.reply("**Not exists**")
+    try:
+        query = parse_log_query(message.command[1:])
+    except ValueError as e:
+        return await message.reply(
+            f"**Invalid option:** {e}\n\n"
+            "**Usage:** `/logs [tail N] [level warning] [job NAME] [msg ID] [grep TEXT]`\n"
+            "Without options, all rotated logs are sent as one gzip file."
+        )
+
+    # Files can be tens of MB; read, write and compress off the event loop
+    if query:
+        path = get_download_path(f"logs_{message.id}", "logs-filtered.jsonl")
+        count = await asyncio.to_thread(write_logs, query, path)
+        if not count:
+            cleanup_download(path)
+            return await message.reply("**No matching log lines.**")
+        caption = f"**Logs** – `{count}` matching line(s)"
     else:
-        await message.reply("**Not exists**")
+        path = await asyncio.to_thread(gzip_logs, get_download_path(f"logs_{message.id}", "logs.jsonl.gz"))
+        caption = f"**Logs** – `{len(log_files())}` file(s), JSON lines, gzip"
+    try:
+        await message.reply_document(document=path, caption=caption)
+    finally:
+        cleanup_download(path)
 
 
 @bot.on_message(filters.command("killall") & (filters.private | filters.group))
 async def cancel_all_tasks(_, message: Message):
+    if MODE == "coordinator":
+        # Batches no worker has claimed yet are dropped here; running ones are dropped by their worker
+        items = await asyncio.to_thread(WORK_QUEUE.open_items, "batch")
+        waiting = [payload["job_id"] for _, payload, state, _ in items if state == "queued"]
+        cancelled = await asyncio.to_thread(WORK_QUEUE.cancel_all)
+        if JOB_STORE is not None:
+            for job_id in waiting:
+                await asyncio.to_thread(JOB_STORE.delete, job_id)
+        if not cancelled:
+            return await message.reply("**No active tasks.**")
+        return await message.reply(f"**⛔ Cancellation requested for {cancelled} queued or running task(s).**")
     if not RUNNING_TASKS and not CANCEL_EVENT.is_set():
         return await message.reply("**No active tasks.**")
     cancel_all_running()
@@ -800,25 +1466,168 @@ async def cancel_all_tasks(_, message: Message):
 )
 async def handle_any_message(bot: Client, message: Message):
     if message.text and not message.text.startswith("/"):
-        await track_task(handle_download(bot, message, message.text))
+        await _dispatch_download(bot, message, message.text)
+
+
+async def _run_work_item(item, jobs, held):
+    """Worker mode: run one claimed queue item to completion."""
+    payload = item["payload"]
+    if item["kind"] == "download":
+        message = await bot.get_messages(payload["chat_id"], payload["message_id"])
+        if message is None or message.empty:
+            raise ValueError("request message is gone")
+        await _queued_download(bot, message, payload["post_url"])
+        return
+
+    record = await asyncio.to_thread(JOB_STORE.get, payload["job_id"]) if JOB_STORE is not None else None
+    if record is None:
+        return  # finished or cancelled meanwhile
+    job = BatchJob.from_record(record)
+    if job.paused or job.next_id > job.end_id:
+        return
+    jobs[item["id"]] = job
+    if item["id"] in held:
+        job.paused = True
+        job.name = held.pop(item["id"])
+    message = await bot.get_messages(job.chat_id, job.origin_msg_id)
+    if message is None or message.empty:
+        raise ValueError("origin message is gone")
+    resumed = job.next_id > job.start_id
+    if resumed:
+        remaining = job.end_id - job.next_id + 1
+        loading = await message.reply(f"▶️ **Resuming `{job.name}`** at `{job.next_id}` (remaining {remaining})")
+    else:
+        loading = await message.reply(f"📥 **Downloading posts {job.start_id}–{job.end_id}… (job: {job.name})**")
+    ACTIVE_BATCH_JOBS.append(job)
+    LOGGER(__name__).info(f"Worker {WORKER_ID} running batch {job.name} at {job.next_id}")
+    await _run_batch(job, message, loading, resumed=resumed)
+
+
+async def run_worker():
+    """Worker mode: claim downloads and batches from the work queue until shutdown.
+
+    Each claimed item is leased to this worker; a heartbeat renews the
+    leases and carries the coordinator's pause and cancel requests. On a
+    clean shutdown unfinished items go back to the queue, and a batch
+    resumes on another worker from its last JOB_STORE checkpoint.
+    """
+    started_at = time()
+    running = {}  # work item id -> asyncio.Task
+    batches = set()  # ids of running batch items
+    jobs = {}  # work item id -> BatchJob
+    held = {}  # work item id -> pause name requested before its job was loaded
+
+    async def _work(item):
+        state = "done"
+        try:
+            with log_context(work=item["id"]):
+                await _run_work_item(item, jobs, held)
+        except asyncio.CancelledError:
+            state = "cancelled"
+        except Exception as e:
+            LOGGER(__name__).error(f"Work item {item['id']} ({item['kind']}) failed: {e}")
+            state = "failed"
+        finally:
+            running.pop(item["id"], None)
+            batches.discard(item["id"])
+            jobs.pop(item["id"], None)
+            held.pop(item["id"], None)
+            # On shutdown the item stays leased until leave() hands it back
+            if not SHUTDOWN_EVENT.is_set():
+                await asyncio.to_thread(WORK_QUEUE.finish, item["id"], WORKER_ID, state)
+
+    async def _heartbeat():
+        while True:
+            try:
+                actions = await asyncio.to_thread(WORK_QUEUE.heartbeat, WORKER_ID, list(running), started_at)
+            except Exception as e:
+                LOGGER(__name__).error(f"Work queue heartbeat failed: {e}")
+                actions = {}
+            for item_id, action in actions.items():
+                job = jobs.get(item_id)
+                if action.startswith("pause:"):
+                    if job is not None:
+                        job.paused = True
+                        job.name = action.split(":", 1)[1]
+                    else:
+                        held[item_id] = action.split(":", 1)[1]
+                elif action == "lost" and job is not None:
+                    job.released = True
+                elif item_id in running:
+                    LOGGER(__name__).info(f"Work item {item_id}: {action}, stopping it")
+                    running[item_id].cancel()
+            await asyncio.sleep(WORK_HEARTBEAT)
+
+    heartbeat = asyncio.create_task(_heartbeat())
+    try:
+        while not SHUTDOWN_EVENT.is_set():
+            if len(running) >= WORKER_ITEMS:
+                await asyncio.wait(list(running.values()), return_when=asyncio.FIRST_COMPLETED)
+                continue
+            kinds = ("download", "batch") if len(batches) < MAX_ACTIVE_BATCHES else ("download",)
+            item = await asyncio.to_thread(WORK_QUEUE.claim, WORKER_ID, kinds)
+            if item is None:
+                await asyncio.sleep(WORK_POLL_INTERVAL)
+                continue
+            LOGGER(__name__).info(f"Claimed work item {item['id']} ({item['kind']}, attempt {item['attempts']})")
+            if item["kind"] == "batch":
+                batches.add(item["id"])
+            running[item["id"]] = track_task(_work(item))
+    finally:
+        heartbeat.cancel()
 
 
 if __name__ == "__main__":
     async def _main():
+        # Per-phase boot durations; concurrent phases overlap
+        boot_phases = [("imports", time() - PyroConf.BOT_START_TIME)]
+        boot_start = time()
+
+        async def _timed(name, coro):
+            started = time()
+            try:
+                return await coro
+            finally:
+                boot_phases.append((name, time() - started))
+
+        async def _register_commands():
+            if MODE == "worker":
+                return  # commands belong to the coordinator
+            # Webhooks are Bot API only; running via MTProto means no webhook is ever set,
+            # so there is nothing to clear before registering commands.
+            try:
+                await bot.set_bot_commands([BotCommand(c, d[:256]) for c, d in BOT_COMMANDS])
+                LOGGER(__name__).info("Bot commands registered")
+            except Exception as e:
+                LOGGER(__name__).error(f"Failed to register commands: {e}")
+
+        async def _restore_peers():
+            if PEER_CACHE is not None:
+                await asyncio.gather(*(PEER_CACHE.restore(s.client, s.scope) for s in SESSIONS.sessions))
+
         LOGGER(__name__).info("Starting clients...")
-        await user.start()
-        LOGGER(__name__).info("User client started (is_connected=%s)", getattr(user, 'is_connected', False))
-        await bot.start()
-        LOGGER(__name__).info("Bot client started (is_connected=%s)", getattr(bot, 'is_connected', False))
-        # Webhooks are Bot API only; running via MTProto means no webhook is ever set.
-        # Previous attempt to call delete_webhook produced an AttributeError on Pyrofork Client.
-        # We skip it explicitly to avoid noisy logs.
-        LOGGER(__name__).info("Skipping webhook clear (MTProto session; no webhook applicable)")
-        try:
-            await bot.set_bot_commands([BotCommand(c, d[:256]) for c, d in BOT_COMMANDS])
-            LOGGER(__name__).info("Bot commands registered")
-        except Exception as e:
-            LOGGER(__name__).error(f"Failed to register commands: {e}")
+        await asyncio.gather(_timed("user clients", SESSIONS.start()), _timed("bot clients", UPLOADERS.start()))
+        LOGGER(__name__).info(
+            "Clients started (user=%s, bot=%s, user sessions=%d, helper bots=%d)",
+            getattr(user, 'is_connected', False), getattr(bot, 'is_connected', False), len(SESSIONS.sessions),
+            len(UPLOADERS.uploaders) - 1,
+        )
+        _, _, metrics_server = await asyncio.gather(
+            _timed("peer restore", _restore_peers()),
+            _timed("bot commands", _register_commands()),
+            _timed("metrics endpoint", METRICS.serve()),
+        )
+        if MODE == "standalone":
+            await _timed("job resume", resume_stored_jobs())
+        elif MODE == "coordinator":
+            await _requeue_stored_jobs()
+        worker_task = asyncio.create_task(run_worker()) if MODE == "worker" else None
+        LOGGER(__name__).info(f"Running as {MODE}" + (f" ({WORKER_ID})" if MODE == "worker" else ""))
+        LOGGER(__name__).info(
+            "Startup took %.2fs (%s)",
+            boot_phases[0][1] + time() - boot_start,
+            ", ".join(f"{name} {duration:.2f}s" for name, duration in boot_phases),
+        )
         LOGGER(__name__).info("Entering idle state")
 
         stop_event = asyncio.Event()
@@ -826,6 +1635,7 @@ if __name__ == "__main__":
         def _handle_sig(*_):
             LOGGER(__name__).info("Signal received, initiating graceful shutdown")
             stop_event.set()
+            SHUTDOWN_EVENT.set()
             CANCEL_EVENT.set()
 
         for sig in (signal.SIGTERM, signal.SIGINT):
@@ -848,8 +1658,14 @@ if __name__ == "__main__":
                 LOGGER(__name__).warning("idle() returned too quickly (%.2fs) – clients may have disconnected early.", time() - idle_start)
         finally:
             LOGGER(__name__).info("Shutting down...")
+            if metrics_server is not None:
+                metrics_server.close()
+            if worker_task is not None:
+                worker_task.cancel()
+            await stop_media_sessions()
             # Guarded stop to avoid cross-loop RuntimeError seen on Heroku
-            for c, label in ((bot, 'bot'), (user, 'user')):
+            clients = [(u.client, u.name) for u in UPLOADERS.uploaders] + [(s.client, s.name) for s in SESSIONS.sessions]
+            for c, label in clients:
                 try:
                     if getattr(c, 'is_connected', False):
                         await c.stop()
@@ -861,6 +1677,9 @@ if __name__ == "__main__":
                         LOGGER(__name__).error("Error stopping %s: %s", label, re)
                 except Exception as e:
                     LOGGER(__name__).error("Unexpected error stopping %s: %s", label, e)
+            if worker_task is not None:
+                # Unfinished items go back to the queue for the other workers
+                await asyncio.to_thread(WORK_QUEUE.leave, WORKER_ID)
             LOGGER(__name__).info("Bot Stopped")
 
     try: